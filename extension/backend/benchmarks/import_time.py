@@ -0,0 +1,101 @@
+"""Measure how long `import src.main` takes in a fresh interpreter.
+
+Run from extension/backend:
+
+    python benchmarks/import_time.py [--runs 5] [--budget 1.2] [--top 15]
+
+Each run imports the app in a new process with no API keys configured, so
+the numbers reflect a serverless cold start. The script fails (exit code 1)
+when the median exceeds the budget or when a module that should only load
+lazily (FAISS, the Gemini SDK) is pulled in at import time.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET", "1.2"))
+LAZY_MODULES = ["faiss", "langchain_google_genai", "langchain_community.vectorstores.faiss", "google.ai.generativelanguage_v1beta"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import src.main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "lazy_loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def _env():
+    env = dict(os.environ)
+    env.pop("GOOGLE_API_KEYS", None)
+    env["WARMUP_ON_STARTUP"] = "false"
+    return env
+
+
+def run_once():
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=_env(),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(top):
+    """Largest cumulative import time per third-party package, from `-X importtime`."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.main"], cwd=BACKEND_DIR, env=_env(),
+        capture_output=True, text=True, check=True,
+    )
+    totals = {}
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        package = parts[2].strip().split(".")[0]
+        if package != "src":
+            totals[package] = max(totals.get(package, 0), int(parts[1]))
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS, help="median import budget in seconds")
+    parser.add_argument("--top", type=int, default=15, help="show the N slowest packages imported by src.main")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    seconds = [run["seconds"] for run in runs]
+    lazy_loaded = sorted({m for run in runs for m in run["lazy_loaded"]})
+    report = {
+        "runs": args.runs,
+        "median_seconds": round(statistics.median(seconds), 3),
+        "min_seconds": round(min(seconds), 3),
+        "max_seconds": round(max(seconds), 3),
+        "budget_seconds": args.budget,
+        "lazy_modules_loaded": lazy_loaded,
+        "slowest_imports_ms": [(name, round(us / 1000, 1)) for name, us in slowest_imports(args.top)],
+    }
+    report["passed"] = report["median_seconds"] <= args.budget and not lazy_loaded
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import src.main: median {report['median_seconds']}s "
+              f"(min {report['min_seconds']}s, max {report['max_seconds']}s, {args.runs} runs), budget {args.budget}s")
+        for name, ms in report["slowest_imports_ms"]:
+            print(f"  {name:<32} {ms:>8.1f} ms")
+        if lazy_loaded:
+            print("modules that should load lazily were imported: " + ", ".join(lazy_loaded))
+        print("PASS" if report["passed"] else "FAIL")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""Offline stand-ins for Gemini, the embeddings API and MongoDB.
+
+Used by benchmarks/throughput.py so the scan and QA pipelines can be driven
+without API keys, a network connection or a database.
+"""
+from collections import defaultdict
+from types import SimpleNamespace
+import copy
+import uuid
+import time
+import random
+import asyncio
+import hashlib
+import threading
+import functools
+import http.server
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from pymongo.errors import DuplicateKeyError
+
+
+def _prompt_messages(prompt_value):
+    if hasattr(prompt_value, "to_messages"):
+        return prompt_value.to_messages()
+    return [SimpleNamespace(content=str(prompt_value))]
+
+
+class StubLLMError(Exception):
+    """Injected provider failure."""
+
+
+class StubChatModel(RunnableLambda):
+    """Deterministic chat model with configurable latency and error rate.
+
+    Structured analyzer calls return a finding for every requirement whose
+    keyword pattern matches the policy chunk, so the shape and volume of the
+    output track the real analyzer. Token usage is estimated the same way the
+    scheduler budgets calls (~4 characters per token) and shared through
+    `usage` across every stub built from the same counters.
+    """
+
+    def __init__(self, name, latency=0.8, jitter=0.3, error_rate=0.0, rate_limit_share=0.5, seed=0, usage=None):
+        self.model = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_share = rate_limit_share
+        self.rng = random.Random(f"{seed}:{name}")
+        self.usage = usage if usage is not None else defaultdict(int)
+        super().__init__(self._reply_sync, afunc=self._reply)
+
+    def model_copy(self, update=None, **kwargs):
+        """Same stub under another model name, as tier clients are built."""
+        return StubChatModel(
+            (update or {}).get("model", self.model), latency=self.latency, jitter=self.jitter,
+            error_rate=self.error_rate, rate_limit_share=self.rate_limit_share, usage=self.usage,
+        )
+
+    def _begin(self, prompt_value):
+        """Count the call's input and pick its latency; returns (messages, seconds)."""
+        messages = _prompt_messages(prompt_value)
+        self.usage["calls"] += 1
+        self.usage["input_tokens"] += sum(max(1, len(str(m.content)) // 4) for m in messages)
+        return messages, max(0.0, self.latency * (1 + self.rng.uniform(-self.jitter, self.jitter)))
+
+    async def _call(self, prompt_value, respond):
+        messages, delay = self._begin(prompt_value)
+        await asyncio.sleep(delay)
+        return self._finish(messages, respond)
+
+    def _call_sync(self, prompt_value, respond):
+        messages, delay = self._begin(prompt_value)
+        time.sleep(delay)
+        return self._finish(messages, respond)
+
+    def _finish(self, messages, respond):
+        if self.rng.random() < self.error_rate:
+            self.usage["errors"] += 1
+            if self.rng.random() < self.rate_limit_share:
+                raise StubLLMError("429 RESOURCE_EXHAUSTED: stub quota exceeded")
+            raise StubLLMError("503 UNAVAILABLE: stub backend error")
+        result = respond(str(messages[-1].content))
+        self.usage["output_tokens"] += max(1, len(result.model_dump_json() if hasattr(result, "model_dump_json") else str(result.content)) // 4)
+        return result
+
+    @staticmethod
+    def _echo(text):
+        return AIMessage(content=" ".join(text.split()[:24]))
+
+    async def _reply(self, prompt_value):
+        return await self._call(prompt_value, self._echo)
+
+    def _reply_sync(self, prompt_value):
+        return self._call_sync(prompt_value, self._echo)
+
+    def with_structured_output(self, schema, **kwargs):
+        respond = functools.partial(self._structured, schema)
+        return RunnableLambda(
+            lambda prompt_value: self._call_sync(prompt_value, respond),
+            afunc=lambda prompt_value: self._call(prompt_value, respond),
+        )
+
+    def _structured(self, schema, text):
+        fields = schema.model_fields
+        if "findings" in fields:
+            return schema(findings=self._findings(fields["findings"].annotation.__args__[0], text))
+        if "message" in fields:
+            return schema(message="Under the NDPA 2023, see the cited section of the retrieved documents.")
+        raise TypeError(f"StubChatModel cannot produce {schema.__name__}")
+
+    def _findings(self, item, text):
+        from src.agents import NDPA_REQUIREMENT_METADATA, NDPA_REQUIREMENT_IDS, NDPA_REQUIREMENT_PATTERNS
+
+        findings = []
+        for req_id, pattern in NDPA_REQUIREMENT_PATTERNS.items():
+            match = pattern.search(text)
+            if not match:
+                continue
+            digest = int(hashlib.sha1(f"{req_id}:{text}".encode("utf-8")).hexdigest()[:8], 16)
+            title = NDPA_REQUIREMENT_IDS[req_id]
+            data = {
+                "requirement_id": req_id,
+                "ndpa_section": NDPA_REQUIREMENT_METADATA[title]["section"],
+                "requirement_title": title,
+                "status": "partial" if digest % 4 == 0 else "compliant",
+                "evidence": text[max(0, match.start() - 60):match.end() + 60].strip(),
+                "gap": "",
+                "recommendation": "",
+                "confidence": round(0.6 + (digest % 36) / 100, 2),
+            }
+            findings.append(item(**{name: value for name, value in data.items() if name in item.model_fields}))
+        return findings
+
+
+class StubEmbeddings(Embeddings):
+    """Hashed bag-of-words embeddings: similar wording gives similar vectors.
+
+    They are not comparable with the Gemini vectors in the NDPA store, so
+    retrieval confidence is low and most questions take the rewrite path,
+    which is the most expensive one to benchmark anyway.
+    """
+
+    def __init__(self, dim, latency=0.1, usage=None):
+        self.dim = dim
+        self.latency = latency
+        self.usage = usage if usage is not None else defaultdict(int)
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            digest = int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16)
+            vector[digest % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_query(self, text, **kwargs):
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts, **kwargs):
+        self.usage["embedding_calls"] += 1
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self.embed_query(text)
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict) and any(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$in" and not (
+                    any(item in operand for item in value) if isinstance(value, list) else value in operand
+                ):
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if not {"$gt": value > operand, "$gte": value >= operand,
+                            "$lt": value < operand, "$lte": value <= operand}[op]:
+                        return False
+        elif value != condition:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, field, direction=1):
+        self._docs.sort(key=lambda doc: doc.get(field), reverse=direction < 0)
+        return self
+
+    def skip(self, count):
+        self._docs = self._docs[count:]
+        return self
+
+    def limit(self, count):
+        self._docs = self._docs[:count] if count else self._docs
+        return self
+
+    async def to_list(self, length=None):
+        return self._docs[:length] if length else list(self._docs)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._docs:
+            yield doc
+
+
+class InMemoryCollection:
+    """The subset of the motor collection API used by src/utils.py.
+
+    Supports equality, $in (also against array fields), $ne and range
+    filters and $set updates. With
+    `persist=False` writes are accepted and dropped, so every lookup misses.
+    """
+
+    def __init__(self, persist=True):
+        self.persist = persist
+        self.docs = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _find(self, query):
+        return [doc for doc in self.docs.values() if _matches(doc, query)]
+
+    async def create_index(self, *args, **kwargs):
+        return None
+
+    async def find_one(self, query, projection=None):
+        found = self._find(query)
+        return copy.deepcopy(found[0]) if found else None
+
+    def find(self, query, projection=None):
+        return _Cursor(copy.deepcopy(self._find(query)))
+
+    async def count_documents(self, query):
+        return len(self._find(query))
+
+    async def insert_one(self, doc):
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", uuid.uuid4().hex)
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError(f"duplicate key: {doc['_id']}")
+        if self.persist:
+            self.docs[doc["_id"]] = doc
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def insert_many(self, docs):
+        return SimpleNamespace(inserted_ids=[(await self.insert_one(doc)).inserted_id for doc in docs])
+
+    def _apply(self, doc, update):
+        for field, value in update.get("$set", {}).items():
+            doc[field] = copy.deepcopy(value)
+
+    async def update_one(self, query, update, upsert=False):
+        found = self._find(query)
+        if found:
+            self._apply(found[0], update)
+            return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+        if not upsert:
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+        doc = {field: value for field, value in query.items() if not isinstance(value, dict)}
+        self._apply(doc, update)
+        inserted = await self.insert_one(doc)
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=inserted.inserted_id)
+
+    async def find_one_and_update(self, query, update, return_document=False, **kwargs):
+        found = self._find(query)
+        if not found:
+            return None
+        before = copy.deepcopy(found[0])
+        self._apply(found[0], update)
+        return copy.deepcopy(found[0]) if return_document else before
+
+    async def delete_one(self, query):
+        found = self._find(query)
+        if found:
+            del self.docs[found[0]["_id"]]
+        return SimpleNamespace(deleted_count=len(found[:1]))
+
+
+def serve_fixtures(directory, port=0):
+    """Serve `directory` over HTTP on 127.0.0.1 from a background thread.
+
+    Returns the server; its base URL is http://127.0.0.1:<server.server_port>/.
+    """
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
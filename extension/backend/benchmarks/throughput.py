@@ -0,0 +1,254 @@
+"""Offline throughput benchmark for the scan and QA pipelines.
+
+Run from extension/backend:
+
+    python benchmarks/throughput.py [--scenario all|scan|qa] [--requests 30] [--concurrency 5]
+                                    [--llm-latency 0.8] [--error-rate 0] [--keys 2] [--warm]
+                                    [--json] [--output run.json] [--baseline previous.json]
+
+Gemini is replaced by a deterministic stub with configurable latency and
+error rate, policies are served from benchmarks/fixtures/policies by a local
+HTTP server, and the scan/findings caches live in memory. `web_chunker_node`
+and `ndpa_rag` are otherwise the production code paths, including the LLM
+scheduler and its per-key rate limits.
+
+By default every request is cold: scans use a unique URL and findings are not
+cached, QA caches are cleared before each question. `--warm` keeps the caches.
+With `--baseline` the script exits 1 when p95 latency or tokens per request
+grew, or throughput dropped, by more than `--max-regression`.
+"""
+from collections import Counter, defaultdict
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import logging
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(BACKEND_DIR, "benchmarks", "fixtures")
+POLICY_DIR = os.path.join(FIXTURES_DIR, "policies")
+QUESTIONS_FILE = os.path.join(FIXTURES_DIR, "questions.txt")
+DEFAULT_MAX_REGRESSION = float(os.getenv("BENCHMARK_MAX_REGRESSION", "0.15"))
+
+sys.path.insert(0, BACKEND_DIR)
+os.environ["FETCH_MODE"] = "static"
+os.environ["WARMUP_ON_STARTUP"] = "false"
+
+from benchmarks.stubs import StubChatModel, StubEmbeddings, InMemoryCollection, serve_fixtures  # noqa: E402
+from src import agents, utils  # noqa: E402
+from src.fetcher import close_http_session  # noqa: E402
+from src.qa_cache import qa_cache  # noqa: E402
+from src.metrics import start_timings, reset_timings  # noqa: E402
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+async def drive(call, items, concurrency):
+    """Run call(item) for every item with at most `concurrency` in flight.
+
+    Returns ([(seconds, ok)], wall_seconds).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(item):
+        async with semaphore:
+            _, token = start_timings()
+            started = time.perf_counter()
+            try:
+                ok = await call(item)
+            except Exception as exc:
+                logging.getLogger(__name__).warning("Request failed: %s", exc)
+                ok = False
+            finally:
+                reset_timings(token)
+            return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(timed(item) for item in items))
+    return results, time.perf_counter() - started
+
+
+def summarize(unit, results, wall, usage_before, usage_after):
+    latencies = [seconds for seconds, _ in results]
+    used = {name: usage_after[name] - usage_before.get(name, 0) for name in usage_after}
+    count = len(results)
+    return {
+        "unit": unit,
+        "requests": count,
+        "errors": sum(1 for _, ok in results if not ok),
+        "wall_seconds": round(wall, 3),
+        "per_second": round(count / wall, 3) if wall else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "mean": round(sum(latencies) / count * 1000, 1),
+            "max": round(max(latencies) * 1000, 1),
+        },
+        "llm_calls_per_request": round(used.get("calls", 0) / count, 2),
+        "llm_errors": used.get("errors", 0),
+        "input_tokens": used.get("input_tokens", 0),
+        "output_tokens": used.get("output_tokens", 0),
+        "tokens_per_request": round((used.get("input_tokens", 0) + used.get("output_tokens", 0)) / count, 1),
+    }
+
+
+async def bench_scan(args, usage):
+    server = serve_fixtures(POLICY_DIR)
+    base = f"http://127.0.0.1:{server.server_port}/"
+    policies = sorted(name for name in os.listdir(POLICY_DIR) if name.endswith(".html"))
+    urls = [
+        base + policies[i % len(policies)] + ("" if args.warm else f"?run={i}")
+        for i in range(args.requests)
+    ]
+    utils.scan_cache_table = InMemoryCollection()
+    utils.findings_cache_table = InMemoryCollection(persist=args.warm)
+    utils.policy_results_table = InMemoryCollection(persist=args.warm)
+    utils.url_aliases_table = InMemoryCollection(persist=args.warm)
+    findings = []
+
+    async def scan(url):
+        result = await agents.web_chunker_node(url)
+        if "error" in result:
+            return False
+        findings.append(len(result.get("findings", ())))
+        return True
+
+    before = dict(usage)
+    try:
+        results, wall = await drive(scan, urls, args.concurrency)
+    finally:
+        server.shutdown()
+    report = summarize("scan", results, wall, before, usage)
+    report["policies"] = len(policies)
+    report["findings_per_scan"] = round(sum(findings) / len(findings), 1) if findings else 0
+    return report
+
+
+async def bench_qa(args, usage):
+    if not os.path.exists(agents.NDPA_QA_VECTORSTORE_PATH):
+        return {"unit": "question", "skipped": f"no vector store at {agents.NDPA_QA_VECTORSTORE_PATH}"}
+    embeddings = StubEmbeddings(dim=1, latency=args.embedding_latency, usage=usage)
+    agents._embeddings = embeddings
+    store = await agents.current_vector_store()
+    embeddings.dim = store.index.d
+
+    with open(QUESTIONS_FILE, encoding="utf-8") as handle:
+        questions = [line.strip() for line in handle if line.strip()]
+    items = [questions[i % len(questions)] for i in range(args.requests)]
+    paths = Counter()
+
+    async def ask(question):
+        if not args.warm:
+            qa_cache.clear()
+        result = await agents.ndpa_rag(question)
+        paths[result.get("path", "unknown")] += 1
+        return bool(result.get("message"))
+
+    before = dict(usage)
+    results, wall = await drive(ask, items, args.concurrency)
+    report = summarize("question", results, wall, before, usage)
+    report["paths"] = dict(paths)
+    report["embedding_calls"] = usage["embedding_calls"] - before.get("embedding_calls", 0)
+    return report
+
+
+def compare(current, baseline, max_regression):
+    """Regressions of the current run against a baseline report, as strings."""
+    regressions = []
+    for name, run in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old or "skipped" in run or "skipped" in old:
+            continue
+        checks = [
+            ("p95 latency", run["latency_ms"]["p95"], old["latency_ms"]["p95"], 1),
+            ("tokens per request", run["tokens_per_request"], old["tokens_per_request"], 1),
+            ("throughput", run["per_second"], old["per_second"], -1),
+        ]
+        for label, new_value, old_value, direction in checks:
+            if old_value and direction * (new_value - old_value) / old_value > max_regression:
+                regressions.append(f"{name}: {label} {old_value} -> {new_value}")
+    return regressions
+
+
+async def run(args):
+    usage = defaultdict(int)
+    agents.llm_scheduler.configure([
+        StubChatModel(f"stub-{i}", latency=args.llm_latency, jitter=args.llm_jitter,
+                      error_rate=args.error_rate, seed=args.seed, usage=usage)
+        for i in range(args.keys)
+    ])
+    scenarios = {}
+    try:
+        if args.scenario in ("all", "scan"):
+            scenarios["scan"] = await bench_scan(args, usage)
+        if args.scenario in ("all", "qa"):
+            scenarios["qa"] = await bench_qa(args, usage)
+    finally:
+        await close_http_session()
+    return scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=["all", "scan", "qa"], default="all")
+    parser.add_argument("--requests", type=int, default=30, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--keys", type=int, default=2, help="number of stub API keys")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="mean stub LLM latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="relative +/- latency jitter")
+    parser.add_argument("--embedding-latency", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of LLM calls that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warm", action="store_true", help="keep scan, findings and QA caches between requests")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION)
+    parser.add_argument("--verbose", action="store_true", help="show application logs")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    report = {
+        "config": {name: value for name, value in vars(args).items() if name not in ("json", "output", "baseline", "verbose")},
+        "scenarios": asyncio.run(run(args)),
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            regressions = compare(report, json.load(handle), args.max_regression)
+        report["regressions"] = regressions
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, result in report["scenarios"].items():
+            if "skipped" in result:
+                print(f"{name}: skipped ({result['skipped']})")
+                continue
+            latency = result["latency_ms"]
+            print(f"{name}: {result['requests']} requests, concurrency {args.concurrency}, {result['errors']} errors")
+            print(f"  latency p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms")
+            print(f"  {result['per_second']} {result['unit']}s/s  {result['tokens_per_request']} tokens/{result['unit']}"
+                  f"  {result['llm_calls_per_request']} LLM calls/{result['unit']}")
+            if "paths" in result:
+                print("  paths: " + ", ".join(f"{path}={count}" for path, count in sorted(result["paths"].items())))
+        for line in regressions:
+            print("regression: " + line)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+from collections import deque
+from contextlib import asynccontextmanager
+import os
+import math
+import time
+import asyncio
+import logging
+
+from .scheduler import llm_priority
+from .metrics import ADMISSION_ACTIVE, ADMISSION_QUEUED, ADMISSION_WAIT_SECONDS, ADMISSION_REJECTED
+
+
+logger = logging.getLogger(__name__)
+
+
+ADMISSION_SERVICE_EWMA_ALPHA = 0.2
+ADMISSION_DEFAULT_SERVICE_SECONDS = 5.0
+
+
+def _setting(lane, name, default):
+    return float(os.getenv(f"ADMISSION_{lane.upper()}_{name}", str(default)))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a lane's queue is full (429) or a request waited too long (503)."""
+
+    def __init__(self, lane, reason, status_code, retry_after):
+        super().__init__(f"{lane} lane rejected request: {reason}")
+        self.lane = lane
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Lane:
+    """A bounded FIFO of requests in front of one class of traffic.
+
+    At most `concurrency` requests run at once; up to `max_queue` more wait
+    for at most `max_wait` seconds. A finished request hands its slot to the
+    oldest waiter. `priority` is applied to the LLM calls the lane makes.
+    """
+
+    def __init__(self, name, priority, concurrency, max_queue, max_wait):
+        self.name = name
+        self.priority = priority
+        self.concurrency = max(1, int(concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = max_wait
+        self.active = 0
+        self.service_ewma = None
+        self._waiters = deque()
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up, from recent service times."""
+        service = self.service_ewma or ADMISSION_DEFAULT_SERVICE_SECONDS
+        return max(1, math.ceil(service * (self.queued + 1) / self.concurrency))
+
+    def _reject(self, reason, status_code):
+        ADMISSION_REJECTED.labels(self.name, reason).inc()
+        logger.warning("Rejecting %s request: %s (%d active, %d queued)", self.name, reason, self.active, self.queued)
+        raise AdmissionRejected(self.name, reason, status_code, self.retry_after())
+
+    def _update_gauges(self):
+        ADMISSION_ACTIVE.labels(self.name).set(self.active)
+        ADMISSION_QUEUED.labels(self.name).set(self.queued)
+
+    async def acquire(self):
+        """Take a slot, queueing if needed; returns the seconds spent waiting."""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self._update_gauges()
+            ADMISSION_WAIT_SECONDS.labels(self.name).observe(0.0)
+            return 0.0
+        if self.queued >= self.max_queue:
+            self._reject("queue_full", 429)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters.append(future)
+        self._update_gauges()
+        started = loop.time()
+        try:
+            await asyncio.wait_for(future, timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if not (future.done() and not future.cancelled()):
+                self._discard(future)
+                self._reject("queue_timeout", 503)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(None)
+            else:
+                self._discard(future)
+            raise
+        waited = loop.time() - started
+        ADMISSION_WAIT_SECONDS.labels(self.name).observe(waited)
+        return waited
+
+    def _discard(self, future):
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+        self._update_gauges()
+
+    def release(self, service_seconds):
+        """Give the slot back, handing it straight to the oldest live waiter."""
+        if service_seconds is not None:
+            alpha = ADMISSION_SERVICE_EWMA_ALPHA
+            self.service_ewma = service_seconds if self.service_ewma is None else (
+                alpha * service_seconds + (1 - alpha) * self.service_ewma
+            )
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self._update_gauges()
+                return
+        self.active -= 1
+        self._update_gauges()
+
+    def snapshot(self):
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "service_seconds": round(self.service_ewma, 3) if self.service_ewma is not None else None,
+        }
+
+
+# qa serves short WhatsApp questions ahead of extension scans; bulk is the job
+# runner, which has its own concurrency limit and only borrows the priority.
+lanes = {
+    "qa": Lane("qa", 0, _setting("qa", "CONCURRENCY", 16), _setting("qa", "QUEUE", 64), _setting("qa", "MAX_WAIT", 10)),
+    "interactive": Lane(
+        "interactive", 1,
+        _setting("interactive", "CONCURRENCY", 8), _setting("interactive", "QUEUE", 32), _setting("interactive", "MAX_WAIT", 20),
+    ),
+    "bulk": Lane("bulk", 2, _setting("bulk", "CONCURRENCY", 4), _setting("bulk", "QUEUE", 0), _setting("bulk", "MAX_WAIT", 0)),
+}
+
+
+async def enter(lane_name):
+    """Admit a request to a lane, raising AdmissionRejected when it is saturated.
+
+    The caller must call `lane.release(seconds)` when the request finishes;
+    use `admit` unless the work outlives the handler (streaming responses).
+    """
+    lane = lanes[lane_name]
+    await lane.acquire()
+    return lane
+
+
+@asynccontextmanager
+async def admit(lane_name):
+    """Run the block in a lane slot with the lane's LLM priority."""
+    lane = await enter(lane_name)
+    token = llm_priority.set(lane.priority)
+    started = time.monotonic()
+    try:
+        yield lane
+    finally:
+        llm_priority.reset(token)
+        lane.release(time.monotonic() - started)
+
+
+def set_priority(lane_name):
+    """Give LLM calls in the current context the lane's priority; returns a reset token."""
+    return llm_priority.set(lanes[lane_name].priority)
+
+
+def snapshot():
+    return {name: lane.snapshot() for name, lane in lanes.items()}
@@ -1,23 +1,29 @@
 from typing import List, Any
+from collections import Counter
 import os
+import re
+import ast
+import json
+import time
 import asyncio
 import logging
-from itertools import cycle
 from dotenv import load_dotenv
-import nest_asyncio
-
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.document_loaders import PlaywrightURLLoader
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.prompts import ChatPromptTemplate
+
 from .schemas import *
 from .utils import *
+from .fetcher import load_policy
+from .singleflight import SingleFlight
+from .scheduler import LLMScheduler, is_rate_limit_error, llm_priority
+from .cascade import model_tiers, run_cascade, findings_escalation, summarize_cascade, SCHEMA_ERRORS
+from .metrics import span, record, pipeline, count_cache, current_pipeline, CACHE_LOOKUPS, LLM_CALLS, LLM_RETRIES, LLM_RATE_LIMITED, LLM_HEDGES, SCANS_INCOMPLETE
+from .qa_cache import qa_cache, normalize_question
+from .qa_classifier import classify_question, QA_DIRECT_CONFIDENCE
+from .lexical import LexicalIndex, reciprocal_rank_fusion
+from .vector_index import is_mmap_index, load_mmap_store
+from .retrieval import embed_queries, search_by_vector, retrieve_many, run_in_executor, RETRIEVAL_DEFAULT_FETCH_K
 
 
 load_dotenv()
-nest_asyncio.apply()
 
 logging.basicConfig(
     level=logging.INFO,
@@ -27,257 +33,423 @@ logger = logging.getLogger(__name__)
 
 
 EMBEDDING_MODEL = "models/gemini-embedding-001"
-NDPA_QA_VECTORSTORE_PATH="/app/ndpa_qa_vectorstore"
-PLAYWRIGHT_HEADLESS = True
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
-BATCH_SIZE = 5
+ANALYZER_MODEL = "gemini-2.0-flash"
+ANALYZER_PROMPT_VERSION = "v2"
+# Send each batch only the requirements its text shows keyword signals for.
+RELEVANCE_ROUTING = os.getenv("RELEVANCE_ROUTING", "false").lower() in ("1", "true", "yes")
+ANALYZER_MODEL_TIERS = model_tiers("ANALYZER", ANALYZER_MODEL)
+QA_MODEL_TIERS = model_tiers("QA", ANALYZER_MODEL)
+ANALYZER_CACHE_VERSION = f"{ANALYZER_PROMPT_VERSION}:{'>'.join(ANALYZER_MODEL_TIERS)}" + (":routed" if RELEVANCE_ROUTING else "")
+# Either a LangChain FAISS folder or a memory-mapped index built by src.vector_index.
+NDPA_QA_VECTORSTORE_PATH = os.getenv("NDPA_QA_VECTORSTORE_PATH", "/app/ndpa_qa_vectorstore")
+ROUTING_HEADING_CHARS = 80
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "6000"))
+# Average batch size; boundaries follow the content, not the document length or key capacity.
+BATCH_TARGET_TOKENS = int(os.getenv("BATCH_TARGET_TOKENS", "3000"))
 LLM_TEMPERATURE = 0.0 
-MAX_CONCURRENT_LLM = 4           
-LLM_RETRY_SECONDS = 1.0
 LLM_RETRY_ATTEMPTS = 3
-
-GOOGLE_API_KEYS = os.getenv("GOOGLE_API_KEYS", "")
-if GOOGLE_API_KEYS:
-    GOOGLE_API_KEYS = eval(GOOGLE_API_KEYS)
-else:
-    GOOGLE_API_KEYS = []
-
-if not GOOGLE_API_KEYS:
-    raise RuntimeError("No GOOGLE_API_KEYS found in env")
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() in ("1", "true", "yes")
+# Overall budget for one scan, fetch included; on expiry the scored partial
+# result (or deadline_exceeded if the fetch itself ran out) is returned uncached. 0 disables.
+SCAN_DEADLINE_SECONDS = float(os.getenv("SCAN_DEADLINE_SECONDS", "0"))
+# LLM priority of background revalidation scans, below every admission lane.
+BACKGROUND_PRIORITY = 3
+PROGRESSIVE_ANALYSIS = os.getenv("PROGRESSIVE_ANALYSIS", "false").lower() in ("1", "true", "yes")
+PROGRESSIVE_CONFIDENCE = float(os.getenv("PROGRESSIVE_CONFIDENCE", "0.9"))
+ANALYZER_PROMPT_TOKENS = 1200
+SCAN_LEASE_ENABLED = os.getenv("SCAN_LEASE_ENABLED", "false").lower() in ("1", "true", "yes")
+SCAN_LEASE_POLL_SECONDS = 1.0
+VECTOR_STORE_CHECK_SECONDS = 30.0
+QA_RETRIEVAL_K = 3
+GREETING_REPLY = "Hello! Do you have any NDPA or privacy questions I can help with?"
+CLOSING_REPLY = "You're welcome! Ask any time you have another NDPA or privacy question."
+QA_NO_ANSWER = "I do not have a definitive answer"
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+
+def parse_api_keys(raw):
+    """Parse GOOGLE_API_KEYS given as a JSON/Python list or a comma-separated string."""
+    raw = (raw or "").strip()
+    if not raw:
+        return []
+    try:
+        keys = json.loads(raw)
+    except ValueError:
+        try:
+            keys = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            keys = raw.split(",")
+    if isinstance(keys, str):
+        keys = [keys]
+    return [str(key).strip() for key in keys if str(key).strip()]
+
+
+# Heavy clients and the FAISS index are built on first use (or by warm_up()),
+# so importing this module stays cheap and needs no credentials.
+_embeddings = None
+vector_store = None
+lexical_index = None
+_vector_store_state = {"fingerprint": None, "checked": 0.0}
+_vector_store_lock = asyncio.Lock()
+_warmup_state = {"started": False, "done": False, "error": None}
+
+
+def get_embeddings():
+    global _embeddings
+    if _embeddings is None:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        _embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+    return _embeddings
+
+
+def load_vector_store():
+    if is_mmap_index(NDPA_QA_VECTORSTORE_PATH):
+        return load_mmap_store(NDPA_QA_VECTORSTORE_PATH, get_embeddings())
+    from langchain_community.vectorstores import FAISS
+    return FAISS.load_local(
+        NDPA_QA_VECTORSTORE_PATH,
+        get_embeddings(),
+        allow_dangerous_deserialization=True
+    )
 
 
+def vector_store_fingerprint():
+    """Size and mtime of the vector store files, to notice a rebuilt index."""
+    parts = []
+    for name in sorted(os.listdir(NDPA_QA_VECTORSTORE_PATH)):
+        stat = os.stat(os.path.join(NDPA_QA_VECTORSTORE_PATH, name))
+        parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def build_llm_clients():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    keys = parse_api_keys(os.getenv("GOOGLE_API_KEYS", ""))
+    if not keys:
+        raise RuntimeError("No GOOGLE_API_KEYS found in env")
+    return [
+        ChatGoogleGenerativeAI(
+            model=ANALYZER_MODEL,
+            temperature=LLM_TEMPERATURE,
+            google_api_key=key
+        )
+        for key in keys
+    ]
 
-embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
 
-vector_store = FAISS.load_local(
-    NDPA_QA_VECTORSTORE_PATH,
-    embeddings,
-    allow_dangerous_deserialization=True
-)
+llm_scheduler = LLMScheduler()
 
 
+_tier_clients = {}
 
-llm_clients = [
-    ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        temperature=LLM_TEMPERATURE,
-        google_api_key=key
-    )
-    for key in GOOGLE_API_KEYS
-]
 
-llm_cycle = cycle(llm_clients)
-_llm_semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM)
+def tier_client(client, model=None):
+    """`client` (built for ANALYZER_MODEL) switched to `model`, copied once per client and model."""
+    if model is None or model == ANALYZER_MODEL:
+        return client
+    key = (id(client), model)
+    if key not in _tier_clients:
+        _tier_clients[key] = client.model_copy(update={"model": model})
+    return _tier_clients[key]
 
 
-def get_llm():
-    """Round-robin LLM getter (synchronous)."""
-    return next(llm_cycle)
+def ensure_llm_clients():
+    """Configure the scheduler with one client per API key on first use."""
+    if not llm_scheduler.keys:
+        llm_scheduler.configure(build_llm_clients())
+        logger.info("Configured %d LLM client(s)", len(llm_scheduler.keys))
 
 
+scan_flight = SingleFlight(priority_var=llm_priority)
+_refresh_tasks = set()
 
 
-def privacy_analyzer_batch_node(llm):
-    system_prompt = """
+ANALYZER_SYSTEM_PROMPT = """
 You are an expert NDPA (Nigeria Data Protection Act 2023) compliance auditor.
 
-TASK: Analyze the provided privacy policy CHUNK and identify clear evidence of compliance with NDPA requirements.
+TASK: Analyze the provided privacy policy CHUNK and identify clear evidence of compliance with the NDPA requirements listed below.
 
 GUIDELINES:
 - Analyze ONLY the given chunk; do not assume content exists outside this chunk.
-- Only return NDPA sections that have clear, verifiable evidence in this chunk.
-- Do NOT mark any section as 'non_compliant' if it is missing; simply omit it if not found.
+- Only return requirements that have clear, verifiable evidence in this chunk.
+- Do NOT mark any requirement as 'non_compliant' if it is missing; simply omit it if not found.
 - Be highly conservative: mark 'compliant' only when evidence fully satisfies the requirement, 'partial' only if evidence partially satisfies it.
 - Include exact quotes from the text as evidence, and provide a short justification if evidence is paraphrased.
-- Avoid speculation: if you cannot confirm compliance from this chunk, omit the section entirely.
-
-Return strict JSON matching this schema for each NDPA section found in this chunk:
-[
-  {{
-    "ndpa_section": "24(1)(a)",
-    "requirement_title": "Fair, lawful and transparent processing",
-    "status": "compliant | partial",
-    "evidence": "exact quote",
-    "gap": "what's missing if partial",
-    "recommendation": "short, precise remediation step",
-    "confidence": 0.0-1.0
-  }}
-]
-IMPORTANT:
-- Output ONLY JSON; do NOT include explanations, commentary, or extra text.
-- Be precise, accurate, and allow paraphrased evidence that clearly satisfies the requirement.
-
-ADDITIONAL INSTRUCTION:
+- Avoid speculation: if you cannot confirm compliance from this chunk, omit the requirement entirely.
 - Pay special attention to rights related to data subject actions (withdrawal of consent, objection to processing, marketing opt-outs, data access). Even if phrased differently than the requirement title, mark as compliant if the policy clearly grants the right.
+
+For each finding return: requirement_id (from the list below), status (compliant | partial), evidence (exact quote), gap (what's missing if partial), recommendation (short remediation step), confidence (0.0-1.0).
+
+NDPA REQUIREMENTS (id | section | title: what the policy must show):
+{requirement_catalogue}
 """
 
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("human", """
+ANALYZER_HUMAN_PROMPT = """
 PRIVACY POLICY CHUNK:
 {batch_text}
+"""
 
-NDPA CONTEXT:
-NDPA_PUBLIC_POLICY_MANDATORY_SECTIONS = [
-    # ──────────────────────────────────────────────
-    # SECTION 24 — Principles and Lawful Basis for Processing
-    # ──────────────────────────────────────────────
-    {{
-        "requirement_title": "Provide Confirmation of Data Processing and Purposes",
-        "ndpa_section": "Section 24(1)(a–b)",
-        "rationale": "Must state what personal data is collected, purposes of processing, and that it is lawful and transparent."
-    }},
-    {{
-        "requirement_title": "Disclose Categories of Personal Data and Recipients",
-        "ndpa_section": "Section 24(1)(b, c)",
-        "rationale": "Privacy policy must describe categories of data collected and who receives it."
-    }},
-    {{
-        "requirement_title": "Provide Data Retention Period or Criteria",
-        "ndpa_section": "Section 24(1)(d)",
-        "rationale": "Retention periods or criteria must be disclosed to ensure accountability and transparency."
-    }},
+ANALYZER_SCOPE_PROMPT = """
+Only check these requirement ids: {requirement_ids}
+"""
 
-    # ──────────────────────────────────────────────
-    # SECTION 34 — Rights of a Data Subject
-    # ──────────────────────────────────────────────
-    {{
-        "requirement_title": "Inform Data Subjects of Rights and Complaint Options",
-        "ndpa_section": "Section 34(1)(a–e)",
-        "rationale": "Policy must outline available data subject rights and how to exercise them, including right to complain to NDPC."
-    }},
-    {{
-        "requirement_title": "Provide Copy of Personal Data in Common Format",
-        "ndpa_section": "Section 34(2)",
-        "rationale": "Policy should mention right of access and how users can request their data."
-    }},
-    {{
-        "requirement_title": "Correct or Erase Inaccurate or Outdated Data",
-        "ndpa_section": "Section 34(3)",
-        "rationale": "Must describe procedure for requesting correction or deletion."
-    }},
-    {{
-        "requirement_title": "Restrict Processing Pending Resolution or Objection",
-        "ndpa_section": "Section 34(4)",
-        "rationale": "Policy should explain right to restrict processing when disputes exist."
-    }},
-    {{
-        "requirement_title": "Erase Personal Data When No Longer Necessary",
-        "ndpa_section": "Section 34(5)",
-        "rationale": "Must commit to deleting data when purpose is fulfilled."
-    }},
+LLM_CONTEXT_CACHE = os.getenv("LLM_CONTEXT_CACHE", "false").lower() in ("1", "true", "yes")
+LLM_CONTEXT_CACHE_MODEL = os.getenv("LLM_CONTEXT_CACHE_MODEL", "models/gemini-2.0-flash-001")
+LLM_CONTEXT_CACHE_TTL_SECONDS = 3600
+LLM_CONTEXT_CACHE_RETRY_SECONDS = 600
 
-    # ──────────────────────────────────────────────
-    # SECTION 35 — Withdrawal of Consent
-    # ──────────────────────────────────────────────
-    {{
-        "requirement_title": "Allow Data Subjects to Withdraw Consent Easily",
-        "ndpa_section": "Section 35(1–2)",
-        "rationale": "Privacy policy must explain how consent can be withdrawn at any time and its effects."
-    }},
+_analyzer_chains = {}
+_context_cache_tasks = set()
 
-    # ──────────────────────────────────────────────
-    # SECTION 36 — Right to Object
-    # ──────────────────────────────────────────────
-    {{
-        "requirement_title": "Enable Data Subjects to Object to Processing",
-        "ndpa_section": "Section 36(1)",
-        "rationale": "Policy must explain right to object to processing on legitimate grounds."
-    }},
-    {{
-        "requirement_title": "Cease Direct Marketing Upon Objection",
-        "ndpa_section": "Section 36(2)",
-        "rationale": "Must clearly state right to opt out of marketing communications."
-    }},
 
-    # ──────────────────────────────────────────────
-    # SECTION 30 — Sensitive Personal Data
-    # ──────────────────────────────────────────────
-    {{
-        "requirement_title": "Obtain Explicit Consent Before Processing Sensitive Data",
-        "ndpa_section": "Section 30(1–2)",
-        "rationale": "Policy must mention that explicit consent is required for sensitive data categories (health, biometrics, etc.)."
-    }},
+def build_requirement_catalogue(ids=None):
+    """One compact line per requirement, generated from NDPA_REQUIREMENT_METADATA."""
+    lines = []
+    for title, meta in NDPA_REQUIREMENT_METADATA.items():
+        if ids is None or meta["id"] in ids:
+            lines.append(f"{meta['id']} | {meta['section']} | {title}: {meta['description']}")
+    return "\n".join(lines)
 
-    # ──────────────────────────────────────────────
-    # SECTION 39 — Data Security
-    # ──────────────────────────────────────────────
-    {{
-        "requirement_title": "Implement Technical and Organisational Security Measures",
-        "ndpa_section": "Section 24(1)(f) & Section 39(1–3)",
-        "rationale": "Policy must state that appropriate safeguards exist to prevent loss, misuse, or unauthorised access."
-    }},
-    {{
-        "requirement_title": "Inform Data Subjects of High-Risk Breaches Promptly",
-        "ndpa_section": "Section 40(2)",
-        "rationale": "Must explain how individuals will be notified in the event of a serious data breach."
-    }},
 
-    # ──────────────────────────────────────────────
-    # SECTION 32 — Data Protection Officer
-    # ──────────────────────────────────────────────
-    {{
-        "requirement_title": "Provide DPO as Contact Point for the Commission",
-        "ndpa_section": "Section 32(2–3)",
-        "rationale": "Privacy policy must include DPO or designated contact information for data protection inquiries."
-    }},
+def analyzer_system_prompt(ids=None):
+    return ANALYZER_SYSTEM_PROMPT.replace("{requirement_catalogue}", build_requirement_catalogue(ids))
 
-    # ──────────────────────────────────────────────
-    # SECTION 31 — Children or Persons Lacking Legal Capacity
-    # ──────────────────────────────────────────────
-    {{
-        "requirement_title": "Obtain Parental or Guardian Consent for Children",
-        "ndpa_section": "Section 31(1–3)",
-        "rationale": "If processing children’s data, policy must explain need for parental consent."
-    }},
-    {{
-        "requirement_title": "Verify Age and Consent Mechanisms Appropriately",
-        "ndpa_section": "Section 31(2)",
-        "rationale": "Policy should mention age verification and guardian validation for minors."
-    }},
 
-    # ──────────────────────────────────────────────
-    # SECTIONS 41–43 — Cross-Border Data Transfers
-    # ──────────────────────────────────────────────
-    {{
-        "requirement_title": "Ensure Adequate Protection for Cross-Border Data Transfers",
-        "ndpa_section": "Section 41(1)(a) & Section 42(1–2)",
-        "rationale": "Policy must state that data is only transferred to countries with adequate protection or safeguards."
-    }},
-    {{
-        "requirement_title": "Obtain Consent for Transfers Without Adequate Protection",
-        "ndpa_section": "Section 43(1)(a)",
-        "rationale": "If transferring to a country without adequate safeguards, explicit informed consent is required."
-    }}
-]
-
-""")
-    ])
+def analyzer_payload(batch_text, ids=None):
+    """Inputs for the analyzer chain; `ids` narrows the requirements checked."""
+    return {
+        "batch_text": batch_text,
+        "requirement_catalogue": build_requirement_catalogue(ids),
+        "requirement_ids": ", ".join(sorted(ids)) if ids else "all",
+    }
 
-    return prompt | llm.with_structured_output(ValidationFindings)
 
+def _genai_schema(schema):
+    """Translate a dereferenced JSON schema into the fields of a Gemini `Schema`."""
+    variants = schema.get("anyOf", [])
+    non_null = [variant for variant in variants if variant.get("type") != "null"]
+    if non_null:
+        schema = {**non_null[0], **{k: v for k, v in schema.items() if k != "anyOf"}}
+    converted = {"type_": schema.get("type", "string").upper()}
+    if len(non_null) < len(variants):
+        converted["nullable"] = True
+    if schema.get("description"):
+        converted["description"] = schema["description"]
+    if "enum" in schema:
+        converted["format_"] = "enum"
+        converted["enum"] = [str(value) for value in schema["enum"]]
+    if "items" in schema:
+        converted["items"] = _genai_schema(schema["items"])
+    if "properties" in schema:
+        converted["properties"] = {name: _genai_schema(prop) for name, prop in schema["properties"].items()}
+        converted["required"] = schema.get("required", [])
+    return converted
+
+
+def _analyzer_tool():
+    """The RequirementFindings tool as a Gemini `Tool`, built from its public OpenAI tool schema."""
+    from google.ai.generativelanguage_v1beta.types import Tool, FunctionDeclaration, Schema
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    function = convert_to_openai_tool(RequirementFindings)["function"]
+    return Tool(function_declarations=[FunctionDeclaration(
+        name=function["name"],
+        description=function.get("description") or RequirementFindings.__name__,
+        parameters=Schema(_genai_schema(function["parameters"])),
+    )])
+
+
+def _create_context_cache(llm, system_prompt, model):
+    """Store the static analyzer prefix (instructions + tool schema) provider-side for `model`.
+
+    Blocking gRPC call; run it in an executor.
+    """
+    from google.ai.generativelanguage_v1beta import CacheServiceClient
+    from google.ai.generativelanguage_v1beta.types import (
+        CachedContent, Content, Part, ToolConfig, FunctionCallingConfig,
+    )
+    from google.protobuf.duration_pb2 import Duration
+
+    client = CacheServiceClient(client_options={"api_key": llm.google_api_key.get_secret_value()})
+    cache = client.create_cached_content(cached_content=CachedContent(
+        model=model,
+        display_name=f"clauseguard-analyzer-{ANALYZER_PROMPT_VERSION}-{model.split('/')[-1]}",
+        system_instruction=Content(parts=[Part(text=system_prompt)]),
+        tools=[_analyzer_tool()],
+        tool_config=ToolConfig(function_calling_config=FunctionCallingConfig(
+            mode=FunctionCallingConfig.Mode.ANY,
+            allowed_function_names=[RequirementFindings.__name__],
+        )),
+        ttl=Duration(seconds=LLM_CONTEXT_CACHE_TTL_SECONDS),
+    ))
+    return cache.name
+
+
+def _context_cache_model(llm):
+    """Versioned model name to cache the analyzer prefix for; a cache only serves its own model."""
+    model = getattr(llm, "model", ANALYZER_MODEL)
+    if model.split("/")[-1] == ANALYZER_MODEL:
+        return LLM_CONTEXT_CACHE_MODEL
+    return model if model.startswith("models/") else f"models/{model}"
+
+
+def _inline_analyzer_chain(llm):
+    from langchain_core.prompts import ChatPromptTemplate
+
+    escaped = ANALYZER_SYSTEM_PROMPT.replace("{", "{{").replace("}", "}}")
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", escaped.replace("{{requirement_catalogue}}", "{requirement_catalogue}")),
+        ("human", ANALYZER_HUMAN_PROMPT)
+    ])
+    return prompt | llm.with_structured_output(RequirementFindings)
+
+
+async def _build_cached_analyzer_chain(llm):
+    """Create the context cache off the event loop and swap the cached chain in for `llm`."""
+    cache_model = _context_cache_model(llm)
+    loop = asyncio.get_running_loop()
+    try:
+        cache_name = await loop.run_in_executor(None, _create_context_cache, llm, analyzer_system_prompt(), cache_model)
+    except Exception as exc:
+        logger.warning("Context cache unavailable for %s, sending the prefix inline: %s", cache_model, exc)
+        chain, _ = _analyzer_chains[id(llm)]
+        _analyzer_chains[id(llm)] = (chain, time.monotonic() + LLM_CONTEXT_CACHE_RETRY_SECONDS)
+        return
+    logger.info("Created analyzer context cache %s for %s", cache_name, cache_model)
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers.openai_tools import PydanticToolsParser
+
+    human_prompt = ANALYZER_SCOPE_PROMPT + ANALYZER_HUMAN_PROMPT if RELEVANCE_ROUTING else ANALYZER_HUMAN_PROMPT
+    prompt = ChatPromptTemplate.from_messages([("human", human_prompt)])
+    cached_llm = llm.model_copy(update={"model": cache_model, "cached_content": cache_name})
+    parser = PydanticToolsParser(tools=[RequirementFindings], first_tool_only=True)
+    _analyzer_chains[id(llm)] = (prompt | cached_llm | parser, time.monotonic() + LLM_CONTEXT_CACHE_TTL_SECONDS * 0.9)
 
 
+def privacy_analyzer_batch_node(llm):
+    """Analyzer chain for `llm`, built once per client and reused across batches.
+
+    With LLM_CONTEXT_CACHE on, the cache is created in the background; calls
+    use the inline chain until it is ready, while it is being renewed and
+    for LLM_CONTEXT_CACHE_RETRY_SECONDS after a failed attempt.
+    """
+    chain, expires = _analyzer_chains.get(id(llm), (None, 0))
+    if chain is None or time.monotonic() >= expires:
+        chain = _inline_analyzer_chain(llm)
+        _analyzer_chains[id(llm)] = (chain, float("inf"))
+        if LLM_CONTEXT_CACHE:
+            task = asyncio.ensure_future(_build_cached_analyzer_chain(llm))
+            _context_cache_tasks.add(task)
+            task.add_done_callback(_context_cache_tasks.discard)
+    return chain
+
+
+
+
+
+async def _call_on_key(key, build_chain, payload, method_name, model, retry_schema_errors):
+    """One LLM call on a reserved key; releases the key and records the outcome."""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        invoke = getattr(build_chain(tier_client(key.client, model)), method_name)
+        result = await invoke(payload)
+    except asyncio.CancelledError:
+        LLM_CALLS.labels(key.name, "cancelled").inc()
+        await asyncio.shield(llm_scheduler.release(key, loop.time() - started, cancelled=True))
+        raise
+    except Exception as exc:
+        record("llm_call", loop.time() - started)
+        if not retry_schema_errors and isinstance(exc, SCHEMA_ERRORS):
+            LLM_CALLS.labels(key.name, "schema_error").inc()
+            await llm_scheduler.release(key, loop.time() - started)
+            raise
+        if is_rate_limit_error(exc):
+            LLM_CALLS.labels(key.name, "rate_limited").inc()
+            LLM_RATE_LIMITED.labels(key.name).inc()
+        else:
+            LLM_CALLS.labels(key.name, "error").inc()
+        await llm_scheduler.release(key, loop.time() - started, exc)
+        raise
+    latency = loop.time() - started
+    record("llm_call", latency)
+    LLM_CALLS.labels(key.name, "ok").inc()
+    llm_scheduler.observe(current_pipeline(), latency)
+    await llm_scheduler.release(key, latency)
+    return result
 
 
-async def _llm_invoke_with_retry(llm, payload, method_name = "ainvoke"):
-    attempt = 0
+async def _hedged_call(keys, tokens, call):
+    """Run call(keys[0]); past the hedge delay, race a duplicate on another free key.
+
+    The hedge key is appended to `keys`. The first copy to succeed wins and
+    the other is cancelled; if every copy fails, the last error is raised.
+    """
+    label = current_pipeline()
+    tasks = {asyncio.ensure_future(call(keys[0])): keys[0]}
+    try:
+        delay = llm_scheduler.hedge_delay(label) if LLM_HEDGING else None
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            hedge_key = None if done else llm_scheduler.try_acquire(tokens, avoid={k.index for k in keys})
+            if hedge_key is not None:
+                logger.info("LLM call on %s slower than %.1fs; hedging on %s", keys[0].name, delay, hedge_key.name)
+                LLM_HEDGES.labels(label, "sent").inc()
+                keys.append(hedge_key)
+                tasks[asyncio.ensure_future(call(hedge_key))] = hedge_key
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if len(tasks) > 1:
+                        LLM_HEDGES.labels(label, "lost" if tasks[task] is keys[0] else "won").inc()
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        unfinished = [task for task in tasks if not task.done()]
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+
+
+async def _llm_invoke_with_retry(build_chain, payload, method_name = "ainvoke", tokens = None, model = None, retry_schema_errors = True):
+    """Invoke `build_chain(llm)` on the key the scheduler picks, retrying on another key.
+
+    `model` overrides the clients' model for a cascade tier. Output that fails
+    schema validation is raised at once when `retry_schema_errors` is False,
+    so a cascade can escalate instead of retrying the same model. With
+    LLM_HEDGING on, a call slower than the LLM_HEDGE_PERCENTILE latency of its
+    pipeline is duplicated on another key and the first answer wins.
+    """
+    ensure_llm_clients()
+    if tokens is None:
+        tokens = estimate_tokens(payload)
+    tried = set()
     last_exc = None
-    async with _llm_semaphore:
-        while attempt < LLM_RETRY_ATTEMPTS:
-            try:
-                invoke = getattr(llm, method_name)
-                result = await invoke(payload)
-                return result
-            except Exception as exc:
-                last_exc = exc
-                attempt += 1
-                wait = LLM_RETRY_SECONDS * (2 ** (attempt - 1))
-                logger.warning("LLM call failed (attempt %s/%s): %s. Retrying in %.1fs", attempt, LLM_RETRY_ATTEMPTS, exc, wait)
-                await asyncio.sleep(wait)
-        logger.error("LLM call failed after %s attempts: %s", LLM_RETRY_ATTEMPTS, last_exc)
-        raise last_exc
+
+    def call(key):
+        return _call_on_key(key, build_chain, payload, method_name, model, retry_schema_errors)
+
+    for attempt in range(1, LLM_RETRY_ATTEMPTS + 1):
+        if attempt > 1:
+            LLM_RETRIES.labels(current_pipeline()).inc()
+        with span("llm_wait"):
+            key = await llm_scheduler.acquire(tokens, avoid=tried)
+        keys = [key]
+        try:
+            return await _hedged_call(keys, tokens, call)
+        except Exception as exc:
+            if not retry_schema_errors and isinstance(exc, SCHEMA_ERRORS):
+                raise
+            last_exc = exc
+            tried.update(k.index for k in keys)
+            logger.warning("LLM call on %s failed (attempt %s/%s): %s", key.name, attempt, LLM_RETRY_ATTEMPTS, exc)
+    logger.error("LLM call failed after %s attempts: %s", LLM_RETRY_ATTEMPTS, last_exc)
+    raise last_exc
 
 
 NDPA_SEVERITY_MAP = {
@@ -316,6 +488,7 @@ NDPA_REQUIREMENT_METADATA = {
     # ──────────────────────────────────────────────
 
     "Provide Confirmation of Data Processing and Purposes": {
+        "id": "R01",
         "section": "24(1)(a–b)",
         "severity": "high",
         "description": "State what personal data you collect and why.",
@@ -323,6 +496,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Inform Data Subjects of Rights and Complaint Options": {
+        "id": "R02",
         "section": "34(1)(a–e)",
         "severity": "high",
         "description": "Explain users’ rights and how to complain to the NDPC.",
@@ -330,6 +504,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Allow Data Subjects to Withdraw Consent Easily": {
+        "id": "R03",
         "section": "35(1–2)",
         "severity": "high",
         "description": "Explain how users can withdraw consent at any time.",
@@ -337,6 +512,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Enable Data Subjects to Object to Processing": {
+        "id": "R04",
         "section": "36(1)",
         "severity": "high",
         "description": "Tell users they can object to certain types of processing.",
@@ -344,6 +520,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Cease Direct Marketing Upon Objection": {
+        "id": "R05",
         "section": "36(2)",
         "severity": "high",
         "description": "Users must be allowed to opt out of marketing.",
@@ -351,6 +528,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Obtain Explicit Consent Before Processing Sensitive Data": {
+        "id": "R06",
         "section": "30(1–2)",
         "severity": "high",
         "description": "Sensitive personal data requires explicit, informed consent.",
@@ -358,6 +536,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Implement Technical and Organisational Security Measures": {
+        "id": "R07",
         "section": "24(1)(f), 39(1–3)",
         "severity": "high",
         "description": "You must safeguard personal data from misuse or unauthorised access.",
@@ -365,6 +544,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Inform Data Subjects of High-Risk Breaches Promptly": {
+        "id": "R08",
         "section": "40(2)",
         "severity": "high",
         "description": "Users must be notified if a breach creates high risk to them.",
@@ -372,6 +552,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Erase Personal Data When No Longer Necessary": {
+        "id": "R09",
         "section": "34(5)",
         "severity": "high",
         "description": "Data must be deleted when it is no longer needed.",
@@ -379,6 +560,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Ensure Adequate Protection for Cross-Border Data Transfers": {
+        "id": "R10",
         "section": "41(1)(a), 42(1–2)",
         "severity": "high",
         "description": "Transfers must only go to countries with adequate protection or safeguards.",
@@ -386,6 +568,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Obtain Consent for Transfers Without Adequate Protection": {
+        "id": "R11",
         "section": "43(1)(a)",
         "severity": "high",
         "description": "Explicit informed consent is required if a transfer lacks adequate safeguards.",
@@ -397,6 +580,7 @@ NDPA_REQUIREMENT_METADATA = {
     # ──────────────────────────────────────────────
 
     "Disclose Categories of Personal Data and Recipients": {
+        "id": "R12",
         "section": "24(1)(b, c)",
         "severity": "medium",
         "description": "Explain what data you collect and who you share it with.",
@@ -404,6 +588,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Provide Data Retention Period or Criteria": {
+        "id": "R13",
         "section": "24(1)(d)",
         "severity": "medium",
         "description": "Explain how long personal data is stored or the criteria used.",
@@ -411,6 +596,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Provide Copy of Personal Data in Common Format": {
+        "id": "R14",
         "section": "34(2)",
         "severity": "medium",
         "description": "Users can request a copy of their personal data.",
@@ -418,6 +604,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Correct or Erase Inaccurate or Outdated Data": {
+        "id": "R15",
         "section": "34(3)",
         "severity": "medium",
         "description": "Users can request corrections or deletion of incorrect data.",
@@ -425,6 +612,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Restrict Processing Pending Resolution or Objection": {
+        "id": "R16",
         "section": "34(4)",
         "severity": "medium",
         "description": "Users may restrict processing while a complaint or objection is unresolved.",
@@ -432,6 +620,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Provide DPO as Contact Point for the Commission": {
+        "id": "R17",
         "section": "32(2–3)",
         "severity": "medium",
         "description": "You must provide the DPO’s or contact person’s details.",
@@ -439,6 +628,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Obtain Parental or Guardian Consent for Children": {
+        "id": "R18",
         "section": "31(1–3)",
         "severity": "medium",
         "description": "Children’s data cannot be processed without guardian consent.",
@@ -446,6 +636,7 @@ NDPA_REQUIREMENT_METADATA = {
     },
 
     "Verify Age and Consent Mechanisms Appropriately": {
+        "id": "R19",
         "section": "31(2)",
         "severity": "medium",
         "description": "You must verify a child’s age and guardian approval.",
@@ -455,6 +646,85 @@ NDPA_REQUIREMENT_METADATA = {
 
 
 
+NDPA_REQUIREMENT_IDS = {meta["id"]: title for title, meta in NDPA_REQUIREMENT_METADATA.items()}
+
+# Phrase-level signals that a passage addresses each requirement. Single words
+# like "purpose", "access" or "contact us" show up in cookie banners, menus and
+# footers too, so patterns name the obligation rather than its vocabulary.
+NDPA_REQUIREMENT_KEYWORDS = {
+    "R01": [
+        r"(?:information|data) we (?:collect|process)", r"what we collect", r"why we (?:collect|process|use)",
+        r"we (?:collect|process) (?:the following |your )?(?:personal )?(?:data|information)",
+        r"(?:how we )?use (?:your|this) (?:personal )?(?:data|information)", r"(?:lawful|legal) bas[ie]s", r"purposes? (?:of|for) (?:the )?(?:processing|collect)",
+    ],
+    "R02": [
+        r"your (?:privacy |data protection )?rights", r"rights? (?:of|as) (?:a )?data subject", r"lodge a complaint",
+        r"\bndpc\b", r"data protection commission", r"supervisory authority",
+    ],
+    "R03": [r"withdraw (?:your |this |such )?consent", r"revoke (?:your )?consent", r"consent at any time"],
+    "R04": [r"right to object", r"object to (?:the |our |such )?processing", r"opt[ -]?out of (?:the |our |such )?processing"],
+    "R05": [
+        r"direct marketing", r"marketing (?:communications|emails|messages)", r"unsubscribe",
+        r"promotional (?:emails|messages|communications|offers)", r"opt[ -]?out of (?:marketing|promotional)",
+    ],
+    "R06": [
+        r"sensitive (?:personal )?(?:data|information)", r"special categor(?:y|ies)", r"health (?:data|information)",
+        r"biometric", r"genetic data", r"religious (?:or philosophical )?beliefs", r"ethnic origin",
+        r"sex life|sexual orientation",
+    ],
+    "R07": [
+        r"security measures", r"(?:technical|organi[sz]ational) (?:and (?:technical|organi[sz]ational) )?measures",
+        r"encrypt(?:ed|ion)", r"protect your (?:personal )?(?:data|information)", r"unauthori[sz]ed access",
+    ],
+    "R08": [r"(?:data|personal data|security) breach", r"security incident"],
+    "R09": [
+        r"delet(?:e|ion of) (?:your )?(?:personal )?(?:data|information|account)", r"eras(?:e|ure)",
+        r"no longer (?:necessary|needed|required)", r"anonymi[sz]",
+    ],
+    "R10": [
+        r"transfer\w*\b[^.]{0,80}\b(?:outside|abroad|(?:other|these) countries)", r"outside (?:of )?nigeria",
+        r"(?:hosted|stored) (?:in|outside)", r"data cent(?:re|er)s? in",
+        r"international (?:data )?transfers?", r"cross[- ]border", r"adequa(?:te|cy) (?:level of )?protection",
+    ],
+    "R11": [
+        r"transfer\w*\b[^.]{0,80}\b(?:outside|abroad|(?:other|these) countries)", r"outside (?:of )?nigeria",
+        r"without (?:an )?adequa", r"explicit consent",
+    ],
+    "R12": [
+        r"third[- ]part(?:y|ies)", r"shar(?:e|ing) (?:your )?(?:personal )?(?:data|information)",
+        r"disclos\w* (?:your )?(?:personal )?(?:data|information)", r"recipients? of (?:your )?(?:personal )?(?:data|information)",
+        r"categories of (?:personal )?(?:data|information)",
+    ],
+    "R13": [
+        r"retain\w*\b[^.]{0,80}\bfor\b", r"retention (?:period|policy|schedule)", r"how long we (?:keep|retain|store)",
+        r"(?:keep|store) (?:your )?(?:personal )?(?:data|information) for",
+    ],
+    "R14": [
+        r"right (?:of|to) access", r"access (?:to )?(?:your|the) (?:personal )?(?:data|information)",
+        r"copy of (?:your |the )?(?:personal )?(?:data|information)", r"portab",
+    ],
+    "R15": [
+        r"rectif", r"correct (?:your |any )?(?:inaccurate )?(?:personal )?(?:data|information)",
+        r"inaccurate (?:or incomplete )?(?:personal )?(?:data|information)", r"update your (?:personal )?(?:data|information|details)",
+    ],
+    "R16": [r"restrict(?:ion of)? (?:the )?processing", r"right to restrict", r"limit (?:the )?processing"],
+    "R17": [r"data protection officer", r"\bdpo\b", r"privacy@", r"(?:privacy|data protection) (?:team|office)"],
+    "R18": [r"\bchildren\b", r"\bminors?\b", r"under the age of", r"parent(?:al)? or (?:legal )?guardian", r"parental consent"],
+    "R19": [r"verify (?:the )?(?:user'?s? |their )?age", r"age verification", r"parental consent", r"under the age of"],
+}
+# Site chrome that routing drops even inside a relevant section.
+BOILERPLATE_PATTERN = re.compile(
+    r"©|\ball rights reserved\b|\b(?:we|this (?:site|website)) uses? cookies\b|\baccept (?:all )?cookies\b"
+    r"|\bcookie (?:settings|preferences)\b|\bfollow us\b|^[^.|]*(?:\|[^.|]*){2,}$",
+    re.IGNORECASE,
+)
+NDPA_REQUIREMENT_PATTERNS = {
+    req_id: re.compile("|".join(patterns), re.IGNORECASE)
+    for req_id, patterns in NDPA_REQUIREMENT_KEYWORDS.items()
+}
+
+
+
 def get_requirement_severity(requirement_title):
     for severity, titles in NDPA_SEVERITY_MAP.items():
         if requirement_title in titles:
@@ -463,6 +733,44 @@ def get_requirement_severity(requirement_title):
 
 
 
+def finding_to_dict(finding):
+    """Expand a RequirementFinding into the full finding dict, or None for unknown ids."""
+    title = NDPA_REQUIREMENT_IDS.get(finding.requirement_id.strip().upper())
+    if title is None:
+        logger.warning("Dropping finding with unknown requirement id %r", finding.requirement_id)
+        return None
+    return {
+        "ndpa_section": NDPA_REQUIREMENT_METADATA[title]["section"],
+        "requirement_title": title,
+        "status": finding.status.value,
+        "evidence": finding.evidence,
+        "confidence": finding.confidence,
+        "gap": finding.gap,
+        "recommendation": finding.recommendation
+    }
+
+
+
+def attribute_findings(findings, unit_texts):
+    """Split a batch's findings between its content units; returns one list per unit.
+
+    A finding belongs to the unit quoting its evidence, else to the unit
+    sharing the most words with the evidence, else to the first unit.
+    """
+    normalized = [normalize_text(text).lower() for text in unit_texts]
+    unit_words = [set(re.findall(r"\w+", text)) for text in normalized]
+    attributed = [[] for _ in unit_texts]
+    for finding in findings:
+        evidence = normalize_text(finding.get("evidence") or "").lower()
+        index = next((i for i, text in enumerate(normalized) if evidence and evidence in text), None)
+        if index is None:
+            quoted = set(re.findall(r"\w+", evidence))
+            overlaps = [len(quoted & words) for words in unit_words]
+            index = overlaps.index(max(overlaps))
+        attributed[index].append(finding)
+    return attributed
+
+
 def deduplicate(findings):
     status_score = {"compliant": 3, "partial": 2, "non_compliant": 1}
     originals = {}
@@ -508,7 +816,7 @@ def get_missing_requirements(deduplicated_findings):
 
 
 
-def calculate_compliance_score(cleaned_result):
+def calculate_compliance_score(cleaned_result, final=True):
     score = 100.0
     risk_breakdown = RiskBreakdown()
     DEDUCTIONS = {
@@ -560,7 +868,8 @@ def calculate_compliance_score(cleaned_result):
     else:
         level = "non_compliant"
     
-    logger.info("Final compliance score: %.1f/100 (%s)", score, level)
+    if final:
+        logger.info("Final compliance score: %.1f/100 (%s)", score, level)
     return {
     "missing": missing, 
     "score": score, 
@@ -571,102 +880,659 @@ def calculate_compliance_score(cleaned_result):
 
 
 
-async def web_chunker_node(url):
-    cached, cached_result = await link_cached(url)
-    if cached:
+def _partial(result):
+    """Whether result left batches unanalyzed because of progressive analysis."""
+    return bool((result.get("progressive") or {}).get("batches_saved"))
+
+
+def _flight_key(url, progressive):
+    """Progressive and full scans of a URL run as separate flights."""
+    key = normalize_url(url)
+    return f"{key}#progressive" if progressive else key
+
+
+def _usable(result, progressive):
+    """Full scans only take full results; progressive scans take either."""
+    return result is not None and (progressive or not _partial(result))
+
+
+async def _cached_scan(url, progressive=False):
+    """Return a cached result for url, kicking off a refresh if it is stale."""
+    cached_result, stale = await lookup_link(url)
+    if not _usable(cached_result, progressive):
+        if cached_result is not None:
+            logger.info("Cached result for %s is progressive; running a full scan", url)
+        return None
+    if stale:
+        logger.info("Serving stale result for %s while revalidating", url)
+        _schedule_refresh(url)
+    else:
         logger.info("Cache hit for %s", url)
-        return cached_result
-
-    async def load_url(urls: List[str]):
-        loader = PlaywrightURLLoader(urls=urls, headless=PLAYWRIGHT_HEADLESS, remove_selectors=["header", "footer"])
-        docs = await loader.aload()
-        return docs
-
-    def chunk_doc(doc) -> List[Any]:
-        full_text = doc.page_content.replace("\\", "").strip()
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            separators=["\n\n", "\n", ".", "?", "!", ";", ",", " "]
-        )
-        return splitter.create_documents([full_text])
+    return cached_result
+
+
+async def cached_scan_result(url, progressive=None):
+    """The cached result for url, or None; stale results are served while revalidating."""
+    if progressive is None:
+        progressive = PROGRESSIVE_ANALYSIS
+    with pipeline("analyze"):
+        return await _cached_scan(url, progressive)
+
+
+async def web_chunker_node(url, progressive=None):
+    if progressive is None:
+        progressive = PROGRESSIVE_ANALYSIS
+    with pipeline("analyze"):
+        cached_result = await _cached_scan(url, progressive)
+        if cached_result is not None:
+            return cached_result
+
+        return await scan_flight.do(_flight_key(url, progressive), lambda emit: _scan_with_lease(url, emit, progressive))
+
+
+async def web_chunker_stream(url, progressive=None):
+    """Yield progress events for a scan, ending with {"event": "result"}."""
+    if progressive is None:
+        progressive = PROGRESSIVE_ANALYSIS
+    with pipeline("analyze"):
+        cached_result = await _cached_scan(url, progressive)
+        if cached_result is not None:
+            yield {"event": "result", "cached": True, "data": cached_result}
+            return
+
+        flight = scan_flight.stream(_flight_key(url, progressive), lambda emit: _scan_with_lease(url, emit, progressive))
+        async for event in flight:
+            if event["event"] == "result":
+                event = {**event, "cached": False}
+            yield event
+
+
+def _log_refresh_failure(task):
+    if not task.cancelled() and task.exception():
+        logger.error("Background refresh failed: %s", task.exception())
+
+
+async def _refresh(key, url):
+    llm_priority.set(BACKGROUND_PRIORITY)
+    return await scan_flight.do(key, lambda emit: _scan_with_lease(url, emit, False))
+
+
+def _schedule_refresh(url):
+    """Rescan a stale URL in the background unless a scan is already running."""
+    key = _flight_key(url, False)
+    if key in scan_flight:
+        return
+    task = asyncio.ensure_future(_refresh(key, url))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+    task.add_done_callback(_log_refresh_failure)
+
+
+async def _scan_with_lease(url, emit, progressive=None):
+    """Run the scan, letting only one uvicorn worker analyze a URL at a time."""
+    if not SCAN_LEASE_ENABLED:
+        return await _analyze_url(url, emit, progressive)
+
+    lease_key = normalize_url(url)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SCAN_LEASE_SECONDS
+    while loop.time() < deadline:
+        if await acquire_scan_lease(lease_key):
+            try:
+                cached, cached_result = await link_cached(url)
+                if cached and _usable(cached_result, progressive):
+                    return cached_result
+                return await _analyze_url(url, emit, progressive)
+            finally:
+                await release_scan_lease(lease_key)
+
+        cached, cached_result = await link_cached(url)
+        if cached and _usable(cached_result, progressive):
+            logger.info("Scan of %s finished on another worker", url)
+            return cached_result
+        await asyncio.sleep(SCAN_LEASE_POLL_SECONDS)
+
+    logger.warning("Gave up waiting on another worker's scan of %s", url)
+    return await _analyze_url(url, emit, progressive)
+
+
+def _diff_against_snapshot(full_text, units, previous):
+    """Split a rescan into reusable unit records and the text that still needs analysis.
+
+    Units still on the page keep their previous record when it was analyzed
+    (with or without findings) or routed out. Failed, new and progressively
+    skipped units are joined into the text to analyze, so a full scan never
+    inherits a progressive scan's gaps. Returns ({hash: record}, text).
+    """
+    records = (previous or {}).get("units") or {}
+    reused = {}
+    changed = []
+    for start, end, digest in units:
+        record = records.get(digest)
+        status = record and record["status"]
+        if status in ("analyzed", "routed"):
+            reused[digest] = record
+        else:
+            changed.append(full_text[start:end])
+    return reused, "\n\n".join(changed)
+
+
+def _describe_changes(previous, snapshot, reused, analyzed):
+    """Summarize what differs between two scan snapshots of the same page."""
+    before, after = set(previous["paragraphs"]), set(snapshot["paragraphs"])
+    old_statuses, new_statuses = previous.get("statuses", {}), snapshot["statuses"]
+    requirements = [
+        {
+            "requirement_id": NDPA_REQUIREMENT_METADATA.get(title, {}).get("id"),
+            "requirement_title": title,
+            "before": old_statuses.get(title),
+            "after": new_statuses.get(title),
+        }
+        for title in sorted(set(old_statuses) | set(new_statuses))
+        if old_statuses.get(title) != new_statuses.get(title)
+    ]
+    return {
+        "previous_scan": previous.get("scanned_at"),
+        "text_changed": previous.get("text_hash") != snapshot["text_hash"],
+        "paragraphs": {
+            "added": len(after - before),
+            "removed": len(before - after),
+            "unchanged": len(after & before),
+        },
+        "units_reused": reused,
+        "units_analyzed": analyzed,
+        "requirements": requirements,
+    }
+
+
+def _heading_lines(text):
+    return [line for line in (l.strip() for l in text.splitlines()) if 0 < len(line) <= 80 and not line.endswith(".")]
+
+
+def batch_priority(text, requirement_ids):
+    """How promising a batch is for the given requirements; heading matches weigh triple."""
+    headings = "\n".join(_heading_lines(text))
+    score = 0
+    for req_id in requirement_ids:
+        pattern = NDPA_REQUIREMENT_PATTERNS[req_id]
+        if pattern.search(headings):
+            score += 3
+        elif pattern.search(text):
+            score += 1
+    return score
+
+
+def requirement_signals(text):
+    """Requirement ids whose keyword patterns match somewhere in text."""
+    return {req_id for req_id, pattern in NDPA_REQUIREMENT_PATTERNS.items() if pattern.search(text)}
+
+
+def route_text(text):
+    """Drop the paragraphs of text that neither show a requirement signal nor sit under a heading that does.
+
+    A short line without a full stop starts a section when body text follows
+    it or the current section is irrelevant; otherwise it is a list item and
+    inherits the relevance of the section it is in. A heading is only kept together with
+    the first paragraph kept under it. Cookie banners, menus and footers
+    without a signal of their own are dropped, even inside a relevant
+    section. Returns the remaining paragraphs joined like a rescan diff, plus
+    counts for the routing stats.
+    """
+    paragraphs = paragraph_spans(text)
+    stripped = [text[start:end].strip() for start, end, _ in paragraphs]
+    short = [
+        len(paragraph) <= ROUTING_HEADING_CHARS and not paragraph.endswith((".", "!", "?", ":"))
+        for paragraph in stripped
+    ]
+    kept = []
+    heading = None
+    section_relevant = False
+    for i, (start, end, _) in enumerate(paragraphs):
+        paragraph = stripped[i]
+        relevant = bool(requirement_signals(paragraph))
+        if short[i]:
+            introduces_body = i + 1 < len(paragraphs) and not short[i + 1]
+            if not section_relevant or introduces_body:
+                heading, section_relevant = text[start:end], relevant
+                continue
+        if relevant or (section_relevant and not BOILERPLATE_PATTERN.search(paragraph)):
+            if heading is not None:
+                kept.append(heading)
+                heading = None
+            kept.append(text[start:end])
+    if heading is not None and section_relevant:
+        # A relevant last line has no body to wait for.
+        kept.append(heading)
+    routed = "\n\n".join(kept)
+    return routed, {
+        "paragraphs": len(paragraphs),
+        "paragraphs_dropped": len(paragraphs) - len(kept),
+        "tokens_dropped": (len(text) - len(routed)) // 4,
+    }
+
+
+def batch_requirements(text):
+    """Requirement ids to send with a batch; None (the full catalogue) when nothing matches."""
+    return requirement_signals(text) or None
+
+
+def unresolved_requirements(findings):
+    """Requirement ids without a compliant finding at PROGRESSIVE_CONFIDENCE or above."""
+    resolved = {
+        NDPA_REQUIREMENT_METADATA[title]["id"]
+        for title, finding in deduplicate({"findings": findings}).items()
+        if title in NDPA_REQUIREMENT_METADATA
+        and finding.get("status") == "compliant"
+        and finding.get("confidence", 0) >= PROGRESSIVE_CONFIDENCE
+    }
+    return set(NDPA_REQUIREMENT_IDS) - resolved
+
+
+async def _run_progressive(pending, analyze_batch, handle, findings):
+    """Analyze the most promising batches first and stop once every requirement is resolved.
+
+    Returns the number of batches skipped or cancelled.
+    """
+    queue = dict(pending)
+    running = {}
+    window = max(1, min(llm_scheduler.capacity(), len(queue)))
+
+    def launch_next():
+        remaining = unresolved_requirements(findings)
+        key = max(queue, key=lambda k: (batch_priority(queue[k][1], remaining), -queue[k][0]))
+        index, text = queue.pop(key)
+        running[asyncio.ensure_future(analyze_batch(key, index, text))] = key
+
+    if not unresolved_requirements(findings):
+        return len(queue)
+    try:
+        while queue and len(running) < window:
+            launch_next()
+        while running:
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                running.pop(task)
+                handle(*task.result())
+            if not unresolved_requirements(findings):
+                saved = len(queue) + len(running)
+                logger.info("All requirements resolved; skipped %d batch(es)", saved)
+                return saved
+            while queue and len(running) < window:
+                launch_next()
+        return 0
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+def build_compliance_report(findings, final=True):
+    """Deduplicate raw finding dicts and score them; `final=False` for intermediate scores."""
+    cleaned_findings = deduplicate({"findings": findings})
+    compliance_data = calculate_compliance_score(cleaned_findings, final=final)
+    return {
+        "compliance_score": compliance_data.get("score"),
+        "compliance_level": compliance_data.get("level"),
+        "risk_breakdown": compliance_data.get("risk_breakdown").model_dump(),
+        "overall_compliant": compliance_data.get("level") in ["compliant", "fully_compliant"],
+        "findings": cleaned_findings,
+        "missing": compliance_data.get("missing"),
+    }
+
+
+def _running_score(findings):
+    report = build_compliance_report(findings, final=False)
+    return {k: report[k] for k in ("compliance_score", "compliance_level", "risk_breakdown")}
+
 
+def _remaining(deadline):
+    """Seconds left before a monotonic deadline, or None when there is none."""
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+async def _analyze_url(url, emit=None, progressive=None):
+    emit = emit or (lambda event: None)
+    if progressive is None:
+        progressive = PROGRESSIVE_ANALYSIS
+    deadline = time.monotonic() + SCAN_DEADLINE_SECONDS if SCAN_DEADLINE_SECONDS > 0 else None
+    ensure_llm_clients()
 
     logger.info("Loading %s", url)
-    docs = await load_url([url])
+    try:
+        with span("fetch"):
+            docs, fetch_info = await asyncio.wait_for(load_policy(url), timeout=_remaining(deadline))
+    except asyncio.TimeoutError:
+        SCANS_INCOMPLETE.inc()
+        logger.warning("Scan of %s hit its %gs deadline while fetching", url, SCAN_DEADLINE_SECONDS)
+        emit({"event": "deadline", "progress": {"done": 0, "total": 0}})
+        return {"error": "deadline_exceeded"}
     if not docs or not docs[0].page_content.strip():
         logger.warning("No content found at %s", url)
         return {"error": "no_content"}
 
-    if len(docs) == 1 and any(x in docs[0].page_content.lower() for x in ["verifying you are human", "cloudflare"]):
+    if len(docs) == 1 and looks_like_bot_check(docs[0].page_content):
         logger.info("Captcha or bot-check detected for %s", url)
         return {"error": "captcha_detected"}
 
-    chunks = chunk_doc(docs[0])
-    if not chunks:
+    full_text = docs[0].page_content.replace("\\", "").strip()
+    page_units = content_units(full_text, BATCH_TOKEN_BUDGET)
+    if not page_units:
         logger.warning("No chunks produced")
         return {"error": "no_chunks"}
 
+    with span("snapshot_lookup"):
+        previous = await get_scan_snapshot(url)
+    if previous and previous.get("version") != ANALYZER_CACHE_VERSION:
+        previous = None
+    if POLICY_STORE_ENABLED:
+        # Near-duplicates of a page scanned before go through the incremental
+        # rescan instead, so edits to a known policy are still reported.
+        document, match = await find_policy_result(full_text, ANALYZER_CACHE_VERSION, url, near=previous is None)
+        if document is not None:
+            logger.info("Reusing the %s result of %s for %s", match["type"], document.get("source"), url)
+            await alias_link(url, document["key"], match, fetch_info)
+            result = aliased_data(document, match, fetch_info)
+            memory_scan_cache.set(normalize_url(url), result)
+            return result
+    reused_records, analyze_text = _diff_against_snapshot(full_text, page_units, previous)
+    if previous:
+        logger.info(
+            "Rescan of %s: reusing %d of %d unit(s)",
+            url, len(reused_records), len(page_units),
+        )
+
     analyzer_node_factory = privacy_analyzer_batch_node
-    tasks = []
-    llm = None
 
-    batches = list(batch_list(chunks, BATCH_SIZE))
-    for batch in batches:
-        combined_text = "\n\n---\n\n".join(doc.page_content for doc in batch)
-        llm = get_llm()
-        analyzer_node = analyzer_node_factory(llm)
+    routing = None
+    if RELEVANCE_ROUTING and analyze_text:
+        with span("routing"):
+            analyze_text, routing = route_text(analyze_text)
+        logger.info("Routing dropped %d of %d paragraphs", routing["paragraphs_dropped"], routing["paragraphs"])
+
+    with span("chunking"):
+        units = content_units(analyze_text, BATCH_TOKEN_BUDGET) if analyze_text else []
+    unit_keys = {unit: content_fingerprint(analyze_text[unit[0]:unit[1]], ANALYZER_CACHE_VERSION) for unit in units}
+    with span("findings_cache"):
+        cached_findings = await get_cached_findings(list(unit_keys.values()))
+    unit_results = dict(cached_findings)
+
+    # Units already analyzed, here or on any other page, are reused; the rest
+    # are packed into batches, each distinct unit once.
+    reused = [unit for unit in units if unit_keys[unit] in cached_findings]
+    uncached = []
+    seen = set(cached_findings)
+    for unit in units:
+        if unit_keys[unit] not in seen:
+            seen.add(unit_keys[unit])
+            uncached.append(unit)
+    with span("chunking"):
+        groups = pack_units(uncached, BATCH_TARGET_TOKENS, BATCH_TOKEN_BUDGET)
+    batches = ["\n\n".join(analyze_text[start:end] for start, end, _ in group) for group in groups]
+    requirement_ids = [batch_requirements(text) if routing is not None else None for text in batches]
+    batching = {
+        "units": len(units),
+        "calls": len(batches),
+        "input_tokens": sum(estimate_tokens(text) for text in batches),
+    }
+    logger.info("Packed %d of %d units into %d batches (~%d tokens)", len(uncached), len(units), len(batches), batching["input_tokens"])
+    cache_stats = {"hits": len(reused), "misses": len(uncached)}
+    CACHE_LOOKUPS.labels("findings", "hit").inc(cache_stats["hits"])
+    CACHE_LOOKUPS.labels("findings", "miss").inc(cache_stats["misses"])
+    logger.info("Findings cache: %d hit(s), %d miss(es)", cache_stats["hits"], cache_stats["misses"])
+
+    all_findings = [finding for record in reused_records.values() for finding in record.get("findings", [])]
+    pending = {index: (index, text) for index, text in enumerate(batches)}
+    emit({"event": "started", "batches": len(batches), "cached_units": len(reused), "fetch": fetch_info})
+    done = 0
+    if reused:
+        reused_findings = [finding for unit in reused for finding in cached_findings[unit_keys[unit]]]
+        all_findings.extend(reused_findings)
+        emit({
+            "event": "cached", "units": len(reused),
+            "findings": reused_findings,
+            "running": _running_score(all_findings),
+        })
+
+    full_catalogue_tokens = estimate_tokens(build_requirement_catalogue())
 
-        payload = {
-            "batch_text": combined_text,
-        }
-        tasks.append(_llm_invoke_with_retry(analyzer_node, payload, method_name="ainvoke"))
+    def catalogue_tokens_saved(index):
+        ids = requirement_ids[index]
+        return full_catalogue_tokens - estimate_tokens(build_requirement_catalogue(ids)) if ids else 0
+
+    async def analyze_batch(key, index, combined_text):
+        payload = analyzer_payload(combined_text, requirement_ids[index])
+        tokens = estimate_tokens(combined_text) + ANALYZER_PROMPT_TOKENS - catalogue_tokens_saved(index)
+
+        def invoke(model, last):
+            return _llm_invoke_with_retry(
+                analyzer_node_factory, payload, method_name="ainvoke", tokens=tokens,
+                model=model, retry_schema_errors=last,
+            )
 
-    logger.info("Invoking analyzer on %d batches", len(tasks))
-    analyzer_results = await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            result, trace = await run_cascade("analyze", ANALYZER_MODEL_TIERS, invoke, findings_escalation)
+        except Exception as exc:
+            return key, index, exc
+        cascade_traces.append(trace)
+        return key, index, result
 
-    all_findings = []
-    for result in analyzer_results:
+    cache_writes = []
+    cascade_traces = []
+    failed_keys = set()
+
+    def handle(key, index, result):
+        nonlocal done
+        done += 1
         if isinstance(result, Exception):
             logger.error("Analyzer task failed: %s", result)
-            continue
+            failed_keys.update(unit_keys[unit] for unit in groups[index])
+            emit({"event": "batch_failed", "batch": index, "progress": {"done": done, "total": len(batches)}})
+            return
         if hasattr(result, 'findings'):
-            all_findings.extend(result.findings)
-    
-    if not all_findings:
-        logger.warning("No findings produced")
-        return {"error": "no_findings"}
-
-
-    findings_dict = {
-        "findings": [
-            {
-                "ndpa_section": f.ndpa_section,
-                "requirement_title": f.requirement_title,
-                "status": f.status.value,
-                "evidence": f.evidence,
-                "confidence": f.confidence,
-                "gap": f.gap,
-                "recommendation": f.recommendation
-            }
-            for f in all_findings
-        ]
+            batch_findings = [d for d in map(finding_to_dict, result.findings) if d]
+            all_findings.extend(batch_findings)
+            group = groups[index]
+            attributed = attribute_findings(batch_findings, [analyze_text[start:end] for start, end, _ in group])
+            for unit, unit_findings in zip(group, attributed):
+                unit_results[unit_keys[unit]] = unit_findings
+                cache_writes.append(cache_findings(unit_keys[unit], unit_findings))
+            emit({
+                "event": "batch", "batch": index, "cached": False,
+                "findings": batch_findings,
+                "progress": {"done": done, "total": len(batches)},
+                "running": _running_score(all_findings),
+            })
+
+    async def analyze_all():
+        if progressive:
+            return await _run_progressive(pending, analyze_batch, handle, all_findings)
+        tasks = [asyncio.ensure_future(analyze_batch(key, index, text)) for key, (index, text) in pending.items()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                handle(*await next_done)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return 0
+
+    logger.info("Invoking analyzer on %d batches", len(pending))
+    saved = 0
+    incomplete = False
+    try:
+        saved = await asyncio.wait_for(analyze_all(), timeout=_remaining(deadline))
+    except asyncio.TimeoutError:
+        incomplete = True
+        SCANS_INCOMPLETE.inc()
+        logger.warning("Scan of %s hit its %gs deadline after %d of %d batches", url, SCAN_DEADLINE_SECONDS, done, len(batches))
+        emit({"event": "deadline", "progress": {"done": done, "total": len(batches)}})
+    if saved:
+        emit({"event": "skipped", "batches": saved, "progress": {"done": done, "total": len(batches)}})
+    with span("findings_write"):
+        await asyncio.gather(*cache_writes)
+
+    # Every unit on the page ends up analyzed (possibly without findings),
+    # routed out, skipped by progressive analysis, or failed.
+    unit_records = dict(reused_records)
+    for unit in units:
+        key = unit_keys[unit]
+        if key in unit_results:
+            unit_records[unit[2]] = {"status": "analyzed", "findings": unit_results[key]}
+        else:
+            unit_records[unit[2]] = {"status": "failed" if key in failed_keys else "skipped", "findings": []}
+    for _, _, digest in page_units:
+        unit_records.setdefault(digest, {"status": "routed", "findings": []})
+    coverage = Counter(unit_records[digest]["status"] for _, _, digest in page_units)
+    if not coverage["analyzed"] + coverage["routed"]:
+        logger.warning("No part of %s could be analyzed", url)
+        return {"error": "deadline_exceeded" if incomplete else "no_findings"}
+
+    compliance_result = build_compliance_report(all_findings)
+    compliance_result["coverage"] = {
+        "units": len(page_units),
+        **{status: coverage[status] for status in ("analyzed", "routed", "skipped", "failed")},
     }
-
-    compliance_result={}
-    cleaned_findings=deduplicate(findings_dict)
-    compliance_data= calculate_compliance_score(cleaned_findings)
-    compliance_result["compliance_score"] = compliance_data.get("score")
-    compliance_result["compliance_level"] = compliance_data.get("level")
-    compliance_result["risk_breakdown"] = compliance_data.get("risk_breakdown").model_dump()
-    compliance_result["overall_compliant"] = compliance_data.get("level") in ["compliant", "fully_compliant"]
-    compliance_result["findings"] = cleaned_findings
-    compliance_result["missing"] = compliance_data.get("missing")
-    await cache_link(url, compliance_result)
+    compliance_result["fetch"] = fetch_info
+    compliance_result["findings_cache"] = cache_stats
+    compliance_result["batching"] = batching
+    if incomplete:
+        compliance_result["incomplete"] = True
+        compliance_result["deadline"] = {
+            "seconds": SCAN_DEADLINE_SECONDS,
+            "batches_done": done,
+            "batches_total": len(batches),
+        }
+    if len(ANALYZER_MODEL_TIERS) > 1:
+        compliance_result["cascade"] = summarize_cascade(ANALYZER_MODEL_TIERS, cascade_traces)
+    if routing is not None:
+        routed_calls = [index for index, _ in pending.values()]
+        compliance_result["routing"] = {
+            **routing,
+            "calls": len(routed_calls),
+            "requirements_per_call": round(
+                sum(len(requirement_ids[i] or NDPA_REQUIREMENT_IDS) for i in routed_calls) / len(routed_calls), 1
+            ) if routed_calls else 0,
+            "tokens_saved": routing["tokens_dropped"] + sum(catalogue_tokens_saved(i) for i in routed_calls),
+        }
+    if progressive:
+        compliance_result["progressive"] = {
+            "batches_total": len(batches),
+            "batches_analyzed": len(pending) - saved,
+            "batches_saved": saved,
+        }
+    snapshot = {
+        "version": ANALYZER_CACHE_VERSION,
+        "text_hash": content_fingerprint(full_text, ANALYZER_CACHE_VERSION),
+        "paragraphs": [digest for _, _, digest in page_units],
+        "units": unit_records,
+        "statuses": {title: finding.get("status") for title, finding in compliance_result["findings"].items()},
+    }
+    if previous:
+        compliance_result["changes"] = _describe_changes(previous, snapshot, len(reused_records), len(units))
+    if not incomplete:
+        await cache_link(url, compliance_result, snapshot=snapshot)
+        # Partial results stay out of the store, which serves every caller.
+        if POLICY_STORE_ENABLED and not _partial(compliance_result):
+            stored = {name: value for name, value in compliance_result.items() if name != "changes"}
+            await store_policy_result(url, full_text, ANALYZER_CACHE_VERSION, stored, snapshot=snapshot)
     return compliance_result
 
 
+async def current_vector_store():
+    """The vector store, loaded on first use and reloaded (dropping QA caches) if its files changed."""
+    global vector_store, lexical_index
+    now = time.monotonic()
+    if vector_store is not None and now - _vector_store_state["checked"] < VECTOR_STORE_CHECK_SECONDS:
+        return vector_store
+    async with _vector_store_lock:
+        if vector_store is not None and now - _vector_store_state["checked"] < VECTOR_STORE_CHECK_SECONDS:
+            return vector_store
+        _vector_store_state["checked"] = now
+        fingerprint = await run_in_executor(vector_store_fingerprint)
+        if fingerprint != _vector_store_state["fingerprint"]:
+            logger.info("Loading vector store from %s", NDPA_QA_VECTORSTORE_PATH)
+            store = await run_in_executor(load_vector_store)
+            lexical_index = await run_in_executor(LexicalIndex.from_vector_store, store)
+            vector_store = store
+            _vector_store_state["fingerprint"] = fingerprint
+            qa_cache.bind(fingerprint)
+    return vector_store
+
+
+async def warm_up():
+    """Build the LLM clients, embeddings client and retrieval indexes ahead of traffic."""
+    _warmup_state["started"] = True
+    started = time.perf_counter()
+    try:
+        ensure_llm_clients()
+        get_embeddings()
+        await current_vector_store()
+    except Exception as exc:
+        _warmup_state["error"] = str(exc)
+        logger.error("Warm-up failed: %s", exc)
+        return
+    _warmup_state["done"] = True
+    logger.info("Warm-up finished in %.2fs", time.perf_counter() - started)
+
+
+def readiness():
+    """Which lazily built components are available, and whether to take traffic.
+
+    With WARMUP_ON_STARTUP the service is ready once warm-up has finished;
+    otherwise it is ready as soon as API keys are configured.
+    """
+    keys = len(llm_scheduler.keys) or len(parse_api_keys(os.getenv("GOOGLE_API_KEYS", "")))
+    components = {
+        "llm_keys": keys,
+        "llm_clients": len(llm_scheduler.keys),
+        "vector_store": vector_store is not None,
+        "warmup": "done" if _warmup_state["done"] else "failed" if _warmup_state["error"] else "running" if _warmup_state["started"] else "skipped",
+    }
+    ready = keys > 0 and (_warmup_state["done"] or not WARMUP_ON_STARTUP)
+    return {"ready": ready, "components": components}
+
+
+async def embed_query(text):
+    """Embed a query, reusing the vector of an identical earlier query."""
+    with span("embedding"):
+        return (await embed_queries(get_embeddings(), [text]))[0]
+
+
+async def ndpa_retrieve(queries, k=QA_RETRIEVAL_K, mmr=False, fetch_k=RETRIEVAL_DEFAULT_FETCH_K, lambda_mult=0.5, score_threshold=None):
+    """Batched retrieval for bulk QA and evaluation runs."""
+    store = await current_vector_store()
+    results = await retrieve_many(store, get_embeddings(), queries, k, mmr, fetch_k, lambda_mult, score_threshold)
+    return [
+        [{"content": doc.page_content, "metadata": doc.metadata, "score": round(score, 4)} for doc, score in hits]
+        for hits in results
+    ]
+
+
+def answer_escalation(result):
+    """Escalate QA answers that failed the schema or declined to answer."""
+    message = getattr(result, "message", None)
+    if not message:
+        return "schema"
+    if QA_NO_ANSWER.lower() in message.lower():
+        return "no_answer"
+    return None
+
+
 async def ndpa_rag(question):
+    """Answer an NDPA question, returning {"message", "path"}.
+
+    `path` records how the answer was produced: "greeting", "closing" and "cached" make
+    no LLM call, "lexical" answers from a strong BM25 match without embedding
+    the question, "direct" retrieves on the question as asked (BM25 fused with
+    FAISS), and "rewritten" first asks the LLM to rewrite a question that
+    retrieved poorly.
+    """
+    with pipeline("qa"):
+        return await _ndpa_rag(question)
+
+
+async def _ndpa_rag(question):
+    from langchain_core.prompts import ChatPromptTemplate
 
     async def rewrite_query(original_question):
         rewrite_prompt = ChatPromptTemplate.from_messages([
@@ -675,12 +1541,19 @@ async def ndpa_rag(question):
             for the purpose of document retrieval. Keep it short and remove chatty text."""),
             ("user", original_question)
         ])
-        llm = get_llm()
-        result = await _llm_invoke_with_retry(rewrite_prompt | llm, {})
+        with span("rewrite"):
+            result = await _llm_invoke_with_retry(
+                lambda llm: rewrite_prompt | llm, {}, tokens=estimate_tokens(original_question) + 100, model=QA_MODEL_TIERS[0]
+            )
         return result.content.strip()
 
-    def retrieve_docs(clean_query):
-        return vector_store.similarity_search(clean_query, k=3)
+    async def retrieve_docs(store, query, query_vector):
+        """Vector hits fused with BM25 hits; the score returned is the best vector cosine."""
+        with span("retrieval"):
+            vector_hits = await search_by_vector(store, query_vector, QA_RETRIEVAL_K)
+            lexical_hits, _ = lexical_index.search(query, QA_RETRIEVAL_K)
+        confidence = vector_hits[0][1] if vector_hits else 0.0
+        return reciprocal_rank_fusion(vector_hits, lexical_hits, k=QA_RETRIEVAL_K), confidence
 
     def format_docs(rag_docs):
         return "\n".join([f"---\n{d.page_content.strip()}\n" for d in rag_docs])
@@ -709,18 +1582,73 @@ STRICT RULES:
             ("user", question)
         ])
 
-    clean_query = await rewrite_query(question)
-
-    rag_docs = retrieve_docs(clean_query)
+    with span("classify"):
+        kind, cleaned = classify_question(question)
+    if kind == "greeting":
+        return {"message": GREETING_REPLY, "path": "greeting"}
+    if kind == "closing":
+        return {"message": CLOSING_REPLY, "path": "closing"}
+
+    store = await current_vector_store()
+    key = normalize_question(cleaned)
+    answer = qa_cache.answers.get_exact(key)
+    if answer is not None:
+        qa_cache.stats["answer_hits"] += 1
+        count_cache("qa_answer", "hit")
+        return {"message": answer, "path": "cached"}
+
+    question_vector = None
+    with span("lexical"):
+        lexical_hits, strong = lexical_index.search(cleaned, QA_RETRIEVAL_K)
+    if kind == "question" and strong:
+        path = "lexical"
+        scored_docs, confidence = lexical_hits, 1.0
+        qa_cache.stats["misses"] += 1
+        count_cache("qa_answer", "miss")
+    else:
+        question_vector = await embed_query(key)
+        hit = qa_cache.answers.get(question_vector)
+        if hit is not None:
+            answer, similarity = hit
+            qa_cache.stats["answer_hits"] += 1
+            count_cache("qa_answer", "hit")
+            logger.info("QA answer cache hit (similarity %.3f)", similarity)
+            return {"message": answer, "path": "cached"}
+        qa_cache.stats["misses"] += 1
+        count_cache("qa_answer", "miss")
+        scored_docs, confidence = await retrieve_docs(store, cleaned, question_vector)
+        path = "direct"
+
+    if path == "direct" and (kind != "question" or confidence < QA_DIRECT_CONFIDENCE):
+        path = "rewritten"
+        cached_rewrite = qa_cache.rewrites.get(key)
+        if cached_rewrite is not None:
+            qa_cache.stats["rewrite_hits"] += 1
+            count_cache("qa_rewrite", "hit")
+            clean_query = cached_rewrite[0]
+        else:
+            count_cache("qa_rewrite", "miss")
+            clean_query = await rewrite_query(question)
+            qa_cache.rewrites.set(key, clean_query)
+        scored_docs, _ = await retrieve_docs(store, clean_query, await embed_query(clean_query))
+    logger.info("QA path %s (retrieval confidence %.3f)", path, confidence)
+    rag_docs = [doc for doc, _ in scored_docs]
     formatted_docs = format_docs(rag_docs)
     prompt = build_answer_prompt(formatted_docs)
 
-    llm = get_llm()
     payload = {"rag_docs": formatted_docs}
 
-    response = await _llm_invoke_with_retry(
-        prompt | llm.with_structured_output(QARagResposneSchema),
-        payload
-    )
+    def invoke(model, last):
+        return _llm_invoke_with_retry(
+            lambda llm: prompt | llm.with_structured_output(QARagResposneSchema),
+            payload,
+            tokens=estimate_tokens(formatted_docs) + estimate_tokens(question) + 400,
+            model=model,
+            retry_schema_errors=last,
+        )
+
+    with span("answer"):
+        response, _ = await run_cascade("qa", QA_MODEL_TIERS, invoke, answer_escalation)
 
-    return response.message
+    qa_cache.answers.set(key, question_vector, response.message)
+    return {"message": response.message, "path": path}
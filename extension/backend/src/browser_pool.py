@@ -0,0 +1,169 @@
+from typing import List, Optional
+from contextlib import asynccontextmanager
+import os
+import asyncio
+import logging
+
+from langchain_core.documents import Document
+
+
+logger = logging.getLogger(__name__)
+
+
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "4"))
+BROWSER_POOL_BROWSERS = int(os.getenv("BROWSER_POOL_BROWSERS", "1"))
+BROWSER_POOL_ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_POOL_ACQUIRE_TIMEOUT", "20"))
+BROWSER_PAGE_TIMEOUT_MS = int(os.getenv("BROWSER_PAGE_TIMEOUT_MS", "30000"))
+PLAYWRIGHT_HEADLESS = True
+
+
+class BrowserPoolExhausted(Exception):
+    """Raised when no browser page frees up within the acquire timeout."""
+
+
+class _Slot:
+    """A concurrency slot bound to one browser, holding the current scan's context + page."""
+
+    def __init__(self, browser_index):
+        self.browser_index = browser_index
+        self.context = None
+        self.page = None
+
+
+class BrowserPool:
+    """Long-lived Chromium browsers handing out pages to scans.
+
+    Every borrow gets a fresh browser context, closed when the scan ends, so
+    cookies, local/session storage, IndexedDB, service workers and permissions
+    never carry over between sites; only the browser process stays warm. A
+    browser that disconnects is relaunched the next time one of its slots is
+    borrowed. When every slot is busy callers wait up to `acquire_timeout`
+    before `BrowserPoolExhausted` is raised.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, browsers=BROWSER_POOL_BROWSERS,
+                 acquire_timeout=BROWSER_POOL_ACQUIRE_TIMEOUT,
+                 headless=PLAYWRIGHT_HEADLESS):
+        self.size = max(1, size)
+        self.browsers = max(1, min(browsers, self.size))
+        self.acquire_timeout = acquire_timeout
+        self.headless = headless
+        self._playwright = None
+        self._browsers: List[Optional[object]] = [None] * self.browsers
+        self._launch_locks = [asyncio.Lock() for _ in range(self.browsers)]
+        self._idle: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+        self._started = False
+        self._waiting = 0
+
+    @property
+    def started(self):
+        return self._started
+
+    @property
+    def waiting(self):
+        """Number of scans currently waiting for a free slot."""
+        return self._waiting
+
+    async def start(self):
+        async with self._start_lock:
+            if self._started:
+                return
+            from playwright.async_api import async_playwright
+
+            self._playwright = await async_playwright().start()
+            self._idle = asyncio.Queue()
+            for i in range(self.size):
+                self._idle.put_nowait(_Slot(i % self.browsers))
+            for i in range(self.browsers):
+                await self._get_browser(i)
+            self._started = True
+            logger.info("Browser pool started: %d browser(s), %d slot(s)", self.browsers, self.size)
+
+    async def close(self):
+        async with self._start_lock:
+            if not self._started:
+                return
+            self._started = False
+            for browser in self._browsers:
+                if browser is not None:
+                    try:
+                        await browser.close()
+                    except Exception as exc:
+                        logger.debug("Ignoring error while closing browser: %s", exc)
+            self._browsers = [None] * self.browsers
+            await self._playwright.stop()
+            self._playwright = None
+            logger.info("Browser pool closed")
+
+    async def _get_browser(self, index):
+        browser = self._browsers[index]
+        if browser is not None and browser.is_connected():
+            return browser
+        async with self._launch_locks[index]:
+            browser = self._browsers[index]
+            if browser is None or not browser.is_connected():
+                if browser is not None:
+                    logger.warning("Browser %d disconnected, relaunching", index)
+                browser = await self._playwright.chromium.launch(headless=self.headless)
+                self._browsers[index] = browser
+        return browser
+
+    async def _prepare(self, slot):
+        browser = await self._get_browser(slot.browser_index)
+        slot.context = await browser.new_context()
+        slot.context.set_default_timeout(BROWSER_PAGE_TIMEOUT_MS)
+        slot.page = await slot.context.new_page()
+        return slot.page
+
+    async def _release(self, slot):
+        context = slot.context
+        slot.context = slot.page = None
+        try:
+            if context is not None:
+                await context.close()
+        except Exception as exc:
+            logger.debug("Ignoring error while closing context: %s", exc)
+        finally:
+            self._idle.put_nowait(slot)
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a page in a fresh context for the duration of the `async with` block."""
+        if not self._started:
+            await self.start()
+        self._waiting += 1
+        try:
+            slot = await asyncio.wait_for(self._idle.get(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise BrowserPoolExhausted(
+                f"No browser page available after {self.acquire_timeout:.0f}s"
+            )
+        finally:
+            self._waiting -= 1
+        try:
+            yield await self._prepare(slot)
+        finally:
+            await asyncio.shield(self._release(slot))
+
+    async def load(self, url, remove_selectors=None) -> List[Document]:
+        """Render `url` on a pooled page, mirroring `PlaywrightURLLoader.aload`."""
+        from langchain_community.document_loaders.url_playwright import UnstructuredHtmlEvaluator
+
+        evaluator = UnstructuredHtmlEvaluator(remove_selectors=remove_selectors)
+        try:
+            async with self.page() as page:
+                response = await page.goto(url)
+                if response is None:
+                    raise ValueError(f"page.goto() returned None for url {url}")
+                text = await evaluator.evaluate_async(page, page.context.browser, response)
+        except BrowserPoolExhausted:
+            raise
+        except Exception as exc:
+            # Covers failures opening the context too; the slot is released either way.
+            logger.error("Error fetching or processing %s, exception: %s", url, exc)
+            return []
+        return [Document(page_content=text, metadata={"source": url})]
+
+
+browser_pool = BrowserPool()
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+import json
+import time
+
+
+class LRUCache:
+    """In-process LRU cache bounded by entry count, total bytes and age.
+
+    Entry sizes are estimated from their JSON encoding, which is close enough
+    to keep memory bounded for the dict payloads we store.
+    """
+
+    def __init__(self, max_entries, max_bytes, ttl_seconds):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    @staticmethod
+    def estimate_size(value):
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return len(repr(value))
+
+    def get(self, key):
+        """Return (value, stored_at) or None when missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, size, stored_at = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            self.pop(key)
+            return None
+        self._data.move_to_end(key)
+        return value, stored_at
+
+    def set(self, key, value, stored_at=None):
+        size = self.estimate_size(value)
+        if size > self.max_bytes:
+            self.pop(key)
+            return
+        self.pop(key)
+        self._data[key] = (value, size, stored_at if stored_at is not None else time.time())
+        self._bytes += size
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, evicted_size, _) = self._data.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        return entry
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
@@ -0,0 +1,93 @@
+from collections import Counter
+import os
+import time
+import logging
+
+from langchain_core.exceptions import OutputParserException
+from pydantic import ValidationError
+
+from .metrics import MODEL_CALLS, MODEL_SECONDS, MODEL_ESCALATIONS
+
+
+logger = logging.getLogger(__name__)
+
+
+CASCADE_MIN_CONFIDENCE = float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.7"))
+SCHEMA_ERRORS = (OutputParserException, ValidationError)
+
+
+def model_tiers(endpoint, default):
+    """Models for an endpoint from <ENDPOINT>_MODEL_TIERS, cheapest first.
+
+    e.g. ANALYZER_MODEL_TIERS="gemini-2.0-flash-lite,gemini-2.0-flash". An
+    unset variable gives a single tier, which never escalates.
+    """
+    raw = os.getenv(f"{endpoint}_MODEL_TIERS", "")
+    return [model.strip() for model in raw.split(",") if model.strip()] or [default]
+
+
+def findings_escalation(result):
+    """Why a first-pass analyzer result needs the next tier, or None to accept it."""
+    findings = getattr(result, "findings", None)
+    if findings is None:
+        return "schema"
+    if any(getattr(f.status, "value", f.status) == "partial" for f in findings):
+        return "partial"
+    if any(f.confidence < CASCADE_MIN_CONFIDENCE for f in findings):
+        return "low_confidence"
+    return None
+
+
+async def run_cascade(pipeline, tiers, invoke, escalation_reason):
+    """Call `invoke(model, last)` tier by tier until a result is accepted.
+
+    `escalation_reason(result)` returns None to accept a result or a short
+    reason to try the next tier; schema errors escalate too. The last tier's
+    result is always returned. Returns (result, trace) where trace records
+    the model that answered and each escalation.
+    """
+    trace = {"model": None, "escalations": []}
+    for position, model in enumerate(tiers):
+        last = position == len(tiers) - 1
+        started = time.perf_counter()
+        try:
+            result = await invoke(model, last)
+            reason = None if last else escalation_reason(result)
+        except SCHEMA_ERRORS as exc:
+            if last:
+                MODEL_CALLS.labels(pipeline, model, "failed").inc()
+                raise
+            result, reason = None, "schema"
+            logger.info("%s output from %s failed validation: %s", pipeline, model, exc)
+        except Exception:
+            MODEL_CALLS.labels(pipeline, model, "failed").inc()
+            raise
+        finally:
+            MODEL_SECONDS.labels(pipeline, model).observe(time.perf_counter() - started)
+        trace["model"] = model
+        if reason is None:
+            MODEL_CALLS.labels(pipeline, model, "accepted").inc()
+            return result, trace
+        MODEL_CALLS.labels(pipeline, model, "escalated").inc()
+        MODEL_ESCALATIONS.labels(pipeline, model, reason).inc()
+        trace["escalations"].append({"from": model, "reason": reason})
+        logger.info("Escalating %s call from %s (%s)", pipeline, model, reason)
+
+
+def summarize_cascade(tiers, traces):
+    """Per-tier call counts and escalation rate for a set of cascade traces."""
+    calls = Counter()
+    reasons = Counter()
+    for trace in traces:
+        for escalation in trace["escalations"]:
+            calls[escalation["from"]] += 1
+            reasons[escalation["reason"]] += 1
+        if trace["model"]:
+            calls[trace["model"]] += 1
+    first = calls.get(tiers[0], 0)
+    return {
+        "tiers": tiers,
+        "calls": {model: calls.get(model, 0) for model in tiers},
+        "escalations": dict(reasons),
+        "escalation_rate": round(sum(1 for t in traces if t["escalations"]) / first, 3) if first else 0.0,
+    }
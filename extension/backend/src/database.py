@@ -5,3 +5,8 @@ load_dotenv()
 client=motor_asyncio.AsyncIOMotorClient(os.getenv("MONGODB_URL"))
 db=client['datavault-extension']
 scan_cache_table=db['scan_cache']
+findings_cache_table=db['findings_cache']
+policy_results_table=db['policy_results']
+url_aliases_table=db['url_aliases']
+scan_jobs_table=db['scan_jobs']
+scan_job_items_table=db['scan_job_items']
@@ -0,0 +1,189 @@
+from typing import List, Optional, Tuple
+import os
+import time
+import asyncio
+import logging
+
+import aiohttp
+from langchain_core.documents import Document
+
+from .browser_pool import browser_pool
+from .utils import looks_like_bot_check
+
+
+logger = logging.getLogger(__name__)
+
+
+FETCH_MODE = os.getenv("FETCH_MODE", "auto")          # auto | static | browser
+STATIC_FETCH_TIMEOUT = float(os.getenv("STATIC_FETCH_TIMEOUT", "10"))
+STATIC_FETCH_MAX_BYTES = int(os.getenv("STATIC_FETCH_MAX_BYTES", str(3 * 1024 * 1024)))
+STATIC_FETCH_CHUNK_BYTES = 64 * 1024
+STATIC_MIN_TEXT_CHARS = int(os.getenv("STATIC_MIN_TEXT_CHARS", "1500"))
+REMOVE_SELECTORS = ["header", "footer"]
+
+STATIC_USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+BLOCK_TAGS = [
+    "h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "dt", "dd",
+    "td", "th", "caption", "blockquote", "pre", "address", "summary",
+]
+NON_CONTENT_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "canvas"]
+SPA_ROOT_SELECTORS = ["#root", "#app", "#__next", "#__nuxt", "[ng-app]", "app-root"]
+JS_REQUIRED_MARKERS = [
+    "enable javascript",
+    "javascript is required",
+    "javascript is disabled",
+    "you need to enable javascript",
+]
+
+fetch_stats = {"static": 0, "browser": 0, "fallback": 0}
+
+_http_session: Optional[aiohttp.ClientSession] = None
+
+
+def _get_http_session():
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=STATIC_FETCH_TIMEOUT),
+            headers={
+                "User-Agent": STATIC_USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "en-US,en;q=0.9",
+            },
+        )
+    return _http_session
+
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+
+def html_to_text(html, remove_selectors=None, encoding=None):
+    """Extract readable text from HTML, returning (text, looks_js_only).
+
+    `html` may be raw bytes: `encoding` (the header charset) is tried first,
+    then BeautifulSoup falls back to the BOM, `<meta charset>` and detection.
+    Leaf block elements are joined with blank lines so the result splits the
+    same way as the unstructured output produced by the browser path.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser", from_encoding=encoding if isinstance(html, bytes) else None)
+
+    noscript = " ".join(tag.get_text(" ", strip=True) for tag in soup.find_all("noscript")).lower()
+    js_required = any(marker in noscript for marker in JS_REQUIRED_MARKERS)
+
+    for tag in soup.find_all(NON_CONTENT_TAGS):
+        tag.decompose()
+    for selector in remove_selectors or []:
+        for tag in soup.select(selector):
+            tag.decompose()
+
+    body = soup.body or soup
+    blocks = []
+    for tag in body.find_all(BLOCK_TAGS):
+        if tag.find(BLOCK_TAGS):
+            continue
+        text = " ".join(tag.get_text(" ", strip=True).split())
+        if text:
+            blocks.append(text)
+    text = "\n\n".join(blocks)
+
+    loose_text = " ".join(body.get_text(" ", strip=True).split())
+    if len(text) < len(loose_text) // 2:
+        # Content lives in bare <div>/<span> soup rather than block tags.
+        text = body.get_text("\n\n", strip=True)
+
+    spa_shell = any(
+        not " ".join(tag.get_text(" ", strip=True).split())
+        for selector in SPA_ROOT_SELECTORS
+        for tag in soup.select(selector)
+    )
+    looks_js_only = js_required or (spa_shell and len(text) < STATIC_MIN_TEXT_CHARS)
+    return text, looks_js_only
+
+
+async def fetch_static(url, remove_selectors=None) -> Tuple[List[Document], Optional[str]]:
+    """Fetch `url` over plain HTTP.
+
+    Returns (docs, fallback_reason); a non-empty reason means the page should
+    be rendered in the browser instead. Bodies over STATIC_FETCH_MAX_BYTES are
+    cut there and reported as "truncated".
+    """
+    session = _get_http_session()
+    try:
+        async with session.get(url, allow_redirects=True) as response:
+            if response.status >= 400:
+                return [], f"http_{response.status}"
+            content_type = response.headers.get("Content-Type", "").lower()
+            if "html" not in content_type:
+                return [], "not_html"
+            chunks = []
+            size = 0
+            truncated = False
+            async for chunk in response.content.iter_chunked(STATIC_FETCH_CHUNK_BYTES):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > STATIC_FETCH_MAX_BYTES:
+                    truncated = True
+                    break
+            raw = b"".join(chunks)[:STATIC_FETCH_MAX_BYTES]
+            charset = response.charset
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        logger.info("Static fetch failed for %s: %s", url, exc)
+        return [], "fetch_error"
+
+    text, looks_js_only = await asyncio.to_thread(html_to_text, raw, remove_selectors, charset)
+    docs = [Document(page_content=text, metadata={"source": url})] if text else []
+    if looks_like_bot_check(text):
+        return docs, "bot_check"
+    if truncated:
+        logger.warning("Static fetch of %s stopped at %d bytes", url, STATIC_FETCH_MAX_BYTES)
+        return docs, "truncated"
+    if looks_js_only:
+        return docs, "js_only"
+    if len(text) < STATIC_MIN_TEXT_CHARS:
+        return docs, "thin"
+    return docs, None
+
+
+async def fetch_browser(url, remove_selectors=None) -> List[Document]:
+    return await browser_pool.load(url, remove_selectors=remove_selectors)
+
+
+async def load_policy(url, mode=None):
+    """Load a policy page, preferring the static path when FETCH_MODE allows.
+
+    Returns (docs, fetch_info) where fetch_info records the path used, why the
+    static path was abandoned (if it was) and how long each path took.
+    """
+    mode = mode or FETCH_MODE
+    fetch_info = {"path": None, "fallback_reason": None, "static_ms": None, "browser_ms": None}
+
+    if mode in ("auto", "static"):
+        started = time.perf_counter()
+        docs, reason = await fetch_static(url, REMOVE_SELECTORS)
+        fetch_info["static_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if not reason or mode == "static":
+            fetch_info["path"] = "static"
+            fetch_info["fallback_reason"] = reason
+            fetch_stats["static"] += 1
+            logger.info("Static fetch of %s took %.0fms", url, fetch_info["static_ms"])
+            return docs, fetch_info
+        fetch_info["fallback_reason"] = reason
+        fetch_stats["fallback"] += 1
+        logger.info("Static fetch of %s unusable (%s), falling back to browser", url, reason)
+
+    started = time.perf_counter()
+    docs = await fetch_browser(url, REMOVE_SELECTORS)
+    fetch_info["browser_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    fetch_info["path"] = "browser"
+    fetch_stats["browser"] += 1
+    logger.info("Browser fetch of %s took %.0fms", url, fetch_info["browser_ms"])
+    return docs, fetch_info
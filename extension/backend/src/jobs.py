@@ -0,0 +1,223 @@
+from datetime import datetime, timezone, timedelta
+import os
+import uuid
+import asyncio
+import logging
+
+from pymongo import ReturnDocument
+
+from .database import scan_jobs_table, scan_job_items_table
+from .browser_pool import BrowserPoolExhausted
+from .scheduler import LLMCapacityError
+from .metrics import start_timings, reset_timings
+from .admission import set_priority
+from .scheduler import llm_priority
+from .utils import normalize_url, cached_links, WORKER_ID
+from .agents import web_chunker_node
+
+
+logger = logging.getLogger(__name__)
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_URLS = int(os.getenv("JOB_MAX_URLS", "1000"))
+JOB_MAX_ATTEMPTS = 3
+JOB_LEASE_SECONDS = 60
+JOB_POLL_SECONDS = 5.0
+JOB_RESULTS_PAGE_LIMIT = 100
+
+# Failures worth retrying later rather than recording against the URL.
+RETRYABLE_ERRORS = (BrowserPoolExhausted, LLMCapacityError)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _public(doc, fields):
+    out = {}
+    for field in fields:
+        value = doc.get(field)
+        out[field] = value.isoformat() if isinstance(value, datetime) else value
+    return out
+
+
+JOB_FIELDS = ["job_id", "status", "submitted", "total", "duplicates", "cached", "done", "failed", "created", "updated", "finished"]
+ITEM_FIELDS = ["seq", "url", "status", "attempts", "error", "result", "finished"]
+
+
+async def create_job(urls):
+    """Persist a scan job with one item per distinct normalized URL."""
+    job_id = uuid.uuid4().hex
+    now = _now()
+    unique = {}
+    for url in urls:
+        unique.setdefault(normalize_url(url), url)
+
+    cached = await cached_links(unique.keys())
+    items = []
+    for seq, (link, url) in enumerate(unique.items()):
+        item = {
+            "job_id": job_id, "seq": seq, "url": url, "link": link,
+            "status": "pending", "attempts": 0, "error": None, "result": None,
+            "lease_expires": None, "created": now, "finished": None,
+        }
+        if link in cached:
+            item.update(status="done", result=cached[link], finished=now)
+        items.append(item)
+
+    done = len(cached)
+    job = {
+        "_id": job_id, "job_id": job_id,
+        "status": "completed" if done == len(items) else "queued",
+        "submitted": len(urls), "total": len(items), "duplicates": len(urls) - len(items),
+        "cached": done, "done": done, "failed": 0,
+        "created": now, "updated": now, "finished": now if done == len(items) else None,
+    }
+    await scan_jobs_table.insert_one(job)
+    await scan_job_items_table.insert_many(items)
+    logger.info("Created scan job %s: %d URL(s), %d already cached", job_id, len(items), done)
+    job_runner.wake()
+    return _public(job, JOB_FIELDS)
+
+
+async def get_job(job_id):
+    job = await scan_jobs_table.find_one({"_id": job_id})
+    return _public(job, JOB_FIELDS) if job else None
+
+
+async def get_job_results(job_id, offset=0, limit=50, status=None):
+    query = {"job_id": job_id}
+    if status:
+        query["status"] = status
+    limit = max(1, min(limit, JOB_RESULTS_PAGE_LIMIT))
+    total = await scan_job_items_table.count_documents(query)
+    cursor = scan_job_items_table.find(query).sort("seq", 1).skip(max(0, offset)).limit(limit)
+    items = [_public(doc, ITEM_FIELDS) async for doc in cursor]
+    return {"job_id": job_id, "offset": offset, "limit": limit, "total": total, "items": items}
+
+
+class JobRunner:
+    """Background workers that drain pending scan job items from Mongo.
+
+    Items are claimed with a renewable lease, so after a restart (or a crashed
+    worker) unfinished items become claimable again once the lease lapses and
+    the job resumes where it stopped.
+    """
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self._tasks = []
+        self._wake = asyncio.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    async def start(self):
+        if self._tasks or self.workers <= 0:
+            return
+        await scan_job_items_table.create_index([("job_id", 1), ("seq", 1)])
+        await scan_job_items_table.create_index([("status", 1), ("created", 1)])
+        self._tasks = [asyncio.ensure_future(self._worker(i)) for i in range(self.workers)]
+        logger.info("Started %d scan job worker(s)", self.workers)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self):
+        now = _now()
+        return await scan_job_items_table.find_one_and_update(
+            {"$or": [
+                {"status": "pending"},
+                {"status": "running", "lease_expires": {"$lt": now}},
+            ]},
+            {
+                "$set": {"status": "running", "worker": WORKER_ID, "lease_expires": now + timedelta(seconds=JOB_LEASE_SECONDS)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created", 1), ("seq", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _renew_lease(self, item_id):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            await scan_job_items_table.update_one(
+                {"_id": item_id, "worker": WORKER_ID},
+                {"$set": {"lease_expires": _now() + timedelta(seconds=JOB_LEASE_SECONDS)}}
+            )
+
+    async def _worker(self, index):
+        while True:
+            try:
+                item = await self._claim()
+                if item is None:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=JOB_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._process(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error("Scan job worker %d error: %s", index, exc)
+                await asyncio.sleep(JOB_POLL_SECONDS)
+
+    async def _process(self, item):
+        job_id = item["job_id"]
+        await scan_jobs_table.update_one({"_id": job_id, "status": "queued"}, {"$set": {"status": "running", "updated": _now()}})
+
+        renewer = asyncio.ensure_future(self._renew_lease(item["_id"]))
+        _, timings_token = start_timings("jobs")
+        priority_token = set_priority("bulk")
+        try:
+            result = await web_chunker_node(item["url"])
+        except RETRYABLE_ERRORS as exc:
+            if item["attempts"] < JOB_MAX_ATTEMPTS:
+                logger.info("Requeueing %s after transient error: %s", item["url"], exc)
+                await scan_job_items_table.update_one(
+                    {"_id": item["_id"]}, {"$set": {"status": "pending", "lease_expires": None}}
+                )
+                return
+            result = {"error": "busy"}
+        except Exception as exc:
+            logger.error("Scan job %s failed on %s: %s", job_id, item["url"], exc)
+            result = {"error": "analysis_failed"}
+        finally:
+            renewer.cancel()
+            reset_timings(timings_token)
+            llm_priority.reset(priority_token)
+
+        failed = "error" in result
+        updated = await scan_job_items_table.update_one(
+            {"_id": item["_id"], "worker": WORKER_ID, "status": "running"},
+            {"$set": {
+                "status": "failed" if failed else "done",
+                "error": result.get("error") if failed else None,
+                "result": None if failed else result,
+                "lease_expires": None,
+                "finished": _now(),
+            }}
+        )
+        if not updated.modified_count:
+            logger.warning("Lost the lease on %s before finishing; result discarded", item["url"])
+            return
+        job = await scan_jobs_table.find_one_and_update(
+            {"_id": job_id},
+            {"$inc": {"failed" if failed else "done": 1}, "$set": {"updated": _now()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job and job["done"] + job["failed"] >= job["total"]:
+            await scan_jobs_table.update_one(
+                {"_id": job_id, "status": {"$ne": "completed"}},
+                {"$set": {"status": "completed", "finished": _now()}}
+            )
+            logger.info("Scan job %s completed: %d done, %d failed", job_id, job["done"], job["failed"])
+
+
+job_runner = JobRunner()
@@ -0,0 +1,137 @@
+from collections import Counter, defaultdict
+import os
+import re
+import math
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+LEXICAL_STRONG_COVERAGE = float(os.getenv("LEXICAL_STRONG_COVERAGE", "0.9"))
+LEXICAL_STRONG_MIN_IDF = float(os.getenv("LEXICAL_STRONG_MIN_IDF", "4.0"))
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "by", "with", "at", "from",
+    "is", "are", "was", "be", "been", "it", "its", "this", "that", "these", "those", "as",
+    "what", "which", "who", "whom", "how", "when", "where", "why", "do", "does", "did",
+    "i", "me", "my", "we", "our", "you", "your", "can", "could", "should", "would", "will",
+    "about", "under", "there", "any", "if", "not", "no", "so", "than", "then", "please", "tell",
+}
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+[a-z]?(?:\(\w{1,4}\))*")
+SECTION_PATTERN = re.compile(r"\d+[a-z]?(?:\(\w{1,4}\))*")
+SECTION_HEADING = re.compile(r"^\s*(\d+[A-Z]?)\.\s*[\u2014\u2013-]*\s*(?:\((\w{1,4})\))?")
+SUBSECTION_LINE = re.compile(r"^\s*\((\d+)\)")
+
+
+def tokenize(text):
+    """Lowercase word tokens; "34(2)(b)" also yields "34" and "34(2)" so partial citations match."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "(" in token:
+            parts = token.split("(")
+            for end in range(1, len(parts)):
+                tokens.append("(".join(parts[:end]))
+    return tokens
+
+
+def section_tokens(text):
+    """Citation tokens such as "34(2)" for the numbered subsections of an Act.
+
+    The Act prints a section as "34.—(1) ..." followed by "(2) ..." lines, so
+    the section number is carried forward onto later subsection lines.
+    """
+    tokens = []
+    section = None
+    for line in text.splitlines():
+        heading = SECTION_HEADING.match(line)
+        if heading:
+            section = heading.group(1).lower()
+            if heading.group(2):
+                tokens.append(f"{section}({heading.group(2).lower()})")
+            continue
+        subsection = SUBSECTION_LINE.match(line)
+        if subsection and section:
+            tokens.append(f"{section}({subsection.group(1)})")
+    return tokens
+
+
+class LexicalIndex:
+    """BM25 inverted index over the NDPA QA docstore."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for position, doc in enumerate(docs):
+            counts = Counter(tokenize(doc.page_content) + section_tokens(doc.page_content))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((position, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        total = len(docs)
+        self.idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.docs)
+
+    @classmethod
+    def from_vector_store(cls, store):
+        ids = [store.index_to_docstore_id[i] for i in sorted(store.index_to_docstore_id)]
+        docs = [store.docstore.search(doc_id) for doc_id in ids]
+        index = cls([doc for doc in docs if hasattr(doc, "page_content")])
+        logger.info("Built lexical index over %d documents, %d terms", len(index), len(index.postings))
+        return index
+
+    def search(self, query, k=3):
+        """Return (hits, strong): BM25-ranked (document, score) pairs and whether
+        the top hit is a confident enough match to skip vector search.
+
+        A match is strong when the top document contains query terms carrying
+        at least LEXICAL_STRONG_COVERAGE of the query's IDF weight, and that
+        weight is distinctive (LEXICAL_STRONG_MIN_IDF), or a section citation
+        in the query is matched exactly.
+        """
+        terms = list(dict.fromkeys(t for t in tokenize(query) if t in self.idf))
+        if not terms:
+            return [], False
+        scores = defaultdict(float)
+        matched = defaultdict(set)
+        for term in terms:
+            idf = self.idf[term]
+            for position, tf in self.postings[term]:
+                length_norm = 1 - BM25_B + BM25_B * self.lengths[position] / self.avg_length
+                scores[position] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+                matched[position].add(term)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        hits = [(self.docs[position], score) for position, score in ranked]
+
+        top = ranked[0][0]
+        unseen_idf = math.log(1 + (len(self.docs) + 0.5) / 0.5)
+        query_weight = sum(self.idf.get(t, unseen_idf) for t in dict.fromkeys(tokenize(query))) or 1.0
+        covered = sum(self.idf[t] for t in matched[top])
+        cites_section = any("(" in t and t in matched[top] for t in terms if SECTION_PATTERN.fullmatch(t))
+        strong = cites_section or (covered / query_weight >= LEXICAL_STRONG_COVERAGE and covered >= LEXICAL_STRONG_MIN_IDF)
+        return hits, strong
+
+
+def reciprocal_rank_fusion(*rankings, k=3):
+    """Fuse ranked (document, score) lists by reciprocal rank, keyed on content."""
+    fused = defaultdict(float)
+    docs = {}
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking):
+            key = doc.page_content
+            fused[key] += 1.0 / (RRF_K + rank + 1)
+            docs.setdefault(key, doc)
+    ordered = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    return [(docs[key], score) for key, score in ordered]
@@ -1,10 +1,26 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from .schemas import URLSchema, QASchema
-from .agents import  web_chunker_node, ndpa_rag
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from .schemas import URLSchema, QASchema, ScanJobSchema, RetrieveSchema
+from .agents import  web_chunker_node, web_chunker_stream, cached_scan_result, ndpa_rag, ndpa_retrieve, warm_up, readiness, WARMUP_ON_STARTUP, llm_scheduler, scan_flight
+from .browser_pool import browser_pool, BrowserPoolExhausted
+from .fetcher import close_http_session, FETCH_MODE
+from .jobs import job_runner, create_job, get_job, get_job_results, JOB_MAX_URLS
+from .retrieval import retrieval_executor
+from .utils import ensure_policy_store_indexes
+from .admission import admit, enter, AdmissionRejected
+from .scheduler import llm_priority
+from .metrics import (
+    start_timings, reset_timings, register_gauges, render, SERVER_TIMING_ENABLED,
+    LLM_QUEUE_DEPTH, LLM_INFLIGHT, LLM_KEY_HEALTHY, BROWSER_POOL_WAITING, SCANS_INFLIGHT,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from mangum import Mangum
 from urllib.parse import urlparse
+import asyncio
 import logging
+import time
+import json
 
 
 logging.basicConfig(
@@ -14,7 +30,25 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-app=FastAPI(title="DataVault ClauseGuard API", version="0.0.3")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if FETCH_MODE != "static":
+        await browser_pool.start()
+    await job_runner.start()
+    await ensure_policy_store_indexes()
+    warmup = asyncio.ensure_future(warm_up()) if WARMUP_ON_STARTUP else None
+    try:
+        yield
+    finally:
+        if warmup is not None:
+            warmup.cancel()
+        await job_runner.stop()
+        await browser_pool.close()
+        await close_http_session()
+        retrieval_executor.shutdown(wait=False)
+
+
+app=FastAPI(title="DataVault ClauseGuard API", version="0.0.3", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +58,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+
+@app.middleware("http")
+async def stage_timings(request: Request, call_next):
+    """Collect per-stage timings for the request and expose them via Server-Timing."""
+    timings, token = start_timings()
+    try:
+        response = await call_next(request)
+    finally:
+        reset_timings(token)
+    if SERVER_TIMING_ENABLED and timings.stages:
+        response.headers["Server-Timing"] = timings.header()
+    return response
+
+
+@register_gauges
+def _refresh_gauges():
+    now = time.monotonic()
+    LLM_QUEUE_DEPTH.set(llm_scheduler.waiting)
+    for key in llm_scheduler.keys:
+        LLM_INFLIGHT.labels(key.name).set(key.inflight)
+        LLM_KEY_HEALTHY.labels(key.name).set(1 if key.healthy(now) else 0)
+    BROWSER_POOL_WAITING.set(browser_pool.waiting)
+    SCANS_INFLIGHT.set(len(scan_flight))
+
+
 def is_valid_url(url: str) -> bool:
     try:
         result = urlparse(url)
@@ -31,23 +91,135 @@ def is_valid_url(url: str) -> bool:
     except Exception:
         return False
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        {"detail": "Server busy, retry shortly", "lane": exc.lane, "reason": exc.reason},
+        status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.get("/")
 async def home():
     return {"status": "DataVault ClauseGuard"}
 
 
+@app.get("/ready")
+async def ready():
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render()
+    return Response(body, media_type=content_type)
+
+
 
 
 @app.post("/api/v1/analyze/link")
 async def privacy_analyze(data: URLSchema):
     if not is_valid_url(data.url):
         raise HTTPException(status_code=400, detail="Invalid url")
-    result = await web_chunker_node(data.url)
+    # Cache hits need no LLM work, so they skip admission.
+    result = await cached_scan_result(data.url, data.progressive)
+    if result is not None:
+        return JSONResponse(result)
+    try:
+        async with admit("interactive"):
+            result = await web_chunker_node(data.url, data.progressive)
+    except BrowserPoolExhausted as exc:
+        logger.warning("Rejecting scan of %s: %s", data.url, exc)
+        raise HTTPException(status_code=503, detail="Scanner busy, retry shortly", headers={"Retry-After": "5"})
     return JSONResponse(result)
 
 
+@app.post("/api/v1/analyze/link/stream")
+async def privacy_analyze_stream(data: URLSchema, request: Request):
+    """Stream scan progress as NDJSON, or SSE when the client accepts text/event-stream."""
+    if not is_valid_url(data.url):
+        raise HTTPException(status_code=400, detail="Invalid url")
+    sse = "text/event-stream" in request.headers.get("accept", "")
+
+    def encode(event):
+        body = json.dumps(event)
+        return f"event: {event['event']}\ndata: {body}\n\n" if sse else body + "\n"
+
+    async def events():
+        # The lane is taken inside the generator so it is only held while the
+        # response is actually streaming; cache hits skip it entirely.
+        cached = await cached_scan_result(data.url, data.progressive)
+        if cached is not None:
+            yield encode({"event": "result", "cached": True, "data": cached})
+            return
+        try:
+            lane = await enter("interactive")
+        except AdmissionRejected as exc:
+            yield encode({"event": "error", "detail": "Scanner busy, retry shortly", "retry_after": exc.retry_after})
+            return
+        llm_priority.set(lane.priority)
+        started = time.monotonic()
+        try:
+            async for event in web_chunker_stream(data.url, data.progressive):
+                yield encode(event)
+        except BrowserPoolExhausted as exc:
+            logger.warning("Rejecting scan of %s: %s", data.url, exc)
+            yield encode({"event": "error", "detail": "Scanner busy, retry shortly"})
+        except Exception as exc:
+            logger.error("Streaming scan of %s failed: %s", data.url, exc)
+            yield encode({"event": "error", "detail": "Analysis failed"})
+        finally:
+            lane.release(time.monotonic() - started)
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/api/v1/analyze/jobs", status_code=202)
+async def create_scan_job(data: ScanJobSchema):
+    if len(data.urls) > JOB_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {JOB_MAX_URLS} urls per job")
+    invalid = [url for url in data.urls if not is_valid_url(url)]
+    if invalid:
+        raise HTTPException(status_code=400, detail={"message": "Invalid url", "urls": invalid[:20]})
+    job = await create_job(data.urls)
+    return JSONResponse(job, status_code=202)
+
+
+@app.get("/api/v1/analyze/jobs/{job_id}")
+async def scan_job_status(job_id: str):
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(job)
+
+
+@app.get("/api/v1/analyze/jobs/{job_id}/results")
+async def scan_job_results(job_id: str, offset: int = 0, limit: int = 50, status: str = None):
+    if not await get_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(await get_job_results(job_id, offset, limit, status))
+
+
 @app.post("/api/v1/ndpa/qa")
 async def ndpa_qa(data: QASchema):
-    result = await ndpa_rag(data.question)
-    return JSONResponse({"message":result})
+    async with admit("qa"):
+        result = await ndpa_rag(data.question)
+    return JSONResponse(result)
+
+
+
+
+@app.post("/api/v1/ndpa/retrieve")
+async def ndpa_retrieve_batch(data: RetrieveSchema):
+    results = await ndpa_retrieve(
+        data.queries, k=data.k, mmr=data.mmr, fetch_k=data.fetch_k,
+        lambda_mult=data.lambda_mult, score_threshold=data.score_threshold,
+    )
+    return JSONResponse({"results": results})
+
 
+# Entry point for AWS Lambda / API Gateway deployments.
+handler = Mangum(app, lifespan="auto")
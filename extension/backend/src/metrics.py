@@ -0,0 +1,179 @@
+from collections import defaultdict
+from contextlib import contextmanager
+import os
+import time
+import contextvars
+import logging
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+
+logger = logging.getLogger(__name__)
+
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "clauseguard_stage_seconds",
+    "Time spent per pipeline stage",
+    ["pipeline", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "clauseguard_cache_lookups_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"],
+)
+LLM_CALLS = Counter(
+    "clauseguard_llm_calls_total",
+    "LLM calls by API key and outcome",
+    ["key", "outcome"],
+)
+LLM_RETRIES = Counter(
+    "clauseguard_llm_retries_total",
+    "LLM calls retried on another key",
+    ["pipeline"],
+)
+LLM_RATE_LIMITED = Counter(
+    "clauseguard_llm_rate_limited_total",
+    "429 / quota errors per API key",
+    ["key"],
+)
+MODEL_CALLS = Counter(
+    "clauseguard_model_calls_total",
+    "Cascade calls by pipeline, model tier and outcome (accepted, escalated, failed)",
+    ["pipeline", "model", "outcome"],
+)
+MODEL_SECONDS = Histogram(
+    "clauseguard_model_seconds",
+    "Latency of cascade calls per model tier, retries included",
+    ["pipeline", "model"],
+    buckets=STAGE_BUCKETS,
+)
+MODEL_ESCALATIONS = Counter(
+    "clauseguard_model_escalations_total",
+    "Results passed on to the next model tier, by reason",
+    ["pipeline", "model", "reason"],
+)
+LLM_HEDGES = Counter(
+    "clauseguard_llm_hedges_total",
+    "Hedged duplicate LLM calls: sent, and whether the duplicate won or lost",
+    ["pipeline", "outcome"],
+)
+SCANS_INCOMPLETE = Counter(
+    "clauseguard_scans_incomplete_total",
+    "Scans cut short by SCAN_DEADLINE_SECONDS",
+)
+ADMISSION_ACTIVE = Gauge("clauseguard_admission_active", "Requests running per admission lane", ["lane"])
+ADMISSION_QUEUED = Gauge("clauseguard_admission_queued", "Requests waiting per admission lane", ["lane"])
+ADMISSION_WAIT_SECONDS = Histogram(
+    "clauseguard_admission_wait_seconds",
+    "Time admitted requests spent queued per lane",
+    ["lane"],
+    buckets=STAGE_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "clauseguard_admission_rejected_total",
+    "Requests turned away per lane (queue_full -> 429, queue_timeout -> 503)",
+    ["lane", "reason"],
+)
+LLM_QUEUE_DEPTH = Gauge("clauseguard_llm_queue_depth", "Calls waiting for an LLM key")
+LLM_INFLIGHT = Gauge("clauseguard_llm_inflight", "LLM calls in flight per API key", ["key"])
+LLM_KEY_HEALTHY = Gauge("clauseguard_llm_key_healthy", "1 when the key's circuit is closed", ["key"])
+BROWSER_POOL_WAITING = Gauge("clauseguard_browser_pool_waiting", "Loads waiting for a browser page")
+SCANS_INFLIGHT = Gauge("clauseguard_scans_inflight", "Distinct URL scans currently running")
+
+_current = contextvars.ContextVar("clauseguard_timings", default=None)
+_gauge_sources = []
+
+
+class Timings:
+    """Per-request stage durations, for the Server-Timing header."""
+
+    def __init__(self, pipeline="unknown"):
+        self.pipeline = pipeline
+        self.stages = defaultdict(float)
+
+    def add(self, stage, seconds):
+        self.stages[stage] += seconds
+
+    def header(self):
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+
+def start_timings(pipeline="unknown"):
+    """Attach a fresh Timings to the current context; returns (timings, token)."""
+    timings = Timings(pipeline)
+    return timings, _current.set(timings)
+
+
+def reset_timings(token):
+    _current.reset(token)
+
+
+def merge_timings(timings):
+    """Add another context's stage durations (e.g. shared work) to the current Timings."""
+    current = _current.get()
+    if current is None or timings is None or current is timings:
+        return
+    for stage, seconds in timings.stages.items():
+        current.add(stage, seconds)
+
+
+def current_pipeline():
+    timings = _current.get()
+    return timings.pipeline if timings else "unknown"
+
+
+def record(stage, seconds):
+    timings = _current.get()
+    STAGE_SECONDS.labels(timings.pipeline if timings else "unknown", stage).observe(seconds)
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage):
+    """Time a block as one stage of the current pipeline."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def pipeline(name):
+    """Label spans inside the block with `name` and record its total duration."""
+    timings = _current.get()
+    if timings is not None:
+        timings.pipeline = name
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(name, "total").observe(elapsed)
+        if timings is not None:
+            timings.add("total", elapsed)
+
+
+def count_cache(cache, result):
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def register_gauges(fn):
+    """Register a callable that refreshes gauges right before each scrape."""
+    _gauge_sources.append(fn)
+    return fn
+
+
+def render():
+    """Latest metrics in the Prometheus text format, as (body, content_type)."""
+    for fn in _gauge_sources:
+        try:
+            fn()
+        except Exception as exc:
+            logger.warning("Gauge refresh failed: %s", exc)
+    return generate_latest(), CONTENT_TYPE_LATEST
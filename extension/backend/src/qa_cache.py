@@ -0,0 +1,143 @@
+from collections import OrderedDict
+import os
+import time
+import logging
+
+import numpy as np
+
+from .cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+
+QA_CACHE_ENTRIES = int(os.getenv("QA_CACHE_ENTRIES", "1024"))
+QA_CACHE_TTL_SECONDS = float(os.getenv("QA_CACHE_TTL_HOURS", "24")) * 3600
+QA_ANSWER_CACHE_ENTRIES = int(os.getenv("QA_ANSWER_CACHE_ENTRIES", "512"))
+QA_ANSWER_SIMILARITY = float(os.getenv("QA_ANSWER_SIMILARITY", "0.95"))
+QA_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+def normalize_question(question):
+    """Lowercase and collapse whitespace and trailing punctuation."""
+    return " ".join(question.lower().split()).rstrip(" ?!.")
+
+
+class SemanticAnswerCache:
+    """LRU of (question embedding, answer) pairs matched by cosine similarity.
+
+    Vectors are stored unit-normalized and stacked lazily into one matrix, so a
+    lookup is a single matrix-vector product over at most `max_entries` rows.
+    """
+
+    def __init__(self, max_entries, ttl_seconds, threshold):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._data = OrderedDict()
+        self._matrix = None
+        self._keys = []
+
+    def __len__(self):
+        return len(self._data)
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _stack(self):
+        if self._matrix is None:
+            self._keys = [k for k, entry in self._data.items() if entry[0] is not None]
+            self._matrix = np.stack([self._data[k][0] for k in self._keys]) if self._keys else None
+        return self._matrix
+
+    def get_exact(self, key):
+        """Return the answer stored for exactly this normalized question."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[2] > self.ttl_seconds:
+            self.pop(key)
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def get(self, vector):
+        """Return (answer, similarity) for the closest live entry above the threshold."""
+        matrix = self._stack()
+        if matrix is None:
+            return None
+        scores = matrix @ self._unit(vector)
+        now = time.time()
+        for row in np.argsort(-scores):
+            if scores[row] < self.threshold:
+                return None
+            key = self._keys[row]
+            entry = self._data.get(key)
+            if entry is None:
+                continue
+            if now - entry[2] > self.ttl_seconds:
+                self.pop(key)
+                continue
+            self._data.move_to_end(key)
+            return entry[1], float(scores[row])
+        return None
+
+    def set(self, key, vector, answer):
+        """Store an answer; with no vector it can only be matched exactly."""
+        self._data.pop(key, None)
+        self._data[key] = (None if vector is None else self._unit(vector), answer, time.time())
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        self._matrix = None
+
+    def pop(self, key):
+        if self._data.pop(key, None) is not None:
+            self._matrix = None
+
+    def clear(self):
+        self._data.clear()
+        self._matrix = None
+
+
+class QACache:
+    """Caches for the NDPA QA pipeline.
+
+    Exact caches map a normalized question to its rewritten query and a query
+    string to its embedding; the semantic cache returns a stored answer for a
+    question whose embedding is close enough to one already answered. All of
+    them are dropped when the vector store they were built against changes.
+    """
+
+    def __init__(self):
+        self.rewrites = LRUCache(QA_CACHE_ENTRIES, QA_CACHE_MAX_BYTES, QA_CACHE_TTL_SECONDS)
+        self.embeddings = LRUCache(QA_CACHE_ENTRIES, QA_CACHE_MAX_BYTES, QA_CACHE_TTL_SECONDS)
+        self.answers = SemanticAnswerCache(QA_ANSWER_CACHE_ENTRIES, QA_CACHE_TTL_SECONDS, QA_ANSWER_SIMILARITY)
+        self.fingerprint = None
+        self.stats = {"rewrite_hits": 0, "embedding_hits": 0, "answer_hits": 0, "misses": 0}
+
+    def bind(self, fingerprint):
+        """Invalidate everything if the vector store fingerprint changed."""
+        if fingerprint != self.fingerprint:
+            if self.fingerprint is not None:
+                logger.info("Vector store changed; clearing QA caches")
+            self.clear()
+            self.fingerprint = fingerprint
+
+    def clear(self):
+        self.rewrites.clear()
+        self.embeddings.clear()
+        self.answers.clear()
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            "rewrites": len(self.rewrites),
+            "embeddings": len(self.embeddings),
+            "answers": len(self.answers),
+        }
+
+
+qa_cache = QACache()
@@ -0,0 +1,54 @@
+import os
+import re
+
+import numpy as np
+
+
+QA_DIRECT_CONFIDENCE = float(os.getenv("QA_DIRECT_CONFIDENCE", "0.75"))
+QA_MIN_QUESTION_WORDS = 2
+QA_MAX_QUESTION_WORDS = 40
+
+GREETING_WORDS = (
+    r"hi+|hey+|hello+|hiya|howdy|yo|greetings|good (?:morning|afternoon|evening|day)"
+    r"|how are you(?: doing)?|what'?s up"
+)
+CLOSING_WORDS = r"thanks?(?: you)?(?: so much| a lot)?|thank u|thx|ok(?:ay)?|alright|got it|bye|goodbye|cheers"
+ADDRESSEE = r"(?:\s+(?:there|all|sir|ma|madam|team|bot))?"
+GREETING_ONLY = re.compile(rf"^(?:(?:{GREETING_WORDS}){ADDRESSEE}[\s,.!?]*)+$", re.IGNORECASE)
+CLOSING_ONLY = re.compile(rf"^(?:(?:{GREETING_WORDS}|{CLOSING_WORDS}){ADDRESSEE}[\s,.!?]*)+$", re.IGNORECASE)
+GREETING_PREFIX = re.compile(rf"^(?:(?:{GREETING_WORDS}|{CLOSING_WORDS}){ADDRESSEE}[\s,.!?]+)+", re.IGNORECASE)
+FILLER_PREFIX = re.compile(r"^(?:please|pls|plz|kindly|quick question|i have a question|can you tell me|i want to know)[\s,:]+", re.IGNORECASE)
+
+
+def classify_question(question):
+    """Classify a QA message without calling the LLM.
+
+    Returns (kind, text): "greeting" for pure greetings, "closing" for thanks,
+    acknowledgements and goodbyes, "question" for a
+    short, self-contained question with any greeting/filler prefix removed,
+    and "unclear" for messages that are too short or too long to retrieve on
+    as written.
+    """
+    text = " ".join(question.split())
+    if not text or GREETING_ONLY.match(text):
+        return "greeting", text
+    if CLOSING_ONLY.match(text):
+        return "closing", text
+    text = GREETING_PREFIX.sub("", text)
+    text = FILLER_PREFIX.sub("", text)
+    words = len(text.split())
+    if QA_MIN_QUESTION_WORDS <= words <= QA_MAX_QUESTION_WORDS:
+        return "question", text
+    return "unclear", text
+
+
+def retrieval_confidence(distance):
+    """Cosine similarity from a FAISS squared-L2 distance between unit vectors."""
+    return max(0.0, min(1.0, 1.0 - distance / 2.0))
+
+
+def unit_vector(vector):
+    """Scale a query embedding to unit length so FAISS distances map to cosine."""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import os
+import asyncio
+import logging
+
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from .qa_cache import qa_cache
+from .metrics import count_cache
+from .qa_classifier import retrieval_confidence, unit_vector
+
+
+logger = logging.getLogger(__name__)
+
+
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+RETRIEVAL_MAX_QUERIES = 100
+RETRIEVAL_DEFAULT_FETCH_K = 20
+
+# FAISS releases the GIL while searching, so a few threads keep the event loop
+# free without competing with the default executor used by to_thread().
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+
+async def run_in_executor(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(retrieval_executor, fn, *args)
+
+
+async def embed_queries(embeddings, texts):
+    """Unit-length embeddings for texts; cache misses go out in one batched call."""
+    vectors = {}
+    missing = []
+    for text in dict.fromkeys(texts):
+        cached = qa_cache.embeddings.get(text)
+        if cached is not None:
+            qa_cache.stats["embedding_hits"] += 1
+            count_cache("qa_embedding", "hit")
+            vectors[text] = cached[0]
+        else:
+            count_cache("qa_embedding", "miss")
+            missing.append(text)
+    if missing:
+        if len(missing) == 1:
+            fresh = [await embeddings.aembed_query(missing[0])]
+        else:
+            fresh = await asyncio.to_thread(partial(embeddings.embed_documents, missing, task_type="RETRIEVAL_QUERY"))
+        for text, vector in zip(missing, fresh):
+            vectors[text] = unit_vector(vector)
+            qa_cache.embeddings.set(text, vectors[text])
+    return [vectors[text] for text in texts]
+
+
+def _search(store, vectors, k, mmr=False, fetch_k=RETRIEVAL_DEFAULT_FETCH_K, lambda_mult=0.5, score_threshold=None):
+    """Search many query vectors in one FAISS call.
+
+    Returns one list of (document, score) per query, where score is the cosine
+    similarity. With `mmr`, `fetch_k` candidates are re-ranked for diversity.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    depth = min(max(fetch_k, k) if mmr else k, store.index.ntotal)
+    if depth == 0:
+        return [[] for _ in vectors]
+    distances, ids = store.index.search(matrix, depth)
+
+    results = []
+    for query, row_distances, row_ids in zip(matrix, distances, ids):
+        candidates = [(int(i), retrieval_confidence(float(d))) for d, i in zip(row_distances, row_ids) if i != -1]
+        if score_threshold is not None:
+            candidates = [(i, score) for i, score in candidates if score >= score_threshold]
+        if mmr and candidates:
+            embeddings = [store.index.reconstruct(i) for i, _ in candidates]
+            chosen = maximal_marginal_relevance(query, embeddings, lambda_mult=lambda_mult, k=k)
+            candidates = [candidates[j] for j in chosen]
+        results.append([
+            (store.docstore.search(store.index_to_docstore_id[i]), score)
+            for i, score in candidates[:k]
+        ])
+    return results
+
+
+async def search_by_vector(store, vector, k):
+    """Top-k (document, cosine score) pairs for one vector, off the event loop."""
+    return (await run_in_executor(_search, store, [vector], k))[0]
+
+
+async def retrieve_many(store, embeddings, queries, k=3, mmr=False, fetch_k=RETRIEVAL_DEFAULT_FETCH_K, lambda_mult=0.5, score_threshold=None):
+    """Embed and search many queries with one embedding request and one FAISS call."""
+    vectors = await embed_queries(embeddings, queries)
+    return await run_in_executor(_search, store, vectors, k, mmr, fetch_k, lambda_mult, score_threshold)
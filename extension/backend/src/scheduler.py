@@ -0,0 +1,306 @@
+from collections import Counter, defaultdict, deque
+import os
+import time
+import asyncio
+import logging
+import contextvars
+
+
+logger = logging.getLogger(__name__)
+
+
+LLM_KEY_RPM = float(os.getenv("LLM_KEY_RPM", "60"))
+LLM_KEY_TPM = float(os.getenv("LLM_KEY_TPM", "1000000"))
+LLM_KEY_MAX_INFLIGHT = int(os.getenv("LLM_KEY_MAX_INFLIGHT", "4"))
+LLM_ACQUIRE_TIMEOUT = float(os.getenv("LLM_ACQUIRE_TIMEOUT", "60"))
+LLM_BREAKER_THRESHOLD = 3
+LLM_BREAKER_COOLDOWN_SECONDS = 5.0
+LLM_BREAKER_MAX_COOLDOWN_SECONDS = 120.0
+LLM_RATE_LIMIT_COOLDOWN_SECONDS = 30.0
+LLM_LATENCY_EWMA_ALPHA = 0.2
+LLM_RECENT_WINDOW_SECONDS = 300.0
+LLM_LATENCY_WINDOW = 200
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+
+# Priority of LLM calls made from the current context; lower values are served first.
+# The value may be a callable, re-read on every check, for work whose priority can rise.
+llm_priority = contextvars.ContextVar("llm_priority", default=1)
+
+
+def current_priority():
+    priority = llm_priority.get()
+    return priority() if callable(priority) else priority
+
+
+class LLMCapacityError(Exception):
+    """Raised when no API key can take a call within the acquire timeout."""
+
+
+def is_rate_limit_error(exc):
+    """Check if an exception is a provider-side 429 / quota error."""
+    text = str(exc)
+    return (
+        type(exc).__name__ in ("ResourceExhausted", "TooManyRequests")
+        or "429" in text
+        or "RESOURCE_EXHAUSTED" in text
+        or "quota" in text.lower()
+    )
+
+
+class TokenBucket:
+    """Budget that refills continuously up to `per_minute` units."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= amount
+
+    def seconds_until(self, amount, now):
+        """Seconds until `amount` units are available (capped at capacity)."""
+        missing = min(amount, self.capacity) - self.available(now)
+        return max(0.0, missing / self.rate) if self.rate else float("inf")
+
+
+class KeyState:
+    """Budgets, load and health of one API key."""
+
+    def __init__(self, index, client, rpm=LLM_KEY_RPM, tpm=LLM_KEY_TPM, max_inflight=LLM_KEY_MAX_INFLIGHT):
+        self.index = index
+        self.client = client
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.consecutive_failures = 0
+        self.cooldown = LLM_BREAKER_COOLDOWN_SECONDS
+        self.open_until = 0.0
+        self.half_open = False
+        self.latency_ewma = None
+        self.recent_429s = deque()
+        self.calls = 0
+        self.failures = 0
+        self.rate_limited = 0
+
+    @property
+    def name(self):
+        return f"key{self.index}"
+
+    def _prune(self, now):
+        while self.recent_429s and now - self.recent_429s[0] > LLM_RECENT_WINDOW_SECONDS:
+            self.recent_429s.popleft()
+
+    def healthy(self, now):
+        return now >= self.open_until
+
+    def can_accept(self, tokens, now):
+        if not self.healthy(now) or self.inflight >= self.max_inflight:
+            return False
+        if self.half_open and self.inflight:
+            return False
+        return self.requests.available(now) >= 1 and self.tokens.available(now) >= min(tokens, self.tokens.capacity)
+
+    def ready_in(self, tokens, now):
+        """Seconds until this key could accept a call, ignoring in-flight load."""
+        return max(
+            self.open_until - now,
+            self.requests.seconds_until(1, now),
+            self.tokens.seconds_until(tokens, now),
+        )
+
+    def headroom(self, now):
+        self._prune(now)
+        budget = min(
+            self.requests.available(now) / self.requests.capacity,
+            self.tokens.available(now) / self.tokens.capacity,
+        )
+        load = 1.0 - self.inflight / self.max_inflight
+        latency = self.latency_ewma or 0.0
+        return budget * load / (1.0 + latency) / (1.0 + len(self.recent_429s))
+
+    def trip(self, now, seconds):
+        self.open_until = now + seconds
+        self.half_open = True
+        logger.warning("Circuit open for LLM %s for %.1fs", self.name, seconds)
+
+    def snapshot(self, now):
+        self._prune(now)
+        return {
+            "key": self.name,
+            "healthy": self.healthy(now),
+            "inflight": self.inflight,
+            "rpm_available": round(self.requests.available(now), 1),
+            "tpm_available": round(self.tokens.available(now)),
+            "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "recent_429s": len(self.recent_429s),
+            "calls": self.calls,
+            "failures": self.failures,
+        }
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful calls of one kind."""
+
+    def __init__(self, size=LLM_LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        """Nearest-rank percentile, or None until LLM_HEDGE_MIN_SAMPLES calls are seen."""
+        if len(self.samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class LLMScheduler:
+    """Route LLM calls to the API key with the most headroom.
+
+    Every key gets its own RPM/TPM token buckets and in-flight cap, so total
+    concurrency grows with the number of healthy keys. Keys that fail
+    repeatedly or return 429s are circuit-broken for a cooldown that doubles on
+    each consecutive trip; the first call after the cooldown is a half-open
+    probe that closes the circuit again on success. Queued calls are served in
+    `llm_priority` order.
+    """
+
+    def __init__(self, clients=(), acquire_timeout=LLM_ACQUIRE_TIMEOUT):
+        self.acquire_timeout = acquire_timeout
+        self.keys = []
+        self._cond = asyncio.Condition()
+        self._waiting = 0
+        self._waiting_priorities = Counter()
+        self.latencies = defaultdict(LatencyWindow)
+        self.configure(clients)
+
+    def configure(self, clients):
+        self.keys = [KeyState(i, client) for i, client in enumerate(clients)]
+
+    @property
+    def waiting(self):
+        """Number of calls currently queued for a key."""
+        return self._waiting
+
+    def capacity(self):
+        """Concurrent calls the currently healthy keys can take."""
+        now = time.monotonic()
+        return sum(k.max_inflight for k in self.keys if k.healthy(now))
+
+    def observe(self, label, latency):
+        """Record the latency of a successful call of kind `label`."""
+        self.latencies[label].add(latency)
+
+    def hedge_delay(self, label):
+        """How long a `label` call may run before a hedged duplicate is worth sending."""
+        return self.latencies[label].percentile(LLM_HEDGE_PERCENTILE)
+
+    def _reserve(self, key, tokens, now):
+        key.inflight += 1
+        key.calls += 1
+        key.requests.take(1, now)
+        key.tokens.take(tokens, now)
+        return key
+
+    def try_acquire(self, tokens, avoid=()):
+        """Reserve a key outside `avoid` if one is free right now and no call is queued, else None."""
+        if self._waiting:
+            return None
+        now = time.monotonic()
+        ready = [k for k in self.keys if k.index not in avoid and k.can_accept(tokens, now)]
+        if not ready:
+            return None
+        return self._reserve(max(ready, key=lambda k: k.headroom(now)), tokens, now)
+
+    def _outranked(self, priority):
+        return any(count for waiting, count in self._waiting_priorities.items() if waiting < priority)
+
+    def _pick(self, tokens, avoid, now):
+        ready = [k for k in self.keys if k.can_accept(tokens, now)]
+        preferred = [k for k in ready if k.index not in avoid] or ready
+        if not preferred:
+            return None
+        return max(preferred, key=lambda k: k.headroom(now))
+
+    async def acquire(self, tokens, avoid=()):
+        """Reserve budget for one call and return the chosen KeyState."""
+        if not self.keys:
+            raise LLMCapacityError("No LLM API keys configured")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.acquire_timeout
+        priority = current_priority()
+        async with self._cond:
+            self._waiting += 1
+            self._waiting_priorities[priority] += 1
+            try:
+                while True:
+                    if current_priority() != priority:
+                        self._waiting_priorities[priority] -= 1
+                        priority = current_priority()
+                        self._waiting_priorities[priority] += 1
+                    now = time.monotonic()
+                    key = None if self._outranked(priority) else self._pick(tokens, avoid, now)
+                    if key is not None:
+                        return self._reserve(key, tokens, now)
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise LLMCapacityError(f"No LLM key available after {self.acquire_timeout:.0f}s")
+                    next_ready = min(k.ready_in(tokens, now) for k in self.keys)
+                    timeout = min(remaining, max(next_ready, 0.05))
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiting -= 1
+                self._waiting_priorities[priority] -= 1
+
+    async def release(self, key, latency, exc=None, cancelled=False):
+        """Return a key after a call, updating its health from the outcome."""
+        now = time.monotonic()
+        key.inflight -= 1
+        if cancelled:
+            pass  # abandoned by the caller; says nothing about the key's health
+        elif exc is None:
+            key.consecutive_failures = 0
+            key.cooldown = LLM_BREAKER_COOLDOWN_SECONDS
+            key.half_open = False
+            alpha = LLM_LATENCY_EWMA_ALPHA
+            key.latency_ewma = latency if key.latency_ewma is None else alpha * latency + (1 - alpha) * key.latency_ewma
+        else:
+            key.failures += 1
+            key.consecutive_failures += 1
+            if is_rate_limit_error(exc):
+                key.rate_limited += 1
+                key.recent_429s.append(now)
+                key.trip(now, max(LLM_RATE_LIMIT_COOLDOWN_SECONDS, key.cooldown))
+                key.cooldown = min(key.cooldown * 2, LLM_BREAKER_MAX_COOLDOWN_SECONDS)
+            elif key.half_open or key.consecutive_failures >= LLM_BREAKER_THRESHOLD:
+                key.trip(now, key.cooldown)
+                key.cooldown = min(key.cooldown * 2, LLM_BREAKER_MAX_COOLDOWN_SECONDS)
+        async with self._cond:
+            self._cond.notify_all()
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {
+            "capacity": self.capacity(),
+            "waiting": self._waiting,
+            "waiting_by_priority": {p: n for p, n in sorted(self._waiting_priorities.items()) if n},
+            "keys": [k.snapshot(now) for k in self.keys],
+        }
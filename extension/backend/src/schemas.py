@@ -10,6 +10,11 @@ class ComplianceStatus(Enum):
 
 class URLSchema(BaseModel):
     url:str
+    progressive: Optional[bool] = Field(None, description="Stop once every requirement is resolved; defaults to PROGRESSIVE_ANALYSIS")
+
+
+class ScanJobSchema(BaseModel):
+    urls: List[str] = Field(..., min_length=1, description="Privacy policy URLs to audit")
 
 
 class ValidationFinding(BaseModel):
@@ -29,6 +34,17 @@ class ValidationFinding(BaseModel):
 class ValidationFindings(BaseModel):
     findings: list[ValidationFinding]
 
+class RequirementFinding(BaseModel):
+    requirement_id: str = Field(..., description="Requirement id from the catalogue (e.g. 'R04')")
+    status: ComplianceStatus = Field(..., description="compliant | partial")
+    evidence: Optional[str] = Field("", description="Exact quote from the privacy policy as evidence")
+    gap: Optional[str] = Field("", description="What's missing (if partial)")
+    recommendation: Optional[str] = Field("", description="Short remediation step")
+    confidence: float = Field(0.0, ge=0.0, le=1.0, description="Confidence between 0.0 and 1.0")
+
+class RequirementFindings(BaseModel):
+    findings: list[RequirementFinding]
+
 class FindingDetail(BaseModel):
     ndpa_section: str
     requirement_title: str
@@ -53,5 +69,13 @@ class RiskBreakdown(BaseModel):
 class QASchema(BaseModel):
     question: str
 
+class RetrieveSchema(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=100, description="Queries to retrieve for in one batch")
+    k: int = Field(3, ge=1, le=20)
+    mmr: bool = Field(False, description="Re-rank fetch_k candidates with maximal marginal relevance")
+    fetch_k: int = Field(20, ge=1, le=100)
+    lambda_mult: float = Field(0.5, ge=0.0, le=1.0)
+    score_threshold: Optional[float] = Field(None, ge=0.0, le=1.0, description="Minimum cosine similarity")
+
 class QARagResposneSchema(BaseModel):
     message: str= Field(description="response to user's query")
\ No newline at end of file
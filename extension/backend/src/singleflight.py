@@ -0,0 +1,114 @@
+from functools import partial
+import asyncio
+import logging
+import contextvars
+
+from .metrics import start_timings, merge_timings, current_pipeline
+
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """One in-flight call plus the progress events it has emitted so far."""
+
+    def __init__(self):
+        self.task = None
+        self.events = []
+        self.priorities = []
+        self.timings = None
+        self._changed = asyncio.Event()
+
+    def priority(self):
+        """The most urgent (lowest) priority among the callers that joined."""
+        return min(self.priorities)
+
+    def emit(self, event):
+        self.events.append(event)
+        self._wake()
+
+    def _wake(self, *_):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def updates(self):
+        """Yield every event, including ones emitted before subscribing."""
+        seen = 0
+        while True:
+            while seen < len(self.events):
+                yield self.events[seen]
+                seen += 1
+            if self.task.done():
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key onto one in-flight task.
+
+    `fn` is called with an `emit(event)` callback; events are replayed to
+    every streaming subscriber of the same key. The shared task is shielded,
+    so a caller that disconnects does not cancel the work the other callers
+    are still waiting on.
+
+    The task runs in a fresh context, so it inherits no per-request state
+    from whichever caller started it. Its stage timings are kept apart,
+    labelled with the first caller's pipeline, and added to every caller's
+    Timings once it finishes. With `priority_var` set, the task sees that
+    variable as a callable returning the most urgent priority of all callers
+    so far, read from `priority_var` (resolving callables) as each one joins.
+    """
+
+    def __init__(self, priority_var=None):
+        self._inflight = {}
+        self.priority_var = priority_var
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    def __len__(self):
+        return len(self._inflight)
+
+    def _forget(self, key, flight, task):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    def _caller_priority(self):
+        priority = self.priority_var.get()
+        return priority() if callable(priority) else priority
+
+    def _join(self, key, fn):
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = Flight()
+            context = contextvars.Context()
+            flight.timings, _ = context.run(start_timings, current_pipeline())
+            if self.priority_var is not None:
+                flight.priorities.append(self._caller_priority())
+                context.run(self.priority_var.set, flight.priority)
+            flight.task = context.run(asyncio.ensure_future, fn(flight.emit))
+            flight.task.add_done_callback(flight._wake)
+            flight.task.add_done_callback(partial(self._forget, key, flight))
+            self._inflight[key] = flight
+        else:
+            logger.info("Joining in-flight call for %s", key)
+            if self.priority_var is not None:
+                flight.priorities.append(self._caller_priority())
+        return flight
+
+    async def do(self, key, fn):
+        flight = self._join(key, fn)
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            if flight.task.done():
+                merge_timings(flight.timings)
+
+    async def stream(self, key, fn):
+        """Yield progress events, then {"event": "result", "data": result}."""
+        flight = self._join(key, fn)
+        async for event in flight.updates():
+            yield event
+        result = await asyncio.shield(flight.task)
+        merge_timings(flight.timings)
+        yield {"event": "result", "data": result}
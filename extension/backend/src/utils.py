@@ -1,32 +1,446 @@
 from collections import defaultdict
-from .database import scan_cache_table
+from .database import scan_cache_table, findings_cache_table, policy_results_table, url_aliases_table
 from datetime import datetime, timezone, timedelta
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from pymongo.errors import DuplicateKeyError
+from .cache import LRUCache
+from .metrics import span, count_cache
+import os
+import uuid
+import socket
+import re
+import hashlib
 import asyncio
 
+import numpy as np
 
-def batch_list(lst, batch_size):
-    """Yield successive n-sized chunks from lst."""
-    for i in range(0, len(lst), batch_size):
-        yield lst[i:i + batch_size]
+
+SCAN_CACHE_TTL = timedelta(hours=24)
+SCAN_CACHE_STALE_TTL = timedelta(hours=float(os.getenv("SCAN_CACHE_STALE_HOURS", "0")))
+SCAN_MEMORY_CACHE_ENTRIES = int(os.getenv("SCAN_MEMORY_CACHE_ENTRIES", "512"))
+SCAN_MEMORY_CACHE_BYTES = int(os.getenv("SCAN_MEMORY_CACHE_MB", "64")) * 1024 * 1024
+FINDINGS_CACHE_TTL_DAYS = 30
+SCAN_LEASE_SECONDS = int(os.getenv("SCAN_LEASE_SECONDS", "180"))
+# Share analysis results between URLs serving the same (or nearly the same) policy text.
+POLICY_STORE_ENABLED = os.getenv("POLICY_STORE_ENABLED", "false").lower() in ("1", "true", "yes")
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", "3"))
+SIMHASH_BANDS = 4
+SIMHASH_SHINGLE = 3
+SIMHASH_CANDIDATES = 50
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAM_PREFIXES = ("utm_",)
+TRACKING_PARAMS = {
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "_hsenc", "_hsmi", "ref", "ref_src", "spm",
+}
+
+memory_scan_cache = LRUCache(
+    max_entries=SCAN_MEMORY_CACHE_ENTRIES,
+    max_bytes=SCAN_MEMORY_CACHE_BYTES,
+    ttl_seconds=(SCAN_CACHE_TTL + SCAN_CACHE_STALE_TTL).total_seconds(),
+)
+
+BOT_CHECK_MARKERS = ["verifying you are human", "cloudflare"]
+
+
+def looks_like_bot_check(text):
+    """Check if page text is a captcha or bot-check interstitial."""
+    text = text.lower()
+    return any(marker in text for marker in BOT_CHECK_MARKERS)
+
+
+def normalize_url(url):
+    """Canonical form of a URL used to key scans of the same page.
+
+    http/https, default ports, host case, trailing slashes, fragments, query
+    order and tracking parameters do not produce separate cache entries.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if scheme == "http":
+        scheme = "https"
+    path = parts.path.rstrip("/") or "/"
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_PARAMS and not name.lower().startswith(TRACKING_PARAM_PREFIXES)
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def site_host(url):
+    """The host a URL's policy belongs to, without a leading "www.".
+
+    Hosts are not collapsed to a registered domain: on shared hosting
+    (*.myshopify.com, *.github.io, policy vendors) every subdomain is a
+    different site.
+    """
+    host = (urlsplit(url.strip()).hostname or "").lower().rstrip(".")
+    return host[4:] if host.startswith("www.") else host
+
+
+def _as_utc(ts):
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _split_unit(text, start, end, max_chars):
+    """Cut [start, end) into pieces of at most max_chars, preferring line, sentence, then word breaks."""
+    pieces = []
+    while end - start > max_chars:
+        window = text[start:start + max_chars]
+        cut = window.rfind("\n")
+        if cut <= max_chars // 4:
+            cut = window.rfind(". ") + 1
+        if cut <= max_chars // 4:
+            cut = window.rfind(" ")
+        if cut <= max_chars // 4:
+            cut = max_chars
+        pieces.append((start, start + cut))
+        start += cut
+        while start < end and text[start].isspace():
+            start += 1
+    if start < end:
+        pieces.append((start, end))
+    return pieces
+
+
+def content_units(text, max_tokens):
+    """Split text into content units: paragraphs, with oversized ones cut down to max_tokens.
+
+    Returns (start, end, hash) triples like `paragraph_spans`. A unit's
+    boundaries and hash depend only on its own paragraph, so edits elsewhere
+    in the document leave it untouched.
+    """
+    units = []
+    for start, end, digest in paragraph_spans(text):
+        if (end - start) // 4 <= max_tokens:
+            units.append((start, end, digest))
+            continue
+        for piece_start, piece_end in _split_unit(text, start, end, max_tokens * 4):
+            piece = normalize_text(text[piece_start:piece_end])
+            units.append((piece_start, piece_end, hashlib.sha1(piece.encode("utf-8")).hexdigest()[:16]))
+    return units
+
+
+def pack_units(units, target_tokens, max_tokens):
+    """Group consecutive content units into groups of about `target_tokens`.
+
+    Boundaries are content-defined: once a group holds half the target, it
+    closes after any unit whose hash falls under a threshold proportional to
+    the unit's size, so groups average `target_tokens` and never exceed
+    `max_tokens`. An inserted or edited paragraph only moves the boundaries
+    of its own group and, at most, the next one; every other group stays the
+    same. Returns a list of unit lists.
+    """
+    min_tokens = target_tokens // 2
+    spread = max(1, target_tokens - min_tokens)
+    groups = []
+    group = []
+    tokens = 0
+    for unit in units:
+        start, end, digest = unit
+        unit_tokens = max(1, (end - start) // 4)
+        if group and tokens + unit_tokens > max_tokens:
+            groups.append(group)
+            group, tokens = [], 0
+        group.append(unit)
+        tokens += unit_tokens
+        if tokens >= min_tokens and int(digest[:8], 16) / 0xFFFFFFFF < unit_tokens / spread:
+            groups.append(group)
+            group, tokens = [], 0
+    if group:
+        groups.append(group)
+    return groups
+
+
+async def lookup_link(link):
+    """Look a link up in the memory tier, then Mongo.
+
+    Returns (data, stale); data is None on a miss. Entries older than
+    SCAN_CACHE_TTL but within SCAN_CACHE_STALE_TTL come back with stale=True.
+    """
+    key = normalize_url(link)
+    now = datetime.now(timezone.utc)
+    entry = memory_scan_cache.get(key)
+    if entry:
+        data, stored_at = entry
+        stale = now - datetime.fromtimestamp(stored_at, timezone.utc) > SCAN_CACHE_TTL
+        count_cache("scan_memory", "stale" if stale else "hit")
+        return data, stale
+
+    with span("cache_lookup"):
+        cached = await scan_cache_table.find_one({"link": key, "timestamp": {"$gte": now - SCAN_CACHE_TTL - SCAN_CACHE_STALE_TTL}})
+        if not cached and POLICY_STORE_ENABLED:
+            cached = await _aliased_result(key, now - SCAN_CACHE_TTL - SCAN_CACHE_STALE_TTL)
+    if not cached:
+        count_cache("scan", "miss")
+        return None, False
+    timestamp = _as_utc(cached["timestamp"])
+    data = cached.get("data")
+    memory_scan_cache.set(key, data, stored_at=timestamp.timestamp())
+    stale = now - timestamp > SCAN_CACHE_TTL
+    count_cache("scan", "stale" if stale else "hit")
+    return data, stale
+
+
+async def cached_links(links):
+    """Fresh cached results for many normalized links in one query."""
+    cursor = scan_cache_table.find({
+        "link": {"$in": list(links)},
+        "timestamp": {"$gte": datetime.now(timezone.utc) - SCAN_CACHE_TTL}
+    })
+    return {doc["link"]: doc.get("data") async for doc in cursor}
 
 
 async def link_cached(link):
-    """Check if the link is already cached in the database."""
-    cached = await scan_cache_table.find_one({"link": link, "timestamp": {"$gte": datetime.now(timezone.utc) - timedelta(hours=24)}})
-    if cached:
-        return True, cached.get("data")
+    """Check if a fresh result for the link is cached."""
+    data, stale = await lookup_link(link)
+    if data is not None and not stale:
+        return True, data
     else:
         return False, None
 
-async def cache_link(link, data):
-    """Cache the analysis result for a link in the database."""
-    await scan_cache_table.update_one(
-        {"link": link},
+async def cache_link(link, data, snapshot=None):
+    """Cache the analysis result for a link in memory and in the database.
+
+    `snapshot` (paragraph hashes and per-batch findings) is stored next to the
+    result in Mongo only, for incremental rescans.
+    """
+    key = normalize_url(link)
+    memory_scan_cache.set(key, data)
+    fields = {"data": data, "timestamp": datetime.now(timezone.utc)}
+    if snapshot is not None:
+        fields["snapshot"] = snapshot
+    with span("cache_write"):
+        await scan_cache_table.update_one(
+            {"link": key},
+            {"$set": fields},
+            upsert=True
+        )
+
+
+async def get_scan_snapshot(link):
+    """The snapshot stored with the last scan of a link, whatever its age."""
+    key = normalize_url(link)
+    cached = await scan_cache_table.find_one({"link": key}, {"snapshot": 1, "timestamp": 1})
+    if not cached and POLICY_STORE_ENABLED:
+        cached = await _aliased_result(key)
+    if not cached or not cached.get("snapshot"):
+        return None
+    return {**cached["snapshot"], "scanned_at": _as_utc(cached["timestamp"]).isoformat()}
+
+
+async def acquire_scan_lease(link, owner=WORKER_ID):
+    """Try to take the cross-worker lease for scanning a link."""
+    now = datetime.now(timezone.utc)
+    lease_id = f"lease:{link}"
+    expires = now + timedelta(seconds=SCAN_LEASE_SECONDS)
+    try:
+        await scan_cache_table.insert_one({"_id": lease_id, "owner": owner, "expires": expires})
+        return True
+    except DuplicateKeyError:
+        taken = await scan_cache_table.find_one_and_update(
+            {"_id": lease_id, "expires": {"$lt": now}},
+            {"$set": {"owner": owner, "expires": expires}}
+        )
+        return taken is not None
+
+
+async def release_scan_lease(link, owner=WORKER_ID):
+    """Release a lease taken with acquire_scan_lease."""
+    await scan_cache_table.delete_one({"_id": f"lease:{link}", "owner": owner})
+
+
+def estimate_tokens(payload):
+    """Rough token count (~4 characters per token) for budgeting LLM calls."""
+    if isinstance(payload, dict):
+        payload = " ".join(str(v) for v in payload.values())
+    return max(1, len(str(payload)) // 4)
+
+
+def normalize_text(text):
+    """Collapse whitespace so cosmetic reflows hash identically."""
+    return " ".join(text.split())
+
+
+def paragraph_spans(text):
+    """Split text on blank lines into (start, end, hash) triples.
+
+    Hashes are taken over normalized text, so reflowed but otherwise identical
+    paragraphs compare equal between scans.
+    """
+    spans = []
+    start = 0
+    for match in re.finditer(r"\n\s*\n|\Z", text):
+        end = match.start()
+        if text[start:end].strip():
+            digest = hashlib.sha1(normalize_text(text[start:end]).encode("utf-8")).hexdigest()[:16]
+            spans.append((start, end, digest))
+        start = match.end()
+        if match.end() == len(text):
+            break
+    return spans
+
+
+def content_fingerprint(text, version):
+    """Hash normalized text together with the analyzer version."""
+    payload = f"{version}\n{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+async def get_cached_findings(keys):
+    """Fetch cached content-unit findings for the given fingerprints."""
+    if not keys:
+        return {}
+    cursor = findings_cache_table.find({
+        "key": {"$in": list(set(keys))},
+        "timestamp": {"$gte": datetime.now(timezone.utc) - timedelta(days=FINDINGS_CACHE_TTL_DAYS)}
+    })
+    return {doc["key"]: doc.get("findings", []) async for doc in cursor}
+
+
+async def cache_findings(key, findings):
+    """Cache the findings attributed to one content unit; an empty list means analyzed, no findings."""
+    await findings_cache_table.update_one(
+        {"key": key},
         {
             "$set": {
-                "data": data,
+                "findings": findings,
                 "timestamp": datetime.now(timezone.utc)
             }
         },
         upsert=True
-    )
\ No newline at end of file
+    )
+
+
+def simhash(text):
+    """64-bit simhash over word shingles of the normalized, lowercased text."""
+    words = normalize_text(text).lower().split()
+    shingles = {" ".join(words[i:i + SIMHASH_SHINGLE]) for i in range(max(1, len(words) - SIMHASH_SHINGLE + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big") for shingle in shingles],
+        dtype=np.uint64,
+    )
+    bits = (hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    majority = bits.sum(axis=0) * 2 > len(hashes)
+    return sum(1 << i for i in np.flatnonzero(majority).tolist())
+
+
+def simhash_bands(value):
+    """Split a simhash into bands; hashes within SIMHASH_BANDS - 1 bits share at least one."""
+    width = 64 // SIMHASH_BANDS
+    return [f"{i}:{(value >> (i * width)) & ((1 << width) - 1):x}" for i in range(SIMHASH_BANDS)]
+
+
+async def ensure_policy_store_indexes():
+    if not POLICY_STORE_ENABLED:
+        return
+    if not 0 <= SIMHASH_MAX_DISTANCE < SIMHASH_BANDS:
+        # Band lookup only finds hashes differing in fewer bits than there are bands.
+        raise ValueError(
+            f"SIMHASH_MAX_DISTANCE ({SIMHASH_MAX_DISTANCE}) must be below the number of simhash bands ({SIMHASH_BANDS})"
+        )
+    await policy_results_table.create_index("key", unique=True)
+    await policy_results_table.create_index([("host", 1), ("bands", 1), ("version", 1)])
+    await url_aliases_table.create_index("link", unique=True)
+
+
+async def find_policy_result(text, version, link, near=True):
+    """Find a stored result for policy text, by exact hash and then (if `near`) by simhash.
+
+    Near-duplicates are only looked up among results stored for the same
+    host as `link`, since their evidence quotes that site's wording (names,
+    addresses, contact details) rather than this page's. Returns
+    (document, match) or (None, None); match is {"type": "exact"} or
+    {"type": "near", "distance": <differing bits>}.
+    """
+    key = content_fingerprint(text, version)
+    since = datetime.now(timezone.utc) - timedelta(days=FINDINGS_CACHE_TTL_DAYS)
+    with span("policy_store_lookup"):
+        document = await policy_results_table.find_one({"key": key, "timestamp": {"$gte": since}})
+        if document:
+            count_cache("policy_store", "exact")
+            return document, {"type": "exact"}
+        if not near:
+            count_cache("policy_store", "miss")
+            return None, None
+        fingerprint = simhash(text)
+        candidates = await policy_results_table.find(
+            {
+                "host": site_host(link),
+                "bands": {"$in": simhash_bands(fingerprint)},
+                "version": version,
+                "timestamp": {"$gte": since},
+            },
+            {"snapshot": 0},
+        ).limit(SIMHASH_CANDIDATES).to_list(SIMHASH_CANDIDATES)
+    scored = [(bin(fingerprint ^ int(doc["simhash"], 16)).count("1"), doc) for doc in candidates]
+    scored = [(distance, doc) for distance, doc in scored if distance <= SIMHASH_MAX_DISTANCE]
+    if not scored:
+        count_cache("policy_store", "miss")
+        return None, None
+    distance, document = min(scored, key=lambda item: item[0])
+    count_cache("policy_store", "near")
+    return document, {"type": "near", "distance": distance}
+
+
+async def store_policy_result(link, text, version, data, snapshot=None):
+    """Store a scan result under its text fingerprint and alias the link to it."""
+    key = content_fingerprint(text, version)
+    fingerprint = simhash(text)
+    with span("policy_store_write"):
+        await policy_results_table.update_one(
+            {"key": key},
+            {"$set": {
+                "version": version,
+                "simhash": f"{fingerprint:016x}",
+                "bands": simhash_bands(fingerprint),
+                "data": data,
+                "snapshot": snapshot,
+                "source": normalize_url(link),
+                "host": site_host(link),
+                "timestamp": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+        )
+        await alias_link(link, key, {"type": "exact"})
+
+
+async def alias_link(link, key, match, fetch=None):
+    """Point a link at a stored policy result."""
+    await url_aliases_table.update_one(
+        {"link": normalize_url(link)},
+        {"$set": {"key": key, "match": match, "fetch": fetch, "timestamp": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+def aliased_data(document, match, fetch=None):
+    """The stored result as served for an aliased link."""
+    data = dict(document.get("data") or {})
+    if fetch is not None:
+        data["fetch"] = fetch
+    data["content_match"] = {**match, "source": document.get("source")}
+    return data
+
+
+async def _aliased_result(key, since=None):
+    """Resolve a link through url_aliases into a scan_cache-shaped document."""
+    query = {"link": key}
+    if since is not None:
+        query["timestamp"] = {"$gte": since}
+    alias = await url_aliases_table.find_one(query)
+    if not alias:
+        return None
+    document = await policy_results_table.find_one({"key": alias["key"]})
+    if not document:
+        return None
+    return {
+        "data": aliased_data(document, alias.get("match") or {"type": "exact"}, alias.get("fetch")),
+        "snapshot": document.get("snapshot"),
+        "timestamp": alias["timestamp"],
+    }
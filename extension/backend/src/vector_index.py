@@ -0,0 +1,294 @@
+"""Memory-mapped, optionally quantized vector index for the NDPA QA corpus.
+
+A converted index directory holds:
+
+    manifest.json      format version, quantization, dimension, document count
+    index.faiss        FAISS index (flat, fp16, sq8 or pq), opened with mmap
+    docs.jsonl         one {"page_content", "metadata"} object per vector row
+    docs.offsets.npy   uint64 byte offsets of each line in docs.jsonl
+
+Both the index and the docstore are opened read-only through mmap, so every
+uvicorn worker on a host shares the same page-cache pages instead of holding
+its own unpickled copy.
+
+Build or convert from an existing LangChain FAISS folder:
+
+    python -m src.vector_index convert --source /app/ndpa_qa_vectorstore --out /app/ndpa_qa_index --quantization sq8
+    python -m src.vector_index report --source /app/ndpa_qa_vectorstore
+"""
+from typing import Optional
+import os
+import sys
+import json
+import mmap
+import math
+import time
+import pickle
+import logging
+import argparse
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+DOCS_FILE = "docs.jsonl"
+OFFSETS_FILE = "docs.offsets.npy"
+QUANTIZATIONS = ("flat", "fp16", "sq8", "pq")
+PQ_DEFAULT_SUBQUANTIZERS = 96
+PQ_DEFAULT_BITS = 8
+PQ_MIN_POINTS_PER_CENTROID = 39
+
+
+def is_mmap_index(path):
+    return os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+class MmapDocstore:
+    """Read-only docstore over docs.jsonl, decoding one line per lookup.
+
+    Implements the `search(id)` method LangChain's FAISS wrapper calls; ids
+    are the row numbers as strings.
+    """
+
+    def __init__(self, path):
+        self._file = open(os.path.join(path, DOCS_FILE), "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(self._file.fileno()).st_size else b""
+        self._offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def search(self, search: str):
+        try:
+            row = int(search)
+        except (TypeError, ValueError):
+            return f"ID {search} not found."
+        if not 0 <= row < len(self):
+            return f"ID {search} not found."
+        record = json.loads(self._data[int(self._offsets[row]):int(self._offsets[row + 1])])
+        return Document(page_content=record["page_content"], metadata=record.get("metadata", {}))
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE)) as fh:
+        return json.load(fh)
+
+
+def open_index(path):
+    """Memory-map the FAISS index of a converted directory; returns (index, manifest)."""
+    import faiss
+
+    manifest = read_manifest(path)
+    if manifest.get("version") != INDEX_FORMAT_VERSION:
+        raise ValueError(f"Unsupported vector index format {manifest.get('version')!r} in {path}")
+    index = faiss.read_index(os.path.join(path, INDEX_FILE), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return index, manifest
+
+
+def load_mmap_store(path, embeddings):
+    """Open a converted index directory as a LangChain FAISS vector store."""
+    from langchain_community.vectorstores import FAISS
+
+    index, manifest = open_index(path)
+    docstore = MmapDocstore(path)
+    if index.ntotal != len(docstore):
+        raise ValueError(f"Index has {index.ntotal} vectors but docstore has {len(docstore)} documents")
+    logger.info("Opened %s vector index (%d vectors) from %s", manifest["quantization"], index.ntotal, path)
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id={i: str(i) for i in range(index.ntotal)},
+    )
+
+
+def read_langchain_store(path):
+    """Vectors and documents, in index row order, from a LangChain FAISS folder."""
+    import faiss
+
+    index = faiss.read_index(os.path.join(path, "index.faiss"))
+    with open(os.path.join(path, "index.pkl"), "rb") as fh:
+        docstore, index_to_docstore_id = pickle.load(fh)
+    vectors = index.reconstruct_n(0, index.ntotal)
+    docs = [docstore.search(index_to_docstore_id[i]) for i in range(index.ntotal)]
+    return vectors, docs, index.metric_type
+
+
+def build_index(vectors, quantization, metric, pq_m=PQ_DEFAULT_SUBQUANTIZERS, pq_bits=PQ_DEFAULT_BITS):
+    """Build a FAISS index over `vectors` with the requested quantization."""
+    import faiss
+
+    dim = vectors.shape[1]
+    if quantization == "flat":
+        index = faiss.IndexFlat(dim, metric)
+    elif quantization == "fp16":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, metric)
+    elif quantization == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, metric)
+    elif quantization == "pq":
+        if dim % pq_m:
+            raise ValueError(f"PQ subquantizers ({pq_m}) must divide the dimension ({dim})")
+        # Each sub-quantizer needs ~39 training points per centroid; shrink the
+        # codebook on small corpora rather than training on too few points.
+        max_bits = int(math.log2(max(len(vectors) // PQ_MIN_POINTS_PER_CENTROID, 2)))
+        bits = max(1, min(pq_bits, max_bits))
+        if bits < pq_bits:
+            logger.warning("Only %d vectors; using %d-bit PQ codes instead of %d", len(vectors), bits, pq_bits)
+        index = faiss.IndexPQ(dim, pq_m, bits, metric)
+    else:
+        raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}")
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def write_index_dir(out, vectors, docs, quantization, metric, source=None, **pq_options):
+    """Write a converted index directory; returns its manifest."""
+    import faiss
+
+    os.makedirs(out, exist_ok=True)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = build_index(vectors, quantization, metric, **pq_options)
+    faiss.write_index(index, os.path.join(out, INDEX_FILE))
+
+    offsets = [0]
+    with open(os.path.join(out, DOCS_FILE), "wb") as fh:
+        for doc in docs:
+            line = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False, default=str)
+            data = (line + "\n").encode("utf-8")
+            fh.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(os.path.join(out, OFFSETS_FILE), np.asarray(offsets, dtype=np.uint64))
+
+    manifest = {
+        "version": INDEX_FORMAT_VERSION,
+        "quantization": quantization,
+        "dimension": int(vectors.shape[1]),
+        "count": int(vectors.shape[0]),
+        "metric": "l2" if metric == faiss.METRIC_L2 else "inner_product",
+        "source": source,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    # Written last so a half-built directory is never picked up as an index.
+    with open(os.path.join(out, MANIFEST_FILE), "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
+
+
+def _dir_bytes(path, names):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in names if os.path.exists(os.path.join(path, name)))
+
+
+def _synthetic_queries(vectors, count, seed=0):
+    """Unit-length blends of random vector pairs, weighted towards the first so
+    each query is near, but not equal to, one stored row."""
+    rng = np.random.default_rng(seed)
+    pairs = rng.integers(0, len(vectors), size=(count, 2))
+    weights = rng.uniform(0.55, 0.8, size=(count, 1)).astype(np.float32)
+    queries = weights * vectors[pairs[:, 0]] + (1 - weights) * vectors[pairs[:, 1]]
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    return (queries / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+def recall_report(source, quantizations=QUANTIZATIONS, ks=(1, 3, 10), queries=200, workdir=None, **pq_options):
+    """Recall@k against exact search, on-disk size and query latency per quantization."""
+    import faiss
+    import tempfile
+
+    vectors, docs, metric = read_langchain_store(source)
+    queries = _synthetic_queries(vectors, min(queries, max(len(vectors) * 2, 1)))
+    depth = min(max(ks), len(vectors))
+    exact = faiss.IndexFlat(vectors.shape[1], metric)
+    exact.add(vectors)
+    _, truth = exact.search(queries, depth)
+    baseline_bytes = _dir_bytes(source, ["index.faiss", "index.pkl"])
+
+    rows = [{"format": "langchain (fp32 + pickle)", "bytes": baseline_bytes, **{f"recall@{k}": 1.0 for k in ks if k <= depth}}]
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for quantization in quantizations:
+            out = os.path.join(tmp, quantization)
+            write_index_dir(out, vectors, docs, quantization, metric, source=source, **pq_options)
+            index, _ = open_index(out)
+            started = time.perf_counter()
+            _, found = index.search(queries, depth)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+            row = {
+                "format": f"mmap {quantization}",
+                "bytes": _dir_bytes(out, [INDEX_FILE, DOCS_FILE, OFFSETS_FILE, MANIFEST_FILE]),
+                "index_bytes": _dir_bytes(out, [INDEX_FILE]),
+                "query_ms": round(elapsed_ms, 4),
+            }
+            for k in ks:
+                if k <= depth:
+                    hits = sum(len(set(t[:k]) & set(f[:k])) for t, f in zip(truth, found))
+                    row[f"recall@{k}"] = round(hits / (k * len(queries)), 4)
+            rows.append(row)
+    return {"source": source, "vectors": len(vectors), "dimension": int(vectors.shape[1]), "queries": len(queries), "rows": rows}
+
+
+def _print_report(report):
+    print(f"{report['vectors']} vectors x {report['dimension']} dims, {report['queries']} synthetic queries")
+    recall_keys = [key for key in report["rows"][0] if key.startswith("recall@")]
+    header = f"{'format':<28}{'size':>12}{'index':>12}" + "".join(f"{key:>11}" for key in recall_keys) + f"{'ms/query':>10}"
+    print(header)
+    for row in report["rows"]:
+        index_bytes = row.get("index_bytes")
+        print(
+            f"{row['format']:<28}{row['bytes'] / 1024:>10.1f}KB"
+            + (f"{index_bytes / 1024:>10.1f}KB" if index_bytes is not None else f"{'-':>12}")
+            + "".join(f"{row.get(key, 0):>11.3f}" for key in recall_keys)
+            + (f"{row['query_ms']:>10.3f}" if "query_ms" in row else f"{'-':>10}")
+        )
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Build and evaluate memory-mapped NDPA vector indexes")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    convert = sub.add_parser("convert", help="convert a LangChain FAISS folder into a memory-mapped index")
+    convert.add_argument("--source", required=True)
+    convert.add_argument("--out", required=True)
+    convert.add_argument("--quantization", choices=QUANTIZATIONS, default="flat")
+    convert.add_argument("--pq-m", type=int, default=PQ_DEFAULT_SUBQUANTIZERS)
+    convert.add_argument("--pq-bits", type=int, default=PQ_DEFAULT_BITS)
+
+    report = sub.add_parser("report", help="recall vs. size for each quantization")
+    report.add_argument("--source", required=True)
+    report.add_argument("--quantization", choices=QUANTIZATIONS, action="append")
+    report.add_argument("--queries", type=int, default=200)
+    report.add_argument("--pq-m", type=int, default=PQ_DEFAULT_SUBQUANTIZERS)
+    report.add_argument("--pq-bits", type=int, default=PQ_DEFAULT_BITS)
+    report.add_argument("--json", action="store_true")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    pq_options = {"pq_m": args.pq_m, "pq_bits": args.pq_bits}
+
+    if args.command == "convert":
+        vectors, docs, metric = read_langchain_store(args.source)
+        manifest = write_index_dir(args.out, vectors, docs, args.quantization, metric, source=args.source, **pq_options)
+        print(json.dumps(manifest, indent=2))
+        return 0
+
+    result = recall_report(args.source, tuple(args.quantization or QUANTIZATIONS), queries=args.queries, **pq_options)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        _print_report(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
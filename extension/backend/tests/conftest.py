@@ -0,0 +1,32 @@
+import os
+import sys
+from collections import defaultdict
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def scan_env(monkeypatch):
+    """Run scans offline: in-memory tables, a stub analyzer and pages served from `pages`."""
+    from langchain_core.documents import Document
+
+    from benchmarks.stubs import StubChatModel, InMemoryCollection
+    from src import agents, utils
+    from src.scheduler import LLMScheduler
+
+    for table in ("scan_cache_table", "findings_cache_table", "policy_results_table", "url_aliases_table"):
+        monkeypatch.setattr(utils, table, InMemoryCollection())
+    utils.memory_scan_cache.clear()
+    usage = defaultdict(int)
+    stub = StubChatModel(agents.ANALYZER_MODEL, latency=0.0, jitter=0.0, usage=usage)
+    monkeypatch.setattr(agents, "llm_scheduler", LLMScheduler([stub]))
+    pages = {}
+
+    async def load_policy(url):
+        return [Document(page_content=pages[url], metadata={"source": url})], {"path": "static"}
+
+    monkeypatch.setattr(agents, "load_policy", load_policy)
+    yield agents, pages, stub, usage
+    utils.memory_scan_cache.clear()
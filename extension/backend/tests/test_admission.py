@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from src.admission import Lane, AdmissionRejected
+
+
+async def test_requests_beyond_concurrency_queue_in_order():
+    lane = Lane("test", 1, concurrency=1, max_queue=2, max_wait=1.0)
+    await lane.acquire()
+    order = []
+
+    async def waiter(name):
+        await lane.acquire()
+        order.append(name)
+
+    waiters = [asyncio.ensure_future(waiter(name)) for name in ("a", "b")]
+    await asyncio.sleep(0)
+    assert (lane.active, lane.queued) == (1, 2)
+
+    lane.release(0.1)
+    lane.release(0.1)
+    await asyncio.gather(*waiters)
+
+    assert order == ["a", "b"]
+    assert (lane.active, lane.queued) == (1, 0)
+
+
+async def test_full_queue_is_rejected_with_429():
+    lane = Lane("test", 1, concurrency=1, max_queue=1, max_wait=1.0)
+    await lane.acquire()
+    queued = asyncio.ensure_future(lane.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await lane.acquire()
+
+    assert rejected.value.status_code == 429
+    assert rejected.value.reason == "queue_full"
+    assert rejected.value.retry_after >= 1
+    lane.release(0.1)
+    await queued
+
+
+async def test_lane_without_queue_rejects_at_once():
+    lane = Lane("test", 2, concurrency=1, max_queue=0, max_wait=0)
+    await lane.acquire()
+
+    with pytest.raises(AdmissionRejected):
+        await lane.acquire()
+
+
+async def test_waiting_too_long_is_rejected_with_503():
+    lane = Lane("test", 1, concurrency=1, max_queue=4, max_wait=0.05)
+    await lane.acquire()
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await lane.acquire()
+
+    assert rejected.value.status_code == 503
+    assert lane.queued == 0
+
+
+async def test_cancelled_waiter_gives_up_its_place():
+    lane = Lane("test", 1, concurrency=1, max_queue=4, max_wait=1.0)
+    await lane.acquire()
+    cancelled = asyncio.ensure_future(lane.acquire())
+    served = asyncio.ensure_future(lane.acquire())
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    lane.release(0.1)
+    await served
+
+    assert (lane.active, lane.queued) == (1, 0)
+    lane.release(0.1)
+    assert lane.active == 0
+
+
+async def test_retry_after_tracks_service_time():
+    lane = Lane("test", 1, concurrency=2, max_queue=4, max_wait=1.0)
+    await lane.acquire()
+    lane.release(10.0)
+
+    assert lane.retry_after() == 5
+
+
+@pytest.fixture
+async def saturated_api(scan_env, monkeypatch):
+    """The API with a full interactive lane: one request running, none may queue."""
+    import httpx
+
+    from src import admission, main
+
+    lane = Lane("interactive", 1, concurrency=1, max_queue=0, max_wait=0)
+    monkeypatch.setitem(admission.lanes, "interactive", lane)
+    await lane.acquire()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client, lane
+
+
+async def test_cache_hits_skip_admission(saturated_api):
+    from src.utils import cache_link
+
+    client, lane = saturated_api
+    await cache_link("https://example.com/privacy", {"compliance_score": 80.0})
+
+    plain = await client.post("/api/v1/analyze/link", json={"url": "https://example.com/privacy"})
+    stream = await client.post("/api/v1/analyze/link/stream", json={"url": "https://example.com/privacy"})
+
+    assert plain.status_code == 200
+    assert plain.json() == {"compliance_score": 80.0}
+    assert '"cached": true' in stream.text
+    assert (lane.active, lane.queued) == (1, 0)
+
+
+async def test_rejected_stream_holds_no_slot(saturated_api):
+    client, lane = saturated_api
+
+    plain = await client.post("/api/v1/analyze/link", json={"url": "https://example.com/new"})
+    stream = await client.post("/api/v1/analyze/link/stream", json={"url": "https://example.com/new"})
+
+    assert plain.status_code == 429
+    assert '"event": "error"' in stream.text
+    lane.release(0.1)
+    assert lane.active == 0
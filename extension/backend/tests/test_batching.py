@@ -0,0 +1,70 @@
+import random
+
+from src.utils import content_units, pack_units
+
+
+TARGET = 300
+MAX = 600
+WORDS = "data consent policy processing retain transfer rights security notice account request".split()
+
+
+def paragraphs(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 120))) + f" ({i})."
+        for i in range(count)
+    ]
+
+
+def groups_of(paras):
+    text = "\n\n".join(paras)
+    groups = pack_units(content_units(text, MAX), TARGET, MAX)
+    return [tuple(digest for _, _, digest in group) for group in groups]
+
+
+def token_count(group):
+    return sum(max(1, (end - start) // 4) for start, end, _ in group)
+
+
+def test_groups_cover_every_unit_in_order_within_budget():
+    text = "\n\n".join(paragraphs(200))
+    units = content_units(text, MAX)
+
+    groups = pack_units(units, TARGET, MAX)
+
+    assert [unit for group in groups for unit in group] == units
+    assert all(token_count(group) <= MAX for group in groups)
+    assert TARGET / 2 <= len(text) / 4 / len(groups) <= TARGET * 1.5
+
+
+def test_prepending_a_paragraph_only_moves_the_first_groups():
+    paras = paragraphs(200)
+    before = groups_of(paras)
+
+    after = groups_of(["Updated cookie notice for our new mobile app."] + paras)
+
+    assert after[-(len(before) - 2):] == before[2:]
+
+
+def test_editing_a_paragraph_changes_at_most_two_groups():
+    paras = paragraphs(200)
+    before = groups_of(paras)
+    edited = list(paras)
+    edited[100] = edited[100].replace("(100).", "(100), including backups.")
+
+    after = groups_of(edited)
+
+    assert len(set(before) - set(after)) <= 2
+    assert len(set(after) - set(before)) <= 2
+
+
+def test_oversized_paragraph_is_split_the_same_wherever_it_appears():
+    long_paragraph = " ".join(paragraphs(30, seed=3))
+    alone = content_units(long_paragraph, MAX)
+    text = "Intro paragraph.\n\n" + long_paragraph + "\n\nClosing paragraph."
+
+    embedded = content_units(text, MAX)[1:-1]
+
+    assert len(alone) > 1
+    assert [digest for _, _, digest in embedded] == [digest for _, _, digest in alone]
+    assert all((end - start) // 4 <= MAX for start, end, _ in embedded)
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from src.browser_pool import BrowserPool, BrowserPoolExhausted, _Slot
+
+
+def started_pool(size=1, acquire_timeout=0.2):
+    """A pool whose slots are ready without launching Chromium."""
+    pool = BrowserPool(size=size, browsers=1, acquire_timeout=acquire_timeout)
+    pool._idle = asyncio.Queue()
+    for _ in range(size):
+        pool._idle.put_nowait(_Slot(0))
+    pool._started = True
+    return pool
+
+
+async def test_failed_context_setup_returns_no_documents_and_frees_the_slot():
+    pool = started_pool()
+
+    async def prepare(slot):
+        raise RuntimeError("browser crashed")
+
+    pool._prepare = prepare
+
+    assert await pool.load("https://example.com/privacy") == []
+    assert pool._idle.qsize() == 1
+
+
+async def test_waiting_counts_callers_queued_for_a_slot():
+    pool = started_pool()
+
+    async def prepare(slot):
+        return object()
+
+    pool._prepare = prepare
+
+    async with pool.page():
+        waiter = asyncio.ensure_future(pool.page().__aenter__())
+        await asyncio.sleep(0.05)
+        assert pool.waiting == 1
+        with pytest.raises(BrowserPoolExhausted):
+            await waiter
+    assert pool.waiting == 0
@@ -0,0 +1,72 @@
+import time
+import asyncio
+
+import pytest
+
+from benchmarks.stubs import StubChatModel
+from src import agents
+
+
+@pytest.fixture
+def context_cache(monkeypatch):
+    monkeypatch.setattr(agents, "LLM_CONTEXT_CACHE", True)
+    monkeypatch.setattr(agents, "_analyzer_chains", {})
+    created = []
+
+    def create(llm, system_prompt, model):
+        time.sleep(0.2)  # a blocking gRPC round trip
+        created.append(model)
+        if model == "models/broken":
+            raise RuntimeError("cache quota exceeded")
+        return f"cachedContents/{len(created)}"
+
+    monkeypatch.setattr(agents, "_create_context_cache", create)
+    return created
+
+
+async def test_cache_is_created_off_the_event_loop(context_cache):
+    llm = StubChatModel(agents.ANALYZER_MODEL, latency=0.0)
+
+    started = time.monotonic()
+    inline = agents.privacy_analyzer_batch_node(llm)
+    ticks = 0
+    while agents._context_cache_tasks:
+        await asyncio.sleep(0.01)
+        ticks += 1
+
+    assert time.monotonic() - started >= 0.2
+    assert ticks >= 10  # the loop kept running while the cache was created
+    assert context_cache == [agents.LLM_CONTEXT_CACHE_MODEL]
+    assert agents.privacy_analyzer_batch_node(llm) is not inline
+
+
+async def test_cache_is_created_once_while_pending(context_cache):
+    llm = StubChatModel(agents.ANALYZER_MODEL, latency=0.0)
+
+    first = agents.privacy_analyzer_batch_node(llm)
+    second = agents.privacy_analyzer_batch_node(llm)
+    await asyncio.gather(*agents._context_cache_tasks)
+
+    assert first is second
+    assert len(context_cache) == 1
+
+
+async def test_failed_cache_falls_back_inline_until_the_retry(context_cache):
+    llm = StubChatModel("broken", latency=0.0)
+
+    inline = agents.privacy_analyzer_batch_node(llm)
+    await asyncio.gather(*agents._context_cache_tasks)
+
+    chain, expires = agents._analyzer_chains[id(llm)]
+    assert chain is inline
+    assert expires == pytest.approx(time.monotonic() + agents.LLM_CONTEXT_CACHE_RETRY_SECONDS, abs=1)
+
+
+def test_tool_schema_keeps_fields_enums_and_nullability():
+    declaration = agents._analyzer_tool().function_declarations[0]
+    finding = declaration.parameters.properties["findings"].items
+
+    assert declaration.name == "RequirementFindings"
+    assert list(finding.properties["status"].enum) == ["compliant", "partial", "non_compliant"]
+    assert finding.properties["evidence"].nullable
+    assert "requirement_id" in finding.required
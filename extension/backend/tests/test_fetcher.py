@@ -0,0 +1,46 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src import fetcher
+
+
+PARAGRAPH = "<p>We retain your order history for six years to meet tax obligations, then delete it.</p>\n"
+
+
+async def chunked_policy(request):
+    response = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    await response.write(b"<html><body>")
+    for _ in range(4000):  # ~340 KB, far more than one read buffer
+        await response.write(PARAGRAPH.encode("utf-8"))
+    await response.write(b"</body></html>")
+    return response
+
+
+@pytest.fixture
+async def server():
+    app = web.Application()
+    app.router.add_get("/policy", chunked_policy)
+    server = TestServer(app)
+    await server.start_server()
+    yield server
+    await server.close()
+    await fetcher.close_http_session()
+
+
+async def test_chunked_body_is_read_to_the_end(server):
+    docs, reason = await fetcher.fetch_static(str(server.make_url("/policy")))
+
+    assert reason is None
+    assert docs[0].page_content.count("six years") == 4000
+
+
+async def test_body_over_the_cap_is_reported_truncated(server, monkeypatch):
+    monkeypatch.setattr(fetcher, "STATIC_FETCH_MAX_BYTES", 100 * 1024)
+
+    docs, reason = await fetcher.fetch_static(str(server.make_url("/policy")))
+
+    assert reason == "truncated"
+    assert 0 < docs[0].page_content.count("six years") < 4000
@@ -0,0 +1,49 @@
+from src.agents import attribute_findings
+from src.utils import content_fingerprint, content_units, cache_findings, get_cached_findings
+
+
+URL = "https://example.com/privacy"
+POLICY = [
+    "You may withdraw consent at any time from your account settings.",
+    "We retain your order history for six years to meet tax obligations.",
+    "We use industry-standard security measures, including encryption in transit.",
+    "Questions can be sent to our Data Protection Officer at privacy@example.com.",
+]
+
+
+def test_findings_are_attributed_to_the_quoting_unit():
+    units = ["We keep invoices for six years.", "You may withdraw consent at any time."]
+    findings = [
+        {"requirement_id": "R03", "evidence": "withdraw  consent at any time"},
+        {"requirement_id": "R13", "evidence": "invoices are kept six years"},
+        {"requirement_id": "R17", "evidence": "contact the DPO"},
+    ]
+
+    attributed = attribute_findings(findings, units)
+
+    assert [[f["requirement_id"] for f in unit] for unit in attributed] == [["R13", "R17"], ["R03"]]
+
+
+def test_fingerprint_ignores_reflow_but_not_version():
+    assert content_fingerprint("a  b\nc", "v2") == content_fingerprint("a b c", "v2")
+    assert content_fingerprint("a b c", "v2") != content_fingerprint("a b c", "v3")
+
+
+async def test_empty_findings_are_cached_as_analyzed(scan_env):
+    await cache_findings("unit-a", [])
+
+    assert await get_cached_findings(["unit-a", "unit-b"]) == {"unit-a": []}
+
+
+async def test_units_are_reused_across_pages(scan_env):
+    agents, pages, _, usage = scan_env
+    pages[URL] = "\n\n".join(POLICY)
+    pages["https://other.example.org/privacy"] = "\n\n".join(["Welcome to Other Co."] + POLICY)
+
+    first = await agents._analyze_url(URL)
+    calls = usage["calls"]
+    second = await agents._analyze_url("https://other.example.org/privacy")
+
+    assert usage["calls"] == calls + 1
+    assert second["findings_cache"]["hits"] == len(content_units(pages[URL], agents.BATCH_TOKEN_BUDGET))
+    assert second["findings"].keys() == first["findings"].keys()
@@ -0,0 +1,63 @@
+from langchain_core.documents import Document
+
+from src.lexical import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+DOCS = [
+    Document(page_content="34.—(1) A data subject shall have the right to object to processing.\n(2) The controller shall stop processing."),
+    Document(page_content="35. A data subject may withdraw consent at any time without affecting prior processing."),
+    Document(page_content="40. A controller shall notify the Commission of a personal data breach within 72 hours."),
+    Document(page_content="41. Transfer of personal data outside Nigeria requires an adequate level of protection."),
+] + [Document(page_content=f"{50 + i}. General provision number {i} on registration fees.") for i in range(20)]
+
+
+def test_tokenize_drops_stopwords_and_expands_citations():
+    assert tokenize("What does section 34(2)(b) say?") == ["section", "34(2)(b)", "34", "34(2)", "say"]
+
+
+def test_bm25_ranks_the_document_with_the_rare_terms_first():
+    index = LexicalIndex(DOCS)
+
+    hits, _ = index.search("how fast must a data breach be notified", k=3)
+
+    assert hits[0][0] is DOCS[2]
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+
+def test_subsection_citation_is_a_strong_match():
+    index = LexicalIndex(DOCS)
+
+    hits, strong = index.search("what does 34(2) say")
+
+    assert hits[0][0] is DOCS[0]
+    assert strong
+
+
+def test_common_words_are_not_a_strong_match():
+    index = LexicalIndex(DOCS)
+
+    _, strong = index.search("general provision")
+
+    assert not strong
+
+
+def test_unknown_terms_return_no_hits():
+    assert LexicalIndex(DOCS).search("cryptocurrency mining") == ([], False)
+
+
+def test_rrf_favours_documents_ranked_by_both_retrievers():
+    a, b, c = DOCS[:3]
+    vector = [(a, 0.9), (b, 0.8), (c, 0.7)]
+    lexical = [(c, 12.0), (b, 9.0)]
+
+    fused = reciprocal_rank_fusion(vector, lexical, k=2)
+
+    assert {doc.page_content for doc, _ in fused} == {b.page_content, c.page_content}
+
+
+def test_rrf_deduplicates_on_content():
+    copy = Document(page_content=DOCS[1].page_content, metadata={"source": "copy"})
+
+    fused = reciprocal_rank_fusion([(DOCS[1], 1.0)], [(copy, 5.0)], k=3)
+
+    assert len(fused) == 1
@@ -0,0 +1,37 @@
+import random
+
+from src.utils import site_host, store_policy_result, find_policy_result
+
+
+WORDS = "data consent policy processing retain transfer rights security notice account request order".split()
+RNG = random.Random(5)
+POLICY = " ".join(RNG.choice(WORDS) for _ in range(600))
+EDITED = POLICY + " effective from january"
+
+
+def test_site_host_keeps_shared_hosting_subdomains_apart():
+    assert site_host("https://www.Example.com/privacy") == "example.com"
+    assert site_host("https://alpha.myshopify.com/policies") != site_host("https://beta.myshopify.com/policies")
+
+
+async def test_near_duplicate_is_reused_on_the_same_host(scan_env):
+    await store_policy_result("https://alpha.myshopify.com/policies/privacy", POLICY, "v", {"compliance_score": 70})
+
+    document, match = await find_policy_result(EDITED, "v", "https://alpha.myshopify.com/pages/privacy")
+
+    assert match["type"] == "near"
+    assert document["data"] == {"compliance_score": 70}
+
+
+async def test_near_duplicate_from_another_merchant_is_not_reused(scan_env):
+    await store_policy_result("https://alpha.myshopify.com/policies/privacy", POLICY, "v", {"compliance_score": 70})
+
+    assert await find_policy_result(EDITED, "v", "https://beta.myshopify.com/policies/privacy") == (None, None)
+
+
+async def test_exact_copy_is_reused_across_sites(scan_env):
+    await store_policy_result("https://alpha.myshopify.com/policies/privacy", POLICY, "v", {"compliance_score": 70})
+
+    _, match = await find_policy_result(POLICY, "v", "https://beta.myshopify.com/policies/privacy")
+
+    assert match == {"type": "exact"}
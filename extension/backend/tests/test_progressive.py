@@ -0,0 +1,37 @@
+from src.agents import _flight_key
+from src.utils import cache_link
+
+
+URL = "https://example.com/privacy"
+POLICY = "\n\n".join([
+    "You may withdraw consent at any time from your account settings.",
+    "We retain your order history for six years to meet tax obligations.",
+])
+PARTIAL = {"compliance_score": 40, "progressive": {"batches_total": 3, "batches_analyzed": 1, "batches_saved": 2}}
+
+
+def test_progressive_and_full_scans_fly_separately():
+    assert _flight_key(URL, True) != _flight_key(URL, False)
+    assert _flight_key(URL + "/", False) == _flight_key(URL, False)
+
+
+async def test_full_scan_ignores_cached_progressive_result(scan_env):
+    agents, pages, _, usage = scan_env
+    pages[URL] = POLICY
+    await cache_link(URL, PARTIAL)
+
+    result = await agents.web_chunker_node(URL, progressive=False)
+
+    assert usage["calls"] > 0
+    assert "progressive" not in result
+
+
+async def test_progressive_scan_takes_cached_progressive_result(scan_env):
+    agents, pages, _, usage = scan_env
+    pages[URL] = POLICY
+    await cache_link(URL, PARTIAL)
+
+    result = await agents.web_chunker_node(URL, progressive=True)
+
+    assert usage["calls"] == 0
+    assert result == PARTIAL
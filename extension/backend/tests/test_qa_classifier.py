@@ -0,0 +1,21 @@
+import pytest
+
+from src.qa_classifier import classify_question
+
+
+@pytest.mark.parametrize("message", ["hi", "Hello there!", "good morning team", "hey, how are you?"])
+def test_greetings(message):
+    assert classify_question(message)[0] == "greeting"
+
+
+@pytest.mark.parametrize("message", ["thanks", "Thank you so much!", "ok", "okay, bye", "hi, thanks", "cheers"])
+def test_closings_are_not_greeted(message):
+    assert classify_question(message)[0] == "closing"
+
+
+def test_slang_is_left_to_the_llm():
+    assert classify_question("sup")[0] == "unclear"
+
+
+def test_pleasantries_are_stripped_from_questions():
+    assert classify_question("Thanks! Please what is a data controller?") == ("question", "what is a data controller?")
@@ -0,0 +1,88 @@
+from benchmarks.stubs import InMemoryCollection
+from src import utils
+from src.agents import _diff_against_snapshot
+from src.utils import content_units
+
+
+URL = "https://example.com/privacy"
+POLICY = [
+    "You may withdraw consent at any time from your account settings.",
+    "We retain your order history for six years to meet tax obligations.",
+    "Our offices are open from nine to five on weekdays.",
+    "Questions can be sent to our Data Protection Officer at privacy@example.com.",
+]
+
+
+def snapshot_of(text, statuses):
+    units = content_units(text, 6000)
+    return units, {"units": {digest: {"status": status, "findings": []} for (_, _, digest), status in zip(units, statuses)}}
+
+
+def test_rescan_reuses_analyzed_and_routed_units_and_retries_failed_ones():
+    text = "\n\n".join(POLICY)
+    units, previous = snapshot_of(text, ["analyzed", "routed", "failed", "analyzed"])
+
+    reused, analyze_text = _diff_against_snapshot(text, units, previous)
+
+    assert [record["status"] for record in reused.values()] == ["analyzed", "routed", "analyzed"]
+    assert analyze_text == POLICY[2]
+
+
+def test_rescan_analyzes_units_a_progressive_scan_skipped():
+    text = "\n\n".join(POLICY)
+    units, previous = snapshot_of(text, ["analyzed", "analyzed", "skipped", "skipped"])
+
+    reused, analyze_text = _diff_against_snapshot(text, units, previous)
+
+    assert len(reused) == 2
+    assert analyze_text == "\n\n".join(POLICY[2:])
+
+
+def test_snapshot_without_unit_records_reanalyzes_everything():
+    text = "\n\n".join(POLICY)
+    units = content_units(text, 6000)
+
+    reused, analyze_text = _diff_against_snapshot(text, units, {"batches": []})
+
+    assert reused == {}
+    assert analyze_text == text
+
+
+async def test_identical_rescan_makes_no_llm_calls(scan_env, monkeypatch):
+    agents, pages, _, usage = scan_env
+    pages[URL] = "\n\n".join(POLICY)
+    first = await agents._analyze_url(URL)
+    monkeypatch.setattr(utils, "findings_cache_table", InMemoryCollection())
+    calls = usage["calls"]
+
+    second = await agents._analyze_url(URL)
+
+    assert usage["calls"] == calls
+    assert second["changes"]["units_reused"] == len(POLICY)
+    assert second["changes"]["units_analyzed"] == 0
+    assert second["compliance_score"] == first["compliance_score"]
+
+
+async def test_edit_reanalyzes_only_the_changed_unit(scan_env, monkeypatch):
+    agents, pages, _, _ = scan_env
+    pages[URL] = "\n\n".join(POLICY)
+    await agents._analyze_url(URL)
+    monkeypatch.setattr(utils, "findings_cache_table", InMemoryCollection())
+    pages[URL] = "\n\n".join(POLICY[:2] + ["We retain support tickets for two years."] + POLICY[3:])
+
+    result = await agents._analyze_url(URL)
+
+    assert result["changes"]["units_reused"] == 3
+    assert result["changes"]["units_analyzed"] == 1
+    assert result["batching"]["input_tokens"] < len("We retain support tickets for two years.") // 4 + 5
+
+
+async def test_page_without_findings_is_scored(scan_env):
+    agents, pages, _, _ = scan_env
+    pages[URL] = "Our offices are open from nine to five on weekdays.\n\nParking is available on site."
+
+    result = await agents._analyze_url(URL)
+
+    assert "error" not in result
+    assert result["coverage"]["analyzed"] == 2
+    assert result["compliance_score"] is not None
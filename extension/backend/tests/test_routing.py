@@ -0,0 +1,77 @@
+from src.agents import route_text, requirement_signals
+
+
+BOILERPLATE = [
+    "We use cookies to improve your experience. By clicking Accept all you agree to our use of cookies.",
+    "Accept all",
+    "Home | Shop | Deals | About us | Careers | Contact us",
+    "Follow us on Facebook, Instagram and X for the latest offers.",
+    "© 2024 Example Stores Ltd. All rights reserved.",
+]
+
+POLICY = [
+    "How long we keep data",
+    "We retain your order history for six years to meet tax obligations.",
+    "Your rights",
+    "You may withdraw consent at any time from your account settings.",
+    "Questions can be sent to our Data Protection Officer at privacy@example.com.",
+]
+
+
+def test_boilerplate_has_no_signals():
+    for paragraph in BOILERPLATE:
+        assert not requirement_signals(paragraph), paragraph
+
+
+def test_route_text_drops_boilerplate():
+    text = "\n\n".join(BOILERPLATE[:3] + POLICY[:2] + BOILERPLATE[3:] + POLICY[2:])
+
+    routed, stats = route_text(text)
+
+    assert routed.split("\n\n") == POLICY
+    assert stats["paragraphs"] == len(BOILERPLATE) + len(POLICY)
+    assert stats["paragraphs_dropped"] == len(BOILERPLATE)
+
+
+def test_route_text_keeps_items_under_relevant_heading():
+    text = "\n\n".join([
+        "Your rights",
+        "ask us to erase your data",
+        "Your privacy rights under the NDPA",
+        "request a copy of the information we hold",
+        "Cookies",
+        "Session cookies keep you signed in.",
+    ])
+
+    routed, _ = route_text(text)
+
+    assert "request a copy of the information we hold" in routed
+    assert "Session cookies" not in routed
+
+
+def test_route_text_keeps_list_items_without_signals_of_their_own():
+    items = ["Order records – 6 years", "Support tickets – 2 years", "Server logs – 90 days", "Payment data – 7 years"]
+    text = "\n\n".join([
+        "How long we keep your data",
+        *items,
+        "Cookies",
+        "Session cookies keep you signed in.",
+    ])
+
+    routed, stats = route_text(text)
+
+    assert routed.split("\n\n") == ["How long we keep your data", *items]
+    assert stats["paragraphs_dropped"] == 2
+
+
+def test_route_text_never_sends_a_heading_without_its_body():
+    text = "\n\n".join([
+        "Your rights",
+        "Accept all cookies",
+        "Cookies",
+        "Session cookies keep you signed in.",
+    ])
+
+    routed, _ = route_text(text)
+
+    assert routed == ""
@@ -0,0 +1,192 @@
+import asyncio
+
+import pytest
+
+from src import scheduler
+from src.scheduler import LLMScheduler, LLMCapacityError, llm_priority
+
+
+class RateLimited(Exception):
+    pass
+
+
+def make_scheduler(keys=1, max_inflight=4, acquire_timeout=1.0):
+    llm = LLMScheduler([object() for _ in range(keys)], acquire_timeout=acquire_timeout)
+    for key in llm.keys:
+        key.max_inflight = max_inflight
+    return llm
+
+
+async def fail(llm, key, exc):
+    await llm.release(key, 0.1, exc=exc)
+
+
+async def test_breaker_opens_after_consecutive_failures():
+    llm = make_scheduler()
+    key = llm.keys[0]
+    for _ in range(scheduler.LLM_BREAKER_THRESHOLD - 1):
+        await fail(llm, await llm.acquire(10), RuntimeError("boom"))
+        assert key.open_until == 0.0
+
+    await fail(llm, await llm.acquire(10), RuntimeError("boom"))
+
+    assert key.open_until > 0.0
+    assert llm.capacity() == 0
+    assert llm.try_acquire(10) is None
+
+
+async def test_rate_limit_trips_at_once_and_cooldown_doubles():
+    llm = make_scheduler()
+    key = llm.keys[0]
+
+    await fail(llm, await llm.acquire(10), RateLimited("429 RESOURCE_EXHAUSTED"))
+
+    assert key.half_open
+    assert key.cooldown == 2 * scheduler.LLM_BREAKER_COOLDOWN_SECONDS
+    assert key.rate_limited == 1
+
+
+async def test_half_open_probe_closes_the_circuit():
+    llm = make_scheduler()
+    key = llm.keys[0]
+    key.trip(0.0, 0.0)
+
+    probe = await llm.acquire(10)
+    assert llm.try_acquire(10) is None  # one probe at a time while half-open
+    await llm.release(probe, 0.2)
+
+    assert not key.half_open
+    assert key.cooldown == scheduler.LLM_BREAKER_COOLDOWN_SECONDS
+    assert llm.try_acquire(10) is key
+
+
+async def test_failed_probe_reopens_with_longer_cooldown():
+    llm = make_scheduler()
+    key = llm.keys[0]
+    key.trip(0.0, 0.0)
+    key.cooldown = 10.0
+
+    await fail(llm, await llm.acquire(10), RuntimeError("boom"))
+
+    assert not key.healthy(key.open_until - 1)
+    assert key.cooldown == 20.0
+
+
+async def test_cancelled_call_does_not_count_against_the_key():
+    llm = make_scheduler()
+    key = llm.keys[0]
+    for _ in range(scheduler.LLM_BREAKER_THRESHOLD):
+        await llm.release(await llm.acquire(10), 0.1, exc=asyncio.CancelledError(), cancelled=True)
+
+    assert key.consecutive_failures == 0
+    assert key.open_until == 0.0
+
+
+async def test_retry_avoids_the_key_that_failed():
+    llm = make_scheduler(keys=2)
+    first = await llm.acquire(10)
+    await fail(llm, first, RuntimeError("boom"))
+
+    second = await llm.acquire(10, avoid={first.index})
+
+    assert second is not first
+
+
+async def test_acquire_times_out_when_every_key_is_busy():
+    llm = make_scheduler(max_inflight=1, acquire_timeout=0.1)
+    await llm.acquire(10)
+
+    with pytest.raises(LLMCapacityError):
+        await llm.acquire(10)
+    assert llm.waiting == 0
+
+
+async def test_queued_calls_are_served_in_priority_order():
+    llm = make_scheduler(max_inflight=1)
+    held = await llm.acquire(10)
+    order = []
+
+    async def call(priority, name):
+        llm_priority.set(priority)
+        key = await llm.acquire(10)
+        order.append(name)
+        await llm.release(key, 0.01)
+
+    bulk = asyncio.ensure_future(call(2, "bulk"))
+    await asyncio.sleep(0.01)
+    qa = asyncio.ensure_future(call(0, "qa"))
+    await asyncio.sleep(0.01)
+    await llm.release(held, 0.01)
+    await asyncio.gather(bulk, qa)
+
+    assert order == ["qa", "bulk"]
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    from src import agents
+
+    llm = make_scheduler(keys=2)
+    monkeypatch.setattr(agents, "llm_scheduler", llm)
+    monkeypatch.setattr(agents, "LLM_HEDGING", True)
+    monkeypatch.setattr(scheduler, "LLM_HEDGE_MIN_SAMPLES", 1)
+    llm.observe(agents.current_pipeline(), 0.05)
+    return agents, llm
+
+
+def slow_on_first_key(latencies, cancelled):
+    async def call(key):
+        try:
+            await asyncio.sleep(latencies[key.index])
+        except asyncio.CancelledError:
+            cancelled.append(key.index)
+            raise
+        return key.index
+    return call
+
+
+async def test_slow_call_is_hedged_on_another_key(hedging):
+    agents, llm = hedging
+    cancelled = []
+    keys = [await llm.acquire(10)]
+    call = slow_on_first_key({keys[0].index: 1.0, 1 - keys[0].index: 0.01}, cancelled)
+
+    result = await agents._hedged_call(keys, 10, call)
+
+    assert len(keys) == 2
+    assert result == keys[1].index
+    assert cancelled == [keys[0].index]
+
+
+async def test_fast_call_is_not_hedged(hedging):
+    agents, llm = hedging
+    keys = [await llm.acquire(10)]
+
+    result = await agents._hedged_call(keys, 10, slow_on_first_key({0: 0.0, 1: 0.0}, []))
+
+    assert keys == [llm.keys[result]]
+
+
+async def test_no_hedge_without_a_free_key(hedging):
+    agents, llm = hedging
+    for key in llm.keys:
+        key.max_inflight = 1
+    keys = [await llm.acquire(10)]
+    await llm.acquire(10)
+
+    await agents._hedged_call(keys, 10, slow_on_first_key({0: 0.1, 1: 0.1}, []))
+
+    assert len(keys) == 1
+
+
+async def test_hedged_call_raises_when_every_copy_fails(hedging):
+    agents, llm = hedging
+
+    async def call(key):
+        await asyncio.sleep(0.1 if key is keys[0] else 0.0)
+        raise RuntimeError(f"failed on {key.name}")
+
+    keys = [await llm.acquire(10)]
+    with pytest.raises(RuntimeError):
+        await agents._hedged_call(keys, 10, call)
+    assert len(keys) == 2
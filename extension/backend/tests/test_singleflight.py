@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+
+import pytest
+
+from src.metrics import start_timings, reset_timings, record
+from src.singleflight import SingleFlight
+
+
+request_id = contextvars.ContextVar("request_id", default=None)
+priority = contextvars.ContextVar("priority", default=1)
+
+
+def gated(calls, gate, result="done"):
+    async def fn(emit):
+        calls.append(request_id.get())
+        emit({"event": "started"})
+        await gate.wait()
+        return result
+    return fn
+
+
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+    gate = asyncio.Event()
+
+    waiters = [asyncio.ensure_future(flights.do("url", gated(calls, gate))) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert "url" in flights
+    gate.set()
+
+    assert await asyncio.gather(*waiters) == ["done"] * 3
+    assert len(calls) == 1
+    assert "url" not in flights
+
+
+async def test_later_call_starts_a_new_execution():
+    flights = SingleFlight()
+    calls = []
+    gate = asyncio.Event()
+    gate.set()
+
+    await flights.do("url", gated(calls, gate))
+    await flights.do("url", gated(calls, gate))
+
+    assert len(calls) == 2
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_call():
+    flights = SingleFlight()
+    calls = []
+    gate = asyncio.Event()
+    first = asyncio.ensure_future(flights.do("url", gated(calls, gate)))
+    second = asyncio.ensure_future(flights.do("url", gated(calls, gate)))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    await asyncio.sleep(0)
+    gate.set()
+
+    assert await second == "done"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert len(calls) == 1
+
+
+async def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    async def fn(emit):
+        await asyncio.sleep(0)
+        raise ValueError("bad page")
+
+    results = await asyncio.gather(flights.do("url", fn), flights.do("url", fn), return_exceptions=True)
+
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    assert "url" not in flights
+
+
+async def test_late_subscriber_replays_earlier_events():
+    flights = SingleFlight()
+    gate = asyncio.Event()
+    first = asyncio.ensure_future(flights.do("url", gated([], gate)))
+    await asyncio.sleep(0.01)
+
+    async def subscribe():
+        return [event async for event in flights.stream("url", gated([], gate))]
+
+    stream = asyncio.ensure_future(subscribe())
+    await asyncio.sleep(0.01)
+    gate.set()
+
+    assert await stream == [{"event": "started"}, {"event": "result", "data": "done"}]
+    await first
+
+
+async def test_shared_call_runs_in_a_clean_context():
+    flights = SingleFlight()
+    calls = []
+    gate = asyncio.Event()
+    gate.set()
+    request_id.set("first-caller")
+
+    await flights.do("url", gated(calls, gate))
+
+    assert calls == [None]
+
+
+async def test_shared_call_takes_the_most_urgent_waiter_priority():
+    flights = SingleFlight(priority_var=priority)
+    seen = []
+    gate = asyncio.Event()
+
+    async def fn(emit):
+        seen.append(priority.get()())
+        await gate.wait()
+        seen.append(priority.get()())
+        return "done"
+
+    async def call(level):
+        priority.set(level)
+        return await flights.do("url", fn)
+
+    background = asyncio.ensure_future(call(3))
+    await asyncio.sleep(0)
+    interactive = asyncio.ensure_future(call(1))
+    await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(background, interactive)
+
+    assert seen == [3, 1]
+
+
+async def test_stage_timings_are_merged_into_every_caller():
+    flights = SingleFlight()
+    gate = asyncio.Event()
+
+    async def fn(emit):
+        await gate.wait()
+        record("fetch", 0.5)
+        return "done"
+
+    async def call():
+        timings, token = start_timings("analyze")
+        try:
+            await flights.do("url", fn)
+        finally:
+            reset_timings(token)
+        return dict(timings.stages)
+
+    callers = [asyncio.ensure_future(call()) for _ in range(2)]
+    await asyncio.sleep(0)
+    gate.set()
+
+    assert await asyncio.gather(*callers) == [{"fetch": 0.5}, {"fetch": 0.5}]